@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from downloader import Downloader, RESULTS_QUEUE_SIZE
+from handler import CHUNK_SIZE, BodyBuffer
+
+try:
+    import aiohttp
+    from aiohttp_socks import ProxyConnector
+except ImportError:
+    aiohttp = None
+    ProxyConnector = None
+
+
+logger = logging.getLogger("CRATOR")
+
+MAX_IN_FLIGHT = 1000
+MAX_PER_HOST = 16
+
+
+class AsyncDownloader(Downloader):
+    """
+    Downloader based on an asyncio event loop. Each url is a coroutine, so thousands of requests can wait on the
+    network at the same time without a thread each. It exposes the same interface of the Downloader
+    (enqueue, get_results, is_empty), so the crawler can switch between the two engines.
+    """
+    def __init__(self, torhandler, waiting_time=1.5, random_wait=False, max_in_flight=MAX_IN_FLIGHT,
+                 max_per_host=MAX_PER_HOST, results_queue_size=RESULTS_QUEUE_SIZE, results_low_watermark=None):
+        if aiohttp is None:
+            raise ImportError("The asyncio engine requires the aiohttp and aiohttp-socks packages.")
+
+        super().__init__(max_in_flight, torhandler=torhandler, waiting_time=waiting_time, random_wait=random_wait,
+                         results_queue_size=results_queue_size, results_low_watermark=results_low_watermark)
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+
+        self.loop = None
+
+        # Circuit index -> (circuit generation, aiohttp session, http proxy). Used only in the event loop
+        self.sessions = {}
+        # Session -> requests in flight, and the sessions of the renewed circuits, closed once their requests end
+        self.session_requests = {}
+        self.retired_sessions = set()
+
+        # Downloads started and not completed, and the next timed dispatch. Used only in the event loop
+        self.n_in_flight = 0
+        self.dispatch_timer = None
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.run_loop, daemon=True).start()
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def enqueue(self, url, cookie, priority=0, headers=None):
+        with self.lock:
+            self.queue.append((url, cookie, headers), priority)
+
+        self.loop.call_soon_threadsafe(self.dispatch)
+
+    def download(self):
+        # The urls are started on the event loop by dispatch
+        pass
+
+    def get_results(self, timeout=0):
+        results = super().get_results(timeout)
+
+        # The crawler may have drained the downloaded pages below the low watermark
+        if results and self.running:
+            self.loop.call_soon_threadsafe(self.dispatch)
+
+        return results
+
+    def dispatch(self):
+        """
+        Start the downloads of the hosts that can be contacted, in priority order, up to max_in_flight, while the
+        downloaded pages not yet processed are below the watermarks. Runs in the event loop, at each enqueue, at each
+        completed download, when the crawler takes the downloaded pages and when the next host slot is free.
+        """
+        if self.dispatch_timer:
+            self.dispatch_timer.cancel()
+            self.dispatch_timer = None
+
+        with self.lock:
+            now = time.monotonic()
+            while self.running and self.n_in_flight < self.max_in_flight and not self.completed.throttled:
+                item = self.queue.pop_ready(now)
+                if not item:
+                    break
+
+                url, cookie, headers = item
+                future = asyncio.run_coroutine_threadsafe(self.fetch(url, cookie, headers), self.loop)
+                future.add_done_callback(self.download_done)
+                self.track(url, future)
+                self.n_in_flight += 1
+
+            delay = self.queue.next_ready_in(now)
+
+        if self.running and delay and self.n_in_flight < self.max_in_flight and not self.completed.throttled:
+            self.dispatch_timer = self.loop.call_later(delay, self.dispatch)
+
+    def download_done(self, future):
+        self.loop.call_soon_threadsafe(self.finish_download)
+
+    def finish_download(self):
+        self.n_in_flight -= 1
+        self.dispatch()
+
+    def new_session(self, circuit):
+        """
+        Create the aiohttp session of a tor circuit. A socks proxy (e.g., the tor socks5h://localhost:9050) is handled
+        by the connector, an http proxy is passed to each request.
+        :return: (session, http proxy of the requests)
+        """
+        proxy = circuit.proxy.get("http")
+        http_proxy = None
+
+        if proxy and proxy.startswith("socks"):
+            connector = ProxyConnector.from_url(proxy.replace("socks5h://", "socks5://"),
+                                                rdns=proxy.startswith("socks5h"),
+                                                limit=self.max_in_flight, limit_per_host=self.max_per_host)
+        else:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.max_per_host)
+            http_proxy = proxy
+
+        # The cookie is sent by header: the cookies set by the servers must not be shared among the requests
+        return aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar()), http_proxy
+
+    def circuit_session(self, circuit):
+        """
+        :return: (session, http proxy) of a circuit, created again when the circuit has been renewed.
+        """
+        generation, session, http_proxy = self.sessions.get(circuit.index, (None, None, None))
+        if generation != circuit.generation:
+            if session:
+                # Closing the session closes its connections: the requests still running on the old circuit end first
+                self.retire_session(session)
+
+            session, http_proxy = self.new_session(circuit)
+            self.sessions[circuit.index] = (circuit.generation, session, http_proxy)
+
+        return session, http_proxy
+
+    def retire_session(self, session):
+        if self.session_requests.get(session, 0) > 0:
+            self.retired_sessions.add(session)
+        else:
+            self.session_requests.pop(session, None)
+            self.loop.create_task(session.close())
+
+    def acquire_session(self, circuit):
+        """
+        :return: (session, http proxy) of a circuit, counted as used by one more request until release_session.
+        """
+        session, http_proxy = self.circuit_session(circuit)
+        self.session_requests[session] = self.session_requests.get(session, 0) + 1
+        return session, http_proxy
+
+    async def release_session(self, session):
+        self.session_requests[session] -= 1
+        if session in self.retired_sessions and self.session_requests[session] == 0:
+            self.retired_sessions.discard(session)
+            del self.session_requests[session]
+            await session.close()
+
+    async def fetch(self, url, cookie=None, headers=None):
+        circuit = self.torhandler.choose_circuit(cookie)
+
+        logger.debug(f"ASYNC DOWNLOADER - Downloading URL: {url}")
+
+        header = {'User-Agent': self.torhandler.get_random_useragent(cookie)}
+        if cookie:
+            header["Cookie"] = cookie
+        if headers:
+            header.update(headers)
+
+        session, http_proxy = self.acquire_session(circuit)
+        circuit.start_request()
+        start_time = time.monotonic()
+        try:
+            async with session.get(url, headers=header, proxy=http_proxy) as response:
+                content = await read_body(response, self.torhandler.max_page_size)
+        except Exception:
+            circuit.record(None)
+            raise
+        finally:
+            await self.release_session(session)
+
+        elapsed = time.monotonic() - start_time
+        circuit.record(elapsed)
+        self.torhandler.n_requests_sent += 1
+        logger.debug(f"ASYNC DOWNLOADER - STATUS CODE: {response.status}")
+
+        web_page = to_requests_response(response, content, header)
+        web_page.elapsed = timedelta(seconds=elapsed)
+        web_page.circuit = circuit.index
+        return web_page
+
+    async def close(self):
+        for generation, session, http_proxy in self.sessions.values():
+            await session.close()
+
+        for session in self.retired_sessions:
+            await session.close()
+
+    def stop(self):
+        self.running = False
+        self.completed.close()
+
+        if self.loop and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+async def read_body(response, max_size):
+    """
+    Read the body of a response, at most max_size bytes. The rest of a longer body is not downloaded: the connection
+    is closed when the response is released.
+    """
+    body = BodyBuffer(max_size)
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        if not body.add(chunk):
+            logger.warning(f"ASYNC DOWNLOADER - Page larger than {max_size} bytes, truncated: {response.url}")
+            break
+
+    return body.content()
+
+
+def to_requests_response(response, content=b"", headers=None):
+    """
+    Convert an aiohttp response to a :class requests.Response, the type used by the crawler, the detector and the
+    saver.
+    :param response: :class aiohttp.ClientResponse
+    :param content: the body of the response, already read
+    :param headers: the headers sent with the request
+    :return: :class requests.Response
+    """
+    web_page = requests.Response()
+    web_page.status_code = response.status
+    web_page.reason = response.reason
+    web_page.url = str(response.url)
+    web_page.headers = CaseInsensitiveDict(response.headers)
+    web_page.encoding = response.get_encoding() if content else None
+    web_page._content = content
+    web_page.request = requests.Request("GET", web_page.url, headers=headers).prepare()
+    web_page.history = [to_requests_response(redirect, headers=headers) for redirect in response.history]
+
+    return web_page
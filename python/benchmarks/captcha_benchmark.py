@@ -0,0 +1,104 @@
+"""
+Captcha detection cost of the staged detector against the detectors that parse every page.
+
+The pages are a crawl mix: listing pages not redirected, pages redirected elsewhere (e.g., to the home page) and
+captcha pages. Each detector gets new responses, so that no parse is cached from the previous run.
+
+Usage (from the python folder): python benchmarks/captcha_benchmark.py [n_pages] [captcha_percent]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+from bs4 import BeautifulSoup
+
+from document import PageDocument
+from detector import CaptchaDetector, anomalous_redirection
+
+SEED = "http://market.onion"
+REDIRECT_PERCENT = 8
+
+
+def make_page(i):
+    rows = "".join(f"<tr><td><a href='/product/{i}-{j}'>Product {j}</a></td><td><img src='/img/{j}.png'></td>"
+                   f"<td><a href='/vendor/{j % 17}'>vendor</a></td></tr>" for j in range(300))
+    return f"<html><body><table>{rows}</table><a href='/list?page={i + 1}'>next</a></body></html>".encode()
+
+
+def make_captcha_page(i):
+    return (f"<html><body><form action='/captcha/{i}'><img src='/captcha/image?id={i}'>"
+            f"<input name='captcha'></form></body></html>").encode()
+
+
+def make_response(url, final_url, content):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = final_url
+    response._content = content
+    response.request = requests.Request("GET", final_url).prepare()
+    response.history = []
+
+    if final_url != url:
+        redirect = requests.Response()
+        redirect.status_code = 302
+        redirect.url = url
+        response.history = [redirect]
+
+    return response
+
+
+def make_pages(n_pages, captcha_percent):
+    """
+    :return: list of (requested url, final url, content)
+    """
+    pages = []
+    for i in range(n_pages):
+        url = f"{SEED}/list?page={i}"
+        if i % 100 < captcha_percent:
+            pages.append((url, f"{SEED}/captcha/{i}", make_captcha_page(i)))
+        elif i % 100 < captcha_percent + REDIRECT_PERCENT:
+            pages.append((url, f"{SEED}/home", make_page(i)))
+        else:
+            pages.append((url, url, make_page(i)))
+
+    return pages
+
+
+def bs4_detector(url, response):
+    # The original detector: a BeautifulSoup tree and a lambda over the <img> tags of every page
+    soup = BeautifulSoup(response.content, "html.parser")
+    captchas = soup.find_all("img", src=lambda src: src and "captcha" in src.lower())
+    return bool(captchas) and anomalous_redirection(url, response)
+
+
+def parse_first_detector(url, response):
+    # The previous detector: the shared parse of the page, then the redirect check
+    return bool(PageDocument.of(response).captcha_images) and anomalous_redirection(url, response)
+
+
+def run(detector, pages):
+    responses = [(url, make_response(url, final_url, content)) for url, final_url, content in pages]
+
+    start_time = time.perf_counter()
+    n_captchas = sum(1 for url, response in responses if detector(url, response))
+    return time.perf_counter() - start_time, n_captchas
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    captcha_percent = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    pages = make_pages(n_pages, captcha_percent)
+
+    print(f"{n_pages} pages, {captcha_percent}% captchas, {REDIRECT_PERCENT}% other redirects")
+    print(f"{'detector':>12} {'us/page':>10} {'captchas':>9}")
+    for name, detector in [("bs4", bs4_detector), ("parse first", parse_first_detector),
+                           ("staged", CaptchaDetector())]:
+        elapsed, n_captchas = run(detector, pages)
+        print(f"{name:>12} {elapsed / n_pages * 1e6:>10.1f} {n_captchas:>9}")
+
+
+if __name__ == '__main__':
+    main()
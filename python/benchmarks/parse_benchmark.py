@@ -0,0 +1,81 @@
+"""
+Parse throughput of the crawler threads against the parse pool.
+
+Each configuration parses the same synthetic listing pages, split among N_SEEDS threads as the crawlers of crator.py.
+With the threads alone the parsing is serialized by the GIL, with the pool it scales with the worker processes, up to
+the number of cores.
+
+Usage (from the python folder): python benchmarks/parse_benchmark.py [n_pages] [backend]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+
+from document import PageDocument
+from parsepool import ParsePool
+
+N_SEEDS = 8
+BATCH_SIZE = 16     # Pages taken at once by a crawler, as the completed downloads of get_results
+
+
+def make_page(i):
+    rows = "".join(f"<tr><td><a href='/product/{i}-{j}'>Product {j}</a></td><td><img src='/img/{j}.png'></td>"
+                   f"<td><a href='/vendor/{j % 17}'>vendor</a></td></tr>" for j in range(300))
+    return f"<html><body><table>{rows}</table><a href='/list?page={i + 1}'>next</a></body></html>".encode()
+
+
+def make_response(i, content):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = f"http://market.onion/list?page={i}"
+    response._content = content
+    response.request = requests.Request("GET", response.url).prepare()
+    return response
+
+
+def crawl(pages, backend, pool):
+    responses = [make_response(i, content) for i, content in enumerate(pages)]
+    batches = [responses[i:i + BATCH_SIZE] for i in range(0, len(responses), BATCH_SIZE)]
+
+    def process(batch):
+        if pool:
+            pool.parse(batch, backend)
+        for response in batch:
+            PageDocument.of(response, backend).internal_links()
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=N_SEEDS) as executor:
+        list(executor.map(process, batches))
+
+    return len(pages) / (time.perf_counter() - start_time)
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    backend = sys.argv[2] if len(sys.argv) > 2 else "htmlparser"
+    pages = [make_page(i) for i in range(n_pages)]
+
+    print(f"{n_pages} pages of {len(pages[0]) // 1024} KB, backend {backend}, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'pages/s':>10}")
+    print(f"{'threads':>8} {crawl(pages, backend, None):>10.1f}")
+
+    n_workers = 1
+    while n_workers <= os.cpu_count():
+        pool = ParsePool(n_workers)
+        try:
+            # Warm up: spawn the workers and import the modules
+            crawl(pages[:n_workers * 2], backend, pool)
+            print(f"{n_workers:>8} {crawl(pages, backend, pool):>10.1f}")
+        finally:
+            pool.shutdown()
+
+        n_workers *= 2
+
+
+if __name__ == '__main__':
+    main()
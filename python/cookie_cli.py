@@ -16,22 +16,26 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     config = Configuration()
+    cookie_store = config.cookie_store
 
     # Process the arguments
     if args.a:
         if args.cookie is None:
             print("Please provide a cookie value with -a option.")
         else:
-            config.add_cookie(args.seed, args.cookie)
+            cookie_store.add(args.seed, args.cookie)
             print("Cookie updated successfully!")
 
     elif args.r:
         if args.cookie is None:
-            config.remove_seed(args.seed)
+            cookie_store.remove_seed(args.seed)
             print(f"Seed {args.seed} removed.")
         else:
-            config.remove_cookie(args.seed, args.cookie)
+            cookie_store.remove(args.seed, args.cookie)
             print("Cookie removed.")
 
     else:
-        print("Please provide a valid option (-a or -r).")
\ No newline at end of file
+        print("Please provide a valid option (-a or -r).")
+
+    # Compacted at once, so that crator.yml shows the change. The running crawlers reload it
+    cookie_store.compact()
\ No newline at end of file
@@ -0,0 +1,156 @@
+import time
+import random
+import hashlib
+import logging
+import threading
+
+# Local imports
+from utils.config import Configuration
+from exceptions import CookieTimeoutException
+
+logger = logging.getLogger("CRATOR")
+
+SUCCESS = "success"
+CAPTCHA = "captcha"
+LOGIN_REDIRECT = "login_redirect"
+ERROR = "error"
+
+HEALTH_SMOOTHING = 0.2      # Weight of the last request in the failure rate and latency averages of a cookie
+RETIRE_FAILURE_RATE = 0.5   # A cookie that fails more often than this is retired...
+MIN_REQUESTS = 5            # ...after this number of requests at least
+
+
+class CookieHealth:
+    """
+    Outcomes of the requests sent with a cookie: successes, captchas, redirects to the login page, errors, with the
+    moving averages of the failure rate and of the latency.
+    """
+    def __init__(self):
+        self.outcomes = {SUCCESS: 0, CAPTCHA: 0, LOGIN_REDIRECT: 0, ERROR: 0}
+        self.n_requests = 0
+        self.failure_rate = 0.0
+        self.latency = None
+
+    def record(self, outcome, latency=None):
+        self.outcomes[outcome] += 1
+        self.n_requests += 1
+
+        failure = 0.0 if outcome == SUCCESS else 1.0
+        self.failure_rate += HEALTH_SMOOTHING * (failure - self.failure_rate)
+
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + HEALTH_SMOOTHING * (latency -
+                                                                                                   self.latency)
+
+    def score(self):
+        """
+        :return: (failure rate, latency) of the cookie, the lower the better. (0, 0) for a cookie not yet used.
+        """
+        return self.failure_rate, self.latency or 0
+
+    def is_failing(self, retire_failure_rate=RETIRE_FAILURE_RATE, min_requests=MIN_REQUESTS):
+        return self.n_requests >= min_requests and self.failure_rate >= retire_failure_rate
+
+
+class CookiePool:
+    """
+    Cookies of a seed, chosen by health instead of at random. Each request goes to the healthier of two cookies chosen
+    at random (power of two choices), by failure rate and then by latency. The crawler reports the outcome of each
+    page (see report): a cookie redirected to the login page has expired and it is retired at once, a cookie that
+    fails (captchas, errors) more than RETIRE_FAILURE_RATE is retired too.
+    The retired cookies are removed from crator.yml by the cookie handler. When there are no cookies, acquire waits
+    for the configuration to change (e.g., a cookie added with cookie_cli.py) instead of polling it.
+    """
+    def __init__(self, seed, cookie_handler, retire_failure_rate=RETIRE_FAILURE_RATE, min_requests=MIN_REQUESTS):
+        self.config = Configuration()
+        self.seed = seed
+        self.cookie_handler = cookie_handler
+        self.retire_failure_rate = retire_failure_rate
+        self.min_requests = min_requests
+
+        self.lock = threading.Lock()
+        self.cookies = []
+        self.health = {}
+        self.version = None
+        self.n_retired = 0
+
+    def sync(self):
+        """
+        Follow the cookies of the configuration: the new ones are added, the removed ones dropped. The health of the
+        others is kept.
+        """
+        version = self.config.version()
+        if version == self.version:
+            return
+
+        cookies = self.config.cookies(self.seed) or []
+        with self.lock:
+            self.version = version
+            self.cookies = cookies
+            self.health = {cookie: self.health.get(cookie) or CookieHealth() for cookie in cookies}
+
+    def choose(self):
+        # It must be called holding self.lock
+        if len(self.cookies) == 1:
+            return self.cookies[0]
+
+        first, second = random.sample(self.cookies, 2)
+        return first if self.health[first].score() <= self.health[second].score() else second
+
+    def acquire(self, timeout=None):
+        """
+        :param timeout: max seconds to wait for a cookie when there are none, forever if None
+        :return: the cookie of the next request.
+        :raise CookieTimeoutException: if no cookie is available within the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.sync()
+            with self.lock:
+                if self.cookies:
+                    return self.choose()
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise CookieTimeoutException(f"No cookies for {self.seed} after {timeout} seconds.")
+
+            logger.info(f"{self.seed} COOKIE POOL - No valid cookies. Waiting for new cookies.")
+            self.config.wait_for_update(self.version, remaining)
+
+    def report(self, cookie, outcome, latency=None):
+        """
+        Record the outcome of a request sent with a cookie, and retire the cookie if it has expired or if it fails
+        too often.
+        :param outcome: SUCCESS, CAPTCHA, LOGIN_REDIRECT or ERROR
+        :param latency: the duration of the request, in seconds
+        """
+        with self.lock:
+            health = self.health.get(cookie)
+            if health is None:
+                # Already retired
+                return
+
+            health.record(outcome, latency)
+            retire = outcome == LOGIN_REDIRECT or health.is_failing(self.retire_failure_rate, self.min_requests)
+            if retire:
+                self.cookies.remove(cookie)
+                del self.health[cookie]
+                self.n_retired += 1
+
+        if retire:
+            logger.info(f"{self.seed} COOKIE POOL - Cookie retired ({outcome}, failure rate "
+                        f"{health.failure_rate:.2f}): {cookie}")
+            self.cookie_handler.remove_cookie(cookie)
+
+    def stats(self):
+        """
+        :return: list of dicts of statistics of the cookies. The cookies are identified by a hash, not shown.
+        """
+        with self.lock:
+            return [{
+                "cookie": hashlib.sha256(cookie.encode()).hexdigest()[:12],
+                "requests": health.n_requests,
+                **health.outcomes,
+                "failure_rate": round(health.failure_rate, 3),
+                "latency": None if health.latency is None else round(health.latency, 3),
+            } for cookie, health in self.health.items()]
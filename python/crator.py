@@ -1,3 +1,4 @@
+import argparse
 import logging
 from datetime import datetime
 import time
@@ -9,6 +10,7 @@ import crawler
 from utils.config import Configuration
 from utils.seeds import get_seeds
 from handler import TorHandler
+from parsepool import ParsePool
 
 
 def init_logger():
@@ -44,6 +46,10 @@ def print_info(pcrawler: crawler.Crawler):
     print(f"HTTP 5xx status code: {n_500_pages}")
     print(f"Link skipped: {n_skip_page}")
     print(f"Request sent: {n_requests}")
+    print(f"Request sent on a kept-alive session: {pcrawler.monitor.tor_reused_requests}")
+    print(f"Bytes downloaded: {pcrawler.get_stats()['bytes_downloaded']}")
+    print(f"Requests avoided by url normalization: {pcrawler.get_stats()['avoided_fetches']}")
+    print(f"Pages unchanged since the previous crawl: {pcrawler.get_stats()['unchanged_pages']}")
     print(f"Links found: {links_found}")
 
     n_pages = n_200_pages + n_300_pages + n_400_pages + n_500_pages
@@ -55,6 +61,15 @@ def print_info(pcrawler: crawler.Crawler):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl the seeds through tor")
+    parser.add_argument("--resume", nargs="?", const=True, default=False, metavar="PROJECT_PATH",
+                        help="Resume an interrupted crawl from its last checkpoint. Without a path, the latest folder "
+                             "of the project is resumed.")
+    parser.add_argument("--recrawl", nargs="?", const=True, default=False, metavar="PREVIOUS_PROJECT_PATH",
+                        help="Incremental crawl: send conditional requests for the pages of a previous crawl and "
+                             "hard-link the unchanged ones. Without a path, the latest folder of the project is used.")
+    args = parser.parse_args()
+
     init_logger()
     logger = logging.getLogger("CRATOR")
     logger.info("CRATOR - START")
@@ -71,7 +86,7 @@ if __name__ == '__main__':
 
         for seed in seeds:
             print(f"Thread for the seed -> {seed}")
-            crator = crawler.Crawler(seed, torhandler)
+            crator = crawler.Crawler(seed, torhandler, resume=args.resume, recrawl=args.recrawl)
             crators.append(crator)
 
             future = executor.submit(crator.start)
@@ -94,6 +109,9 @@ if __name__ == '__main__':
         # Wait for all tasks to complete
         concurrent.futures.wait(futures)
 
+        # The parse workers are shared by the crawlers
+        ParsePool.shutdown_shared()
+
         print("Seeds downloaded. Final info\n")
 
         for crator in crators:
@@ -4,25 +4,31 @@ import sys
 import time
 from datetime import datetime
 import hashlib
-from waiting import wait
-from waiting.exceptions import TimeoutExpired
 import os
 from collections import deque
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
 
 # Local imports
 from handler import TorHandler, CookieHandler
+from cookiepool import CookiePool, SUCCESS, CAPTCHA, LOGIN_REDIRECT
 from monitor import CrawlerMonitor
-from detector import captcha_detector, login_redirection
+from detector import CaptchaDetector, login_redirection
 from downloader import Downloader
+from asyncdownloader import AsyncDownloader
 from saver import FileSaver
+from crawlstate import CrawlState
+from fingerprint import FingerprintTable, ScalableBloomFilter
+from normalizer import UrlNormalizer
+from frontier import PriorityPolicy
+from recrawl import PreviousCrawl
+from parsepool import ParsePool
+from document import PageDocument
 from utils.config import Configuration
 import utils.fileutils as file_utils
-from exceptions import InvalidURLException, HTTPStatusCodeError
+from exceptions import InvalidURLException, HTTPStatusCodeError, CookieTimeoutException
 
 MAX_RETRIES = 3
 MAX_COOKING_WAITING_TIME = 36000     # 10 hours
+RESULTS_TIMEOUT = 1     # Max seconds to wait for a completed download
 
 logger = logging.getLogger("CRATOR")
 
@@ -31,15 +37,22 @@ class Crawler:
     """
     Crawler for tor onion links
     """
-    def __init__(self, seed, tor_handler=None):
+    def __init__(self, seed, tor_handler=None, resume=False, recrawl=False):
         """
         Initialize the class crawler
         :param seed: the url to crawl
         :param tor_handler: an instance of the TorHandler class, useful when the crawler is executed in a multithread
         environment and the tor requests must be shared among the threads (e.g., if a webpage contains
-        a captcha, the handler requests a new ip, blocking all the connections until the new ip.
+        a captcha, the handler renews the circuit that downloaded it, without stopping the other circuits).
+        :param resume: False to start a new project. True to resume the latest project folder, or the path of the
+        project folder to resume.
+        :param recrawl: False to download all the pages. True to re-crawl the latest previous project folder, or the
+        path of the project folder to re-crawl: the pages with validators are requested with conditional requests, the
+        unchanged pages are hard-linked to their previous file.
         """
         self.config = Configuration()
+        # The cookies added or removed while crawling are read from the snapshots of the watcher
+        self.config.start_watcher(self.config.watch_interval())
         self.max_link = self.config.max_links()
         self.max_crawl_time = self.config.max_time()
         self.max_depth = self.config.max_depth()
@@ -47,8 +60,17 @@ class Crawler:
         self.max_retries = 5
         self.retries_counter = 0
         self.max_retries_before_renew = 5
+        self.link_extractor = self.config.link_extractor()
+        self.normalizer = UrlNormalizer.from_rules(self.config.normalization(seed))
+        self.priority_policy = PriorityPolicy.from_rules(self.config.priorities(seed))
+        self.captcha_detector = CaptchaDetector.from_rules(self.config.captcha(seed))
+
+        # Shared by all the seeds of the process
+        parse_workers = self.config.parse_workers()
+        self.parse_pool = ParsePool.shared(parse_workers) if parse_workers > 0 else None
 
         self.seed = seed
+        self.resume = resume
         self.login_page = None
         self.retry_queue = {}
 
@@ -57,47 +79,101 @@ class Crawler:
             self.tor_handler = TorHandler()
         self.actual_ip = self.tor_handler.get_ip()
 
-        self.downloader = Downloader(5, torhandler=self.tor_handler, waiting_time=self.wait_request)
+        if self.config.engine() == "asyncio":
+            self.downloader = AsyncDownloader(self.tor_handler, waiting_time=self.wait_request,
+                                              random_wait=self.config.random_wait(),
+                                              max_in_flight=self.config.max_in_flight(),
+                                              max_per_host=self.config.max_per_host(),
+                                              results_queue_size=self.config.results_queue_size(),
+                                              results_low_watermark=self.config.results_low_watermark())
+        else:
+            self.downloader = Downloader(5, torhandler=self.tor_handler, waiting_time=self.wait_request,
+                                         random_wait=self.config.random_wait(),
+                                         results_queue_size=self.config.results_queue_size(),
+                                         results_low_watermark=self.config.results_low_watermark())
         self.downloader.start()
 
         self.cookie_handler = None
-        if self.config.has_cookies(seed):
+        self.cookie_pool = None
+        if self.require_cookies():
             self.cookie_handler = CookieHandler(self.seed, self.tor_handler)
+            self.cookie_pool = CookiePool(self.seed, self.cookie_handler)
 
-            self.bucket_cookies = None
-            self.cookies = None
             self.cookie_wait = False
 
         # Config info
         data_dir = self.config.data_dir()
 
+        # - Previous crawl, resolved before the new project directory is created
+        previous_path = None
+        if recrawl:
+            previous_path = recrawl if isinstance(recrawl, str) else self.latest_project_path(data_dir)
+
+            if not previous_path or not os.path.isdir(previous_path):
+                raise FileNotFoundError(f"Error: No project folder to re-crawl in '{data_dir}'.")
+
         # - Project directory
-        today_tms = datetime.now().strftime("%Y%m%d")
-        project_name = f"{self.config.project_name()}-{today_tms}"
-        project_path = os.path.join(data_dir, project_name)
+        if resume:
+            project_path = resume if isinstance(resume, str) else self.latest_project_path(data_dir)
+
+            if not project_path or not os.path.isdir(project_path):
+                raise FileNotFoundError(f"Error: No project folder to resume in '{data_dir}'.")
+
+            logger.info(f"{self.seed} - Resume the project {project_path}")
+        else:
+            today_tms = datetime.now().strftime("%Y%m%d")
+            project_name = f"{self.config.project_name()}-{today_tms}"
+            project_path = os.path.join(data_dir, project_name)
+
+            if os.path.exists(project_path):
+                error_msg = f"Error: The project folder '{project_name}' already exists."
+                raise FileExistsError(error_msg)
 
-        if os.path.exists(project_path):
-            error_msg = f"Error: The project folder '{project_name}' already exists."
-            raise FileExistsError(error_msg)
+            os.makedirs(project_path, exist_ok=True)
 
-        os.makedirs(project_path, exist_ok=True)
+        self.previous_crawl = None
+        if previous_path and os.path.abspath(previous_path) != os.path.abspath(project_path):
+            logger.info(f"{self.seed} - Re-crawl of the project {previous_path}")
+            self.previous_crawl = PreviousCrawl(previous_path)
 
         # Pages folder
         self.page_path = os.path.join(project_path, "pages")
-        os.makedirs(self.page_path)
+        os.makedirs(self.page_path, exist_ok=True)
 
-        self.monitor = CrawlerMonitor(project_path)
+        self.state = CrawlState(project_path, self.seed, checkpoint_interval=self.config.checkpoint_interval())
+
+        self.monitor = CrawlerMonitor(project_path, flush_interval=self.config.monitor_flush_interval(),
+                                      fsync_interval=self.config.monitor_fsync_interval())
         self.monitor.start_scheduling()
 
-        self.filesaver = FileSaver(self.page_path)
+        self.filesaver = FileSaver(self.page_path, n_threads=self.config.saver_threads(),
+                                   store=self.config.page_store(), segment_size=self.config.segment_size(),
+                                   queue_size=self.config.saver_queue_size(),
+                                   low_watermark=self.config.saver_low_watermark())
         self.filesaver.start()
 
+    def latest_project_path(self, data_dir):
+        """
+        :return: the path of the most recent folder of the project, None if there are no folders.
+        """
+        prefix = f"{self.config.project_name()}-"
+        project_names = sorted(name for name in os.listdir(data_dir)
+                               if name.startswith(prefix) and os.path.isdir(os.path.join(data_dir, name)))
+
+        if not project_names:
+            return None
+
+        return os.path.join(data_dir, project_names[-1])
+
     def require_cookies(self):
         return self.config.requires_cookies(self.seed)
 
     def get_info(self):
         return self.monitor.get_info()
 
+    def get_stats(self):
+        return self.monitor.get_stats()
+
     def get_webpage_url(self, webpage):
         if not webpage:
             return None
@@ -109,89 +185,194 @@ class Crawler:
 
     def extract_internal_links(self, web_page):
         """
-        This function, using Beautifulsoup4, search for all the internal links (links of the same website)
-        in a web page.
+        This function search for all the internal links (links of the same website) in a web page.
+        The page is parsed once, and the result is shared with the detector (see document.PageDocument).
         :param web_page: the web_page content retrieved from a request (return value of request.get function).
-        :return: set() of url found in the web_page
+        :return: list of url found in the web_page
         """
         logger.info(f"{self.seed} - Internal link extraction")
 
         request_url = web_page.request.url
         logger.debug(f"{self.seed} - Internal links - Request URL -> {request_url}")
-        domain = urlparse(request_url).netloc
 
-        # Make soup
-        soup = BeautifulSoup(web_page.content, "html.parser", from_encoding="iso-8859-1")
+        return PageDocument.of(web_page, self.link_extractor).internal_links()
+
+    def normalize_links(self, links, visited, unvisited_links, url_variants):
+        """
+        Replace the links with their canonical form (see normalizer.UrlNormalizer), before the visited check.
+        :param links: the internal links of a page
+        :param url_variants: the links already changed by the normalization, so that each variant is counted once
+        :return: list of unique normalized links, in order of appearance.
+        """
+        normalized_links = {}
+        for link in links:
+            normalized_link = self.normalizer(link)
+
+            if normalized_link != link and link not in url_variants:
+                url_variants.add(link)
+                if normalized_link in normalized_links or normalized_link in visited or \
+                        normalized_link in unvisited_links:
+                    # A distinct url before the normalization: one request less
+                    self.monitor.add_avoided_fetch()
 
-        urls = set()
+            normalized_links[normalized_link] = None
 
-        # Get all internal links
-        for a_tag in soup.findAll("a"):
-            href = a_tag.attrs.get("href")
-            href = urljoin(request_url, href).strip("/")
-            # logger.debug(f"{self.market.upper()} - Internal links - Extracting link {href}")
+        return list(normalized_links)
 
-            if href == "" or href is None:
-                # href empty tag
+    def frontier_stats(self):
+        frontier_stats = self.downloader.frontier_stats()
+        frontier_stats["pattern_matches"] = self.priority_policy.matches.copy()
+        return frontier_stats
+
+    def pipeline_stats(self):
+        """
+        :return: the queue depth gauges of the fetch, parse and persist stages. The frontier is not bounded: the crawler
+        both fills it and empties the downloaded pages, so blocking it would stop the crawl.
+        """
+        pipeline_stats = self.downloader.pipeline_stats()
+        pipeline_stats["save"] = self.filesaver.queue.stats()
+        return pipeline_stats
+
+    def collect_pages(self, url_futures):
+        """
+        Take the downloaded pages of the completed futures. The failed downloads are recorded and skipped, the pages not
+        modified since the previous crawl get their previous body, and, with a parse pool, the pages to process are
+        parsed in parallel.
+        :return: list of (url, web_page, previous_page). previous_page is the :class recrawl.PageVersion of a 304.
+        """
+        pages = []
+        for url, future in url_futures:
+            try:
+                web_page = future.result()
+            except Exception as e:
+                logger.error(f"{self.seed} - Error while processing a webpage. SKIP.")
+                logger.error(f"{self.seed} - Error msg: {str(e)}")
+                self.monitor.add_info_unvisited_page(int(time.time()), url, self.actual_ip, "ERROR")
+                self.state.add_visited(url)
                 continue
 
-            if urlparse(href).netloc != domain:
-                # external link
+            if not web_page:
                 continue
 
-            urls.add(href)
+            # Not modified since the previous crawl: the body is the previous page
+            previous_page = self.previous_crawl.restore(url, web_page) if self.previous_crawl else None
+            pages.append((url, web_page, previous_page))
 
-        return list(urls)
+        if self.parse_pool:
+            self.parse_pool.parse([web_page for url, web_page, previous_page in pages
+                                   if 200 <= web_page.status_code < 300 or previous_page], self.link_extractor)
 
-    def enqueue_url(self, url):
+        return pages
+
+    def enqueue_url(self, url, depth=0):
         # TOR request
         cookie = None
 
-        if self.require_cookies():
-            # Try to acquire a new cookie
-            cookie = self.cookie_handler.get_random_cookie(url, validity_check=False)
+        if self.cookie_pool:
+            # The healthiest cookies. With no cookies in the yml file, it waits for new cookies
+            cookie = self.cookie_pool.acquire(MAX_COOKING_WAITING_TIME)
+
+        # Conditional request if the previous crawl saved the validators of the page
+        headers = self.previous_crawl.conditional_headers(url) if self.previous_crawl else None
+
+        self.downloader.enqueue(url, cookie, self.priority_policy.priority(url, depth), headers)
+
+    def save_page(self, url, web_page, index_node, previous_page=None):
+        """
+        Save the page and its content hash, and mark the url as visited in the crawl state once the page is written.
+        A page unchanged since the previous crawl is hard-linked to its previous file (or copied from the previous
+        segments) instead of being saved from the response.
+        :param previous_page: the :class recrawl.PageVersion restored for a 304 (Not Modified) response
+        """
+        if previous_page:
+            content_hash = previous_page.content_hash
+        else:
+            content_hash = hashlib.sha256(web_page.content).hexdigest()
+            previous_page = self.previous_crawl.get(url) if self.previous_crawl else None
+
+        # The url is visited once its page is written: a crash before the write downloads it again on resume
+        def on_saved():
+            self.state.add_visited(url, index_node)
+
+        unchanged = previous_page is not None and previous_page.content_hash == content_hash
+        if unchanged:
+            self.filesaver.link(self.previous_crawl.reader, previous_page.node_index, index_node, on_saved)
+        else:
+            self.filesaver.enqueue(web_page.content, index_node, content_hash, on_saved)
+
+        # A 304 response may omit the validators: keep the previous ones
+        etag = web_page.headers.get("ETag") or (previous_page.etag if unchanged else None)
+        last_modified = web_page.headers.get("Last-Modified") or (previous_page.last_modified if unchanged else None)
+        self.monitor.add_content(url, content_hash, etag, last_modified, unchanged)
+
+    def checkpoint(self, force=False):
+        """
+        Commit the crawl state if the checkpoint interval has elapsed. The saved pages and the monitor rows reach the
+        disk first, so a committed url always has its page and its node row.
+        :return: True if the crawl state has been committed.
+        """
+        if not force and not self.state.is_checkpoint_due():
+            return False
 
-            # No cookies in yml file. Wait new cookies
-            if not cookie:
-                cookie = wait(lambda: self.cookie_handler.get_random_cookie(url, validity_check=False),
-                              sleep_seconds=1, timeout_seconds=MAX_COOKING_WAITING_TIME, waiting_for="waiting for new cookies.")
+        try:
+            self.filesaver.flush()
+            self.monitor.checkpoint()
+        except Exception as e:
+            # Not committed: the checkpoint is tried again at the next iteration
+            logger.error(f"{self.seed} - CHECKPOINT - Pages or monitor rows not saved. Crawl state not committed.")
+            logger.error(f"{self.seed} - Error msg: {str(e)}")
+            return False
 
-        self.downloader.enqueue(url, cookie)
+        self.state.checkpoint(force=True)
+        return True
 
     def validate(self, web_page):
         """
         Check if the url content is valid, without captchas or without any anomalous redirection.
-        If something is found, then the cookie used for that page is removed.
+        If something is found, the cookie used for that page is reported to the cookie pool, which retires the
+        expired and the failing cookies, and the circuit of a captcha is renewed.
         :param web_page: the web page to validate
         :return: True, is the page contains no captchas or anomalous redirect, False otherwise.
         """
 
-        if not self.config.has_cookies(self.seed):
+        if not self.cookie_pool:
             return True
 
-        captcha = captcha_detector(web_page.url, web_page)
-        login_redirect = True
-        if self.login_page:
-            login_redirection(web_page, self.login_page)
+        cookie = web_page.request.headers.get("Cookie") if web_page.request is not None else None
+        latency = web_page.elapsed.total_seconds() if web_page.elapsed else None
+
+        captcha = self.captcha_detector(web_page.url, web_page)
+        login_redirect = bool(self.login_page) and login_redirection(web_page, self.login_page)
 
         if login_redirect or captcha:
             if captcha:
                 logger.info(f"{self.seed} - Captcha FOUND in link {web_page.url}. Request new cookie.")
+                self.tor_handler.renew_circuit(web_page)
             else:
                 logger.info(f"{self.seed} - Redirection to login page. Cookie expired. Request new cookie.")
 
-            return True
+            if cookie:
+                self.cookie_pool.report(cookie, CAPTCHA if captcha else LOGIN_REDIRECT, latency)
+            return False
 
-        return False
+        if cookie:
+            self.cookie_pool.report(cookie, SUCCESS, latency)
+        return True
 
     def start(self):
         """
         Method to execute the crawler.
         :return: no return value. All the web_pages will be saved in a dump folder.
         """
-        # Track visited URLs to avoid duplicates
-        visited = {}
-        unvisited_links = set()
+        # Track visited URLs to avoid duplicates. Only the url fingerprints are kept in memory, the full urls are
+        # in the node table on disk
+        visited = FingerprintTable()
+        if self.config.bloom_filter():
+            # Smaller, but a false positive skips a link never seen
+            unvisited_links = ScalableBloomFilter(self.config.bloom_error_rate())
+        else:
+            unvisited_links = FingerprintTable()
+        url_variants = FingerprintTable()
         try:
             if not self.seed:
                 logger.error(f"No valid seed -> {self.seed}")
@@ -208,9 +389,22 @@ class Crawler:
                 # Get a valid cookie among the cookies stored in the market configuration file
                 self.cookie_handler.cookies_validity_check(self.seed)
 
-            # Create a queue for BFS
-            self.enqueue_url(self.seed)
-            node_index = 0
+            if self.resume:
+                # Rebuild the frontier from the last checkpoint
+                url_depth, pending, node_index = self.state.load(visited, unvisited_links)
+                # The node file may have nodes written after the last checkpoint: their indexes are not reused
+                node_index = max(node_index, self.monitor.next_node_index())
+                logger.info(f"{self.seed} - Resume: {len(visited)} nodes, {len(pending)} pending urls")
+
+                for url in pending:
+                    self.enqueue_url(url, url_depth[url])
+            else:
+                # Create a queue for BFS
+                seed_url = self.normalizer(self.seed)
+                url_depth = {seed_url: 0}
+                self.state.add_pending(seed_url, None, 0)
+                self.enqueue_url(seed_url, 0)
+                node_index = 0
 
             # Crawling iter condition
             # 1. all the urls are crawled
@@ -220,53 +414,60 @@ class Crawler:
             cookie_timeout = False
             start_time = time.time()
             n_links_crawled = 0
-            url_depth = {self.seed: 0}
             url_attempts = {}
 
             while (not self.downloader.is_empty() and n_links_crawled < self.max_link and not cookie_timeout and
                    time.time() - start_time < self.max_crawl_time):
 
                 try:
-                    url_futures = self.downloader.get_results()
+                    self.checkpoint()
+
+                    # Wait for the first completed download, then take all the completed ones without waiting for
+                    # the others
+                    url_futures = self.downloader.get_results(timeout=RESULTS_TIMEOUT)
                     logger.debug(f"{self.seed} - CRAWLER: futures len -> {len(url_futures)}")
 
-                    # If no pages are available, wait for the thread to complete.
                     if not url_futures:
-                        time.sleep(0.1)
                         continue
 
-                    self.monitor.update_tor_requests(self.tor_handler.n_requests_sent)
-
-                    for url, future in url_futures:
-                        try:
-                            web_page = future.result()
-                        except Exception as e:
-                            logger.error(f"{self.seed} - Error while processing a webpage. SKIP.")
-                            logger.error(f"{self.seed} - Error msg: {str(e)}")
-                            url = self.downloader.get_future_url(future)
-                            self.monitor.add_info_unvisited_page(int(time.time()), url, self.actual_ip, "ERROR")
-                            continue
+                    self.monitor.update_tor_requests(self.tor_handler.n_requests_sent,
+                                                     self.tor_handler.n_requests_reused)
+                    self.monitor.update_circuits(self.tor_handler.circuit_stats())
+                    if self.cookie_pool:
+                        self.monitor.update_cookies(self.cookie_pool.stats())
+                    self.monitor.update_frontier(self.frontier_stats())
+                    self.monitor.update_pipeline(self.pipeline_stats())
 
-                        if not web_page:
-                            continue
+                    for url, web_page, previous_page in self.collect_pages(url_futures):
+                        # Parsed at most once, by the first between the detector and the link extraction, unless the
+                        # parse pool has already parsed it
+                        PageDocument.of(web_page, self.link_extractor)
 
                         # Check if the page is valid or not.
                         if not self.validate(web_page):
-                            if url not in url_attempts or url_attempts[url] < MAX_RETRIES:
-                                url_attempts[url] = 1
-                                self.enqueue_url(url)
+                            url_attempts[url] = url_attempts.get(url, 0) + 1
+                            if url_attempts[url] <= MAX_RETRIES:
+                                self.enqueue_url(url, url_depth.get(url, 0))
                                 logger.debug(f"{self.seed} - Error while downloading the url -> {url}. RETRY.")
                             else:
                                 logger.error(f"{self.seed} - Error while downloading the url -> {url}. SKIPPED.")
                                 self.monitor.add_info_unvisited_page(int(time.time()), url, self.actual_ip, "ERROR")
+                                self.state.add_visited(url)
+                                url_depth.pop(url, None)
+
+                            # The page of a captcha or of the login is not saved
+                            continue
 
                         # STATUS CODE CHECK
-                        if web_page.status_code < 200 or web_page.status_code >= 300:
-                            self.monitor.add_info_page(int(time.time()), url, self.actual_ip, web_page.status_code)
+                        if (web_page.status_code < 200 or web_page.status_code >= 300) and not previous_page:
+                            self.monitor.add_info_page(int(time.time()), url, self.actual_ip, web_page.status_code,
+                                                       len(web_page.content))
+                            self.state.add_visited(url)
                             continue
 
                         try:
-                            internal_urls = self.extract_internal_links(web_page)
+                            internal_urls = self.normalize_links(self.extract_internal_links(web_page), visited,
+                                                                 unvisited_links, url_variants)
                             logger.debug(f"{self.seed} - Internal links: {len(internal_urls)}.")
                         except Exception as e:
                             logger.error(f"{self.seed} - Internal link extraction failed..")
@@ -285,10 +486,13 @@ class Crawler:
 
                         if url not in visited:
                             visited[url] = node_index
-                            self.monitor.add_node(url, node_index, depth, str(node_index)+".html")
+                            self.monitor.add_node(url, node_index, depth, self.filesaver.file_name(node_index))
                             node_index += 1
 
-                        self.monitor.add_info_page(int(time.time()), url, self.actual_ip, web_page.status_code)
+                        # The body of a 304 comes from the disk
+                        n_bytes = 0 if previous_page else len(web_page.content)
+                        self.monitor.add_info_page(int(time.time()), url, self.actual_ip, web_page.status_code,
+                                                   n_bytes)
 
                         # Enqueue new links and add edges
                         for link in internal_urls:
@@ -297,26 +501,30 @@ class Crawler:
                             if depth + 1 > self.max_depth:
                                 logger.info(f"{self.seed} - URL {link}: depth value greater than {self.max_depth}. IGNORED.")
                                 unvisited_links.add(link)
+                                self.state.add_unvisited(link)
                                 self.monitor.add_info_unvisited_page(int(time.time()), link, self.actual_ip, "MAX DEPTH")
                             else:
-                                if link not in visited and link not in unvisited_links:
+                                # A link skipped at max depth is scheduled when it is found again at a lower depth
+                                if link not in visited:
                                     url_depth[link] = depth + 1
 
                                     # Save scheduled page
                                     self.monitor.add_scheduled_page(int(time.time()), link, self.actual_ip, depth + 1)
 
-                                    self.enqueue_url(link)
+                                    self.enqueue_url(link, depth + 1)
                                     visited[link] = node_index
-                                    self.monitor.add_node(link, node_index, depth + 1, str(node_index)+".html")
+                                    self.state.add_pending(link, node_index, depth + 1)
+                                    self.monitor.add_node(link, node_index, depth + 1,
+                                                          self.filesaver.file_name(node_index))
                                     node_index += 1
 
                                 self.monitor.add_edge(visited[url], visited[link])
 
                         # Save the html page
-                        self.filesaver.enqueue(web_page, visited[url])
+                        self.save_page(url, web_page, visited[url], previous_page)
 
                         n_links_crawled += 1
-                except TimeoutExpired as te:
+                except CookieTimeoutException as te:
                     logger.error(f"{self.seed} - Cookie timeout expired.")
                     logger.error(f"{self.seed} - Error msg: {str(te)}")
                     cookie_timeout = True
@@ -334,4 +542,7 @@ class Crawler:
 
         self.downloader.stop()
         self.filesaver.stop()
+        # The last changes are committed only if their monitor rows are saved
+        committed = self.checkpoint(force=True)
         self.monitor.stop_program()
+        self.state.close(commit=committed)
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import time
+import logging
+import threading
+
+logger = logging.getLogger("CRATOR")
+
+STATE_FILE = "crawlstate.db"
+CHECKPOINT_TIME = 30    # 30 seconds
+
+# Url states
+PENDING = 0     # Scheduled, not processed yet
+VISITED = 1     # Downloaded (or failed) and processed
+UNVISITED = 2   # Skipped (e.g., max depth)
+
+
+class CrawlState:
+    """
+    Persistent crawl frontier and visited store, saved in a SQLite database (WAL mode) in the project directory.
+    The changes are committed at each checkpoint, so that a crawl can be resumed from the exact set of pending urls.
+    The state is built by the main thread and used by the thread that runs the crawl (see crator.py) and by the saver
+    threads, which mark the urls as visited once their pages are written: the connection is shared among the threads
+    and each use holds the lock.
+    """
+    def __init__(self, project_path, seed, checkpoint_interval=CHECKPOINT_TIME):
+        self.seed = seed
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint = time.monotonic()
+
+        self.lock = threading.Lock()
+        self.path = os.path.join(project_path, STATE_FILE)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                seed TEXT NOT NULL,
+                url TEXT NOT NULL,
+                node_index INTEGER,
+                depth INTEGER,
+                state INTEGER NOT NULL,
+                PRIMARY KEY (seed, url)
+            )""")
+        self.connection.commit()
+
+    def save(self, url, node_index, depth, state):
+        with self.lock:
+            self.connection.execute("""
+                INSERT INTO urls (seed, url, node_index, depth, state) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (seed, url) DO UPDATE SET
+                    node_index = COALESCE(excluded.node_index, node_index),
+                    depth = COALESCE(excluded.depth, depth),
+                    state = excluded.state""", (self.seed, url, node_index, depth, state))
+
+    def add_pending(self, url, node_index, depth):
+        self.save(url, node_index, depth, PENDING)
+
+    def add_visited(self, url, node_index=None):
+        self.save(url, node_index, None, VISITED)
+
+    def add_unvisited(self, url):
+        self.save(url, None, None, UNVISITED)
+
+    def is_checkpoint_due(self):
+        return time.monotonic() - self.last_checkpoint >= self.checkpoint_interval
+
+    def checkpoint(self, force=False):
+        """
+        Commit the changes if the checkpoint interval has elapsed.
+        """
+        if not force and not self.is_checkpoint_due():
+            return
+
+        with self.lock:
+            self.connection.commit()
+            self.last_checkpoint = time.monotonic()
+        logger.debug(f"{self.seed} - CRAWL STATE - Checkpoint")
+
+    def load(self, visited, unvisited_links):
+        """
+        Read the state saved by a previous run.
+        :param visited: the url -> node index store to fill (e.g., a fingerprint.FingerprintTable).
+        :param unvisited_links: the set of the skipped urls to fill (any container with an add method).
+        :return: (url_depth, pending, next_node_index). url_depth maps each pending url to its depth, pending lists
+        the pending urls in scheduling order.
+        """
+        url_depth = {}
+        pending = []
+        next_node_index = 0
+
+        with self.lock:
+            rows = self.connection.execute("""
+                SELECT url, node_index, depth, state FROM urls WHERE seed = ?
+                ORDER BY node_index IS NOT NULL, node_index""", (self.seed,)).fetchall()
+
+        for url, node_index, depth, state in rows:
+            if node_index is not None:
+                visited[url] = node_index
+                next_node_index = max(next_node_index, node_index + 1)
+
+            if state == PENDING:
+                url_depth[url] = depth
+                pending.append(url)
+            elif state == UNVISITED:
+                unvisited_links.add(url)
+
+        return url_depth, pending, next_node_index
+
+    def close(self, commit=True):
+        """
+        :param commit: False to drop the changes after the last checkpoint
+        """
+        if commit:
+            self.checkpoint(force=True)
+        with self.lock:
+            self.connection.close()
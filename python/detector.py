@@ -1,24 +1,88 @@
 from bs4 import BeautifulSoup
 import requests
 import logging
+import re
+import threading
+
+# Local imports
+import extractor
+from document import PageDocument
 
 logger = logging.getLogger("CRATOR")
 
 
-def captcha_detector(url, response):
-    logger.debug(f"DETECTOR - Captcha detector")
-    soup = BeautifulSoup(response.text, "html.parser")
-    captchas = soup.find_all("img", src=lambda x: "captcha" in x.lower())
+class CaptchaDetector:
+    """
+    Captcha detection in stages, from the cheapest: a captcha page is the result of an anomalous redirection, so the
+    pages that have not been redirected are discarded by their history; then the raw body is scanned for the captcha
+    markers with a compiled byte regex; the page is parsed, to look for a captcha image, only when the body contains a
+    marker. The markers can be configured per seed (see from_rules).
+    """
+    def __init__(self, markers=extractor.CAPTCHA_MARKERS, require_redirect=True, confirm=True):
+        """
+        :param markers: words of the captcha pages, matched case insensitive
+        :param require_redirect: if True, only the pages redirected to another url can be captcha pages
+        :param confirm: if True, a page with a marker is a captcha page only if the src of one of its images contains
+        a marker. If False, the marker is enough (e.g., for a marker that is the text of the captcha form).
+        """
+        self.markers = tuple(marker.lower() for marker in markers)
+        self.require_redirect = require_redirect
+        self.confirm = confirm
+        self.pattern = re.compile(b"|".join(re.escape(marker.encode()) for marker in self.markers), re.IGNORECASE)
+
+        # Pages discarded at each stage, and captchas found
+        self.stats = {"no_redirect": 0, "no_marker": 0, "parsed": 0, "captchas": 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_rules(rules):
+        """
+        :param rules: dict with the optional keys markers, require_redirect and confirm (see __init__), as the
+        crawler.captcha entries of crator.yml.
+        """
+        return CaptchaDetector(markers=rules.get('markers') or extractor.CAPTCHA_MARKERS,
+                               require_redirect=rules.get('require_redirect', True),
+                               confirm=rules.get('confirm', True))
+
+    def __call__(self, url, response):
+        logger.debug(f"DETECTOR - Captcha detector")
+
+        if self.require_redirect and not anomalous_redirection(url, response):
+            self.count("no_redirect")
+            return False
+
+        if not response.content or not self.pattern.search(response.content):
+            self.count("no_marker")
+            return False
+
+        if self.confirm:
+            self.count("parsed")
+            document = PageDocument.of(response)
+            if self.markers == extractor.CAPTCHA_MARKERS:
+                captchas = document.captcha_images
+            else:
+                captchas = extractor.captcha_images(document.img_srcs, self.markers)
+
+            if not captchas:
+                return False
+
+        logger.debug(f"DETECTOR - Captcha detector - Captcha and anomalous redirect found in url -> {url}")
+        self.count("captchas")
+        return True
 
-    # if captchas:
-    #     logger.debug(f"DETECTOR - Captcha detector - Captcha word found in url -> {url}")
+    def count(self, stage):
+        with self.lock:
+            self.stats[stage] += 1
 
-    if captchas and anomalous_redirection(url, response):
-        if anomalous_redirection(url, response):
-            logger.debug(f"DETECTOR - Captcha detector - Captcha word and anomalous redirect found in url -> {url}")
-        return True
 
-    return False
+default_detector = CaptchaDetector()
+
+
+def captcha_detector(url, response):
+    """
+    :return: True if the page is a captcha page, according to the default markers (see CaptchaDetector).
+    """
+    return default_detector(url, response)
 
 
 def anomalous_redirection(url_request, webpage):
@@ -42,8 +106,8 @@ def login_redirection(webpage, loginpage=None):
         logger.debug("DETECTOR - No login page defined")
         return False
     try:
-        webpage.history.reverse()
-        for response in webpage.history:
+        # The history is shared with the other consumers of the page: do not reverse it in place
+        for response in reversed(webpage.history):
             if response.status_code == 302 and response.url == loginpage.url:
                 return True
     except Exception as e:
@@ -0,0 +1,78 @@
+# Local imports
+import extractor
+
+
+class PageDocument:
+    """
+    Parsed view of a downloaded page, shared by the detector and the link extraction.
+    The page is decoded and parsed lazily, at most once, the first time one of its parts is requested.
+    """
+    def __init__(self, response, backend=extractor.DEFAULT_BACKEND):
+        self.response = response
+        self.backend = backend
+
+        self._text = None
+        self._hrefs = None
+        self._img_srcs = None
+        self._internal_links = None
+        self._captcha_images = None
+
+    @classmethod
+    def of(cls, response, backend=extractor.DEFAULT_BACKEND):
+        """
+        Return the document attached to a response, creating it the first time.
+        :param response: :class requests.Response
+        :param backend: the parser used if the document does not exist yet (see extractor.BACKENDS).
+        """
+        document = getattr(response, "document", None)
+        if document is None:
+            document = cls(response, backend)
+            response.document = document
+
+        return document
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.response.content.decode(extractor.PAGE_ENCODING)
+
+        return self._text
+
+    def parse(self):
+        self._hrefs, self._img_srcs = extractor.parse_page(self.response.content, self.backend)
+
+    def set_parsed(self, hrefs, img_srcs, internal_links=None, captcha_images=None):
+        """
+        Attach the result of a parse done elsewhere (e.g., by a parsepool.ParsePool worker process).
+        """
+        self._hrefs = hrefs
+        self._img_srcs = img_srcs
+        self._internal_links = internal_links
+        self._captcha_images = captcha_images
+
+    @property
+    def hrefs(self):
+        if self._hrefs is None:
+            self.parse()
+
+        return self._hrefs
+
+    @property
+    def img_srcs(self):
+        if self._img_srcs is None:
+            self.parse()
+
+        return self._img_srcs
+
+    @property
+    def captcha_images(self):
+        if self._captcha_images is None:
+            self._captcha_images = extractor.captcha_images(self.img_srcs)
+
+        return self._captcha_images
+
+    def internal_links(self):
+        if self._internal_links is None:
+            self._internal_links = extractor.internal_links(self.response.request.url, self.hrefs)
+
+        return self._internal_links
@@ -1,20 +1,28 @@
-import concurrent.futures
 import os
+import queue
 import logging
 import time
 import threading
-from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
 from handler import TorHandler
+from scheduler import PolitenessScheduler
+from pipeline import BoundedQueue
+
+RESULTS_QUEUE_SIZE = 1000
 
 
 logger = logging.getLogger("CRATOR")
 
 
 class Downloader:
-    def __init__(self, n_threads, torhandler, waiting_time=1.5):
-        self.queue = deque()
+    def __init__(self, n_threads, torhandler, waiting_time=1.5, random_wait=False, results_queue_size=RESULTS_QUEUE_SIZE,
+                 results_low_watermark=None):
+        """
+        :param results_queue_size: number of downloaded pages not yet processed by the crawler that stops new downloads
+        :param results_low_watermark: number of downloaded pages not yet processed that restarts them
+        """
+        self.queue = PolitenessScheduler(waiting_time, random_wait)
         self.n_threads = n_threads
         self.waiting_time = waiting_time
 
@@ -24,23 +32,39 @@ class Downloader:
         self.torhandler = torhandler
         self.running = True
         self.lock = threading.Lock()
-        self.results = []
-        self.futures = []
+        self.condition = threading.Condition(self.lock)
+        self.free_workers = threading.Semaphore(n_threads)
 
+        # Each future pushes (url, future) in the completion queue as soon as it is done. No new download is started
+        # while the queue is above its watermarks
+        self.completed = BoundedQueue("downloaded", results_queue_size, results_low_watermark)
         self.future_url_map = {}
 
     def is_empty(self):
-        # logger.debug(f"DOWNLOADER: Empty -> {not self.queue and not self.results}")
-        return not self.queue and not self.futures
+        with self.lock:
+            return not self.queue and not self.future_url_map
 
-    def enqueue(self, url, cookie):
-        self.queue.append((url, cookie))
+    def enqueue(self, url, cookie, priority=0, headers=None):
+        with self.condition:
+            self.queue.append((url, cookie, headers), priority)
+            self.condition.notify()
 
-    def has_results(self):
-        if self.get_results():
-            return True
+    def frontier_stats(self):
+        with self.lock:
+            return self.queue.stats()
 
-        return False
+    def pipeline_stats(self):
+        """
+        :return: the gauges of the fetch stage: downloads in flight, and the queue of the downloaded pages.
+        """
+        completed_stats = self.completed.stats()
+        with self.lock:
+            n_in_flight = len(self.future_url_map) - completed_stats["size"]
+
+        return {"in_flight": max(n_in_flight, 0), "downloaded": completed_stats}
+
+    def has_results(self):
+        return len(self.completed) > 0
 
     def get_future_url(self, future):
         if id(future) not in self.future_url_map:
@@ -48,48 +72,85 @@ class Downloader:
 
         return self.future_url_map[id(future)]
 
-    def get_results(self):
-        # logger.debug(f"DOWNLOADER: Results: queue before -> {len(self.queue)}")
-        completed_futures = [future for future in concurrent.futures.as_completed(self.futures)]
-
-        # Update self.futures to remove completed futures
-        self.futures = [future for future in self.futures if future not in completed_futures]
-
-        completed_futures = [(self.future_url_map.pop(id(future)), future) for future in completed_futures]
+    def track(self, url, future):
+        """
+        Register a submitted future. It must be called holding self.lock.
+        """
+        self.future_url_map[id(future)] = url
+        future.add_done_callback(lambda done_future: self.complete(url, done_future))
+
+    def complete(self, url, future):
+        try:
+            # The download is already done: the result is always accepted, the watermarks stop the next ones
+            self.completed.put((url, future), block=False)
+        except queue.Full:
+            # Downloader stopped
+            pass
+
+    def get_results(self, timeout=0):
+        """
+        Return the downloads completed so far, without waiting for the ones still running.
+        :param timeout: if no download is completed, wait at most timeout seconds for the first one.
+        :return: list of (url, future)
+        """
+        completed_futures = []
+        try:
+            if timeout:
+                completed_futures.append(self.completed.get(timeout=timeout))
+
+            while True:
+                completed_futures.append(self.completed.get_nowait())
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            for url, future in completed_futures:
+                del self.future_url_map[id(future)]
 
         return completed_futures
 
-        # return [future.result() for future in completed_futures]
-        #
-        #
-        # future_completed = []
-        # for future in concurrent.futures.as_completed(self.futures):
-        #     future_completed.append(future)
-        #
-        # for future in future_completed:
-        #     self.futures.remove(future)
-        #
-        # return [future.result() for future in future_completed]
-
     def start(self):
         threading.Thread(target=self.download, daemon=True).start()
 
     def download(self):
         with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
             while self.running:
-                if not self.queue:
-                    time.sleep(0.1)
-                    continue
+                # Backpressure: wait for the crawler to process the downloaded pages
+                if not self.completed.wait_for_room():
+                    break
+
+                # A url is submitted only when a worker can start it right away, otherwise its request time would
+                # drift from the one booked in the scheduler
+                self.free_workers.acquire()
+
+                if not self.submit_next(executor):
+                    self.free_workers.release()
+
+    def submit_next(self, executor):
+        """
+        Wait until a host can be contacted and submit its next url. The lock is released while waiting, so enqueue
+        is never blocked.
+        :return: True if a url has been submitted, False if the downloader has been stopped.
+        """
+        with self.condition:
+            while self.running:
+                now = time.monotonic()
+                item = self.queue.pop_ready(now)
 
-                with self.lock:
-                    while self.queue:
-                        url, cookie = self.queue.popleft()
+                if item:
+                    url, cookie, headers = item
+                    future = executor.submit(self.torhandler.send_request, url, cookie, headers)
+                    future.add_done_callback(lambda done_future: self.free_workers.release())
+                    self.track(url, future)
+                    return True
 
-                        future = executor.submit(self.torhandler.send_request, url, cookie)
-                        self.futures.append(future)
-                        self.future_url_map[id(future)] = url
+                self.condition.wait(self.queue.next_ready_in(now))
 
-                        time.sleep(self.waiting_time)
+        return False
 
     def stop(self):
-        self.running = False
\ No newline at end of file
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        self.completed.close()
@@ -6,6 +6,10 @@ class InvalidCookieException(Exception):
     pass
 
 
+class CookieTimeoutException(Exception):
+    pass
+
+
 class UnknownProxyProtocolException(Exception):
     pass
 
@@ -0,0 +1,196 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+# Encoding used to decode the page bytes, the same used by the BeautifulSoup reference path
+PAGE_ENCODING = "iso-8859-1"
+
+DEFAULT_BACKEND = "htmlparser"
+
+# Words of the src of the captcha images
+CAPTCHA_MARKERS = ("captcha",)
+
+# Characters removed by urllib before looking for the scheme of an url
+URL_LEADING_CHARS = "".join(chr(i) for i in range(0x21))
+URL_UNSAFE_CHARS = re.compile("[\t\r\n]")
+URL_SCHEME = re.compile(r"[A-Za-z][A-Za-z0-9+.\-]*:")
+
+
+class PageCollector(HTMLParser):
+    """
+    Streaming html.parser handler that only collects the href attribute of the <a> tags and the src attribute of the
+    <img> tags, without building a tree. The tokenizer is the same used by BeautifulSoup with the "html.parser" builder.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+        self.img_srcs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            # Same rules of BeautifulSoup: the last duplicated attribute wins, an attribute without value is empty
+            href = None
+            for name, value in attrs:
+                if name == "href":
+                    href = value if value is not None else ""
+
+            self.hrefs.append(href)
+
+        elif tag == "img":
+            src = None
+            for name, value in attrs:
+                if name == "src":
+                    src = value if value is not None else ""
+
+            if src is not None:
+                self.img_srcs.append(src)
+
+
+class LxmlPageTarget:
+    """
+    lxml parser target that only collects the href attribute of the <a> tags and the src attribute of the <img> tags.
+    """
+    def __init__(self):
+        self.hrefs = []
+        self.img_srcs = []
+
+    def start(self, tag, attrib):
+        if tag == "a":
+            self.hrefs.append(attrib.get("href"))
+        elif tag == "img" and "src" in attrib:
+            self.img_srcs.append(attrib["src"])
+
+    def close(self):
+        return self.hrefs, self.img_srcs
+
+
+def bs4_parse(content):
+    soup = BeautifulSoup(content, "html.parser", from_encoding=PAGE_ENCODING)
+    hrefs = [a_tag.attrs.get("href") for a_tag in soup.find_all("a")]
+    img_srcs = [img_tag.attrs["src"] for img_tag in soup.find_all("img") if "src" in img_tag.attrs]
+    return hrefs, img_srcs
+
+
+def htmlparser_parse(content):
+    collector = PageCollector()
+    collector.feed(content.decode(PAGE_ENCODING))
+    collector.close()
+    return collector.hrefs, collector.img_srcs
+
+
+def lxml_parse(content):
+    if etree is None:
+        raise ImportError("The lxml link extractor requires the lxml package.")
+
+    parser = etree.HTMLParser(target=LxmlPageTarget(), encoding=PAGE_ENCODING)
+    parser.feed(content)
+    return parser.close()
+
+
+BACKENDS = {
+    "bs4": bs4_parse,
+    "htmlparser": htmlparser_parse,
+    "lxml": lxml_parse,
+}
+
+
+def parse_page(content, backend=DEFAULT_BACKEND):
+    """
+    Collect, in a single pass, the href values of the <a> tags and the src values of the <img> tags of a page.
+    :param content: the page body, as bytes.
+    :param backend: one of "bs4" (reference), "htmlparser" or "lxml".
+    :return: (hrefs, img_srcs). hrefs contains None for the <a> tags without href, img_srcs skips the <img> tags
+    without src.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown link extractor '{backend}'. Valid values: {', '.join(BACKENDS)}.")
+
+    return BACKENDS[backend](content)
+
+
+def extract_hrefs(content, backend=DEFAULT_BACKEND):
+    """
+    Collect the href values of all the <a> tags of a page.
+    :return: list of href values, None for the <a> tags without href.
+    """
+    hrefs, _ = parse_page(content, backend)
+    return hrefs
+
+
+def captcha_images(img_srcs, markers=CAPTCHA_MARKERS):
+    """
+    :param markers: lowercase words of the captcha image urls
+    :return: the src values of the images that look like a captcha.
+    """
+    return [src for src in img_srcs if any(marker in src.lower() for marker in markers)]
+
+
+def is_relative(href):
+    """
+    Check if an href has neither a scheme nor a netloc, so that joined with a base url it keeps the base netloc.
+    """
+    href = URL_UNSAFE_CHARS.sub("", href.lstrip(URL_LEADING_CHARS))
+    return not href.startswith("//") and not URL_SCHEME.match(href)
+
+
+def internal_links(request_url, hrefs):
+    """
+    Resolve the hrefs of a page and keep the internal ones (links of the same website).
+    The base url is parsed once per page and the same href is resolved once, the netloc of the relative hrefs is
+    taken from the base url without parsing the joined url.
+    :param request_url: the url of the page.
+    :param hrefs: the href values, as returned by extract_hrefs.
+    :return: list of unique internal urls, in order of appearance.
+    """
+    domain = urlparse(request_url).netloc
+    base = request_url.strip("/")
+
+    urls = {}
+    resolved = {}
+    for href in hrefs:
+        if href in resolved:
+            continue
+
+        if not href:
+            url = base
+        else:
+            url = urljoin(request_url, href).strip("/")
+            if url == "" or (not is_relative(href) and urlparse(url).netloc != domain):
+                # href empty tag or external link
+                url = None
+
+        resolved[href] = url
+        if url:
+            urls[url] = None
+
+    return list(urls)
+
+
+def reference_internal_links(content, request_url):
+    """
+    Reference implementation, based on a BeautifulSoup tree. Used to validate the other backends.
+    """
+    domain = urlparse(request_url).netloc
+    soup = BeautifulSoup(content, "html.parser", from_encoding=PAGE_ENCODING)
+
+    urls = set()
+    for a_tag in soup.findAll("a"):
+        href = a_tag.attrs.get("href")
+        href = urljoin(request_url, href).strip("/")
+
+        if href == "" or href is None:
+            continue
+
+        if urlparse(href).netloc != domain:
+            continue
+
+        urls.add(href)
+
+    return list(urls)
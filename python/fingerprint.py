@@ -0,0 +1,151 @@
+import hashlib
+import math
+from array import array
+
+INITIAL_CAPACITY = 1 << 16
+MAX_LOAD_FACTOR = 0.7
+
+BLOOM_INITIAL_CAPACITY = 1 << 16
+BLOOM_ERROR_RATE = 0.001
+BLOOM_GROWTH = 4            # Capacity ratio between two consecutive filters
+BLOOM_TIGHTENING = 0.5      # Error rate ratio between two consecutive filters
+
+
+def fingerprint(url):
+    """
+    :return: the 64-bit hash of an url, never 0 (0 marks the empty slots of a FingerprintTable).
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), "little") or 1
+
+
+class FingerprintTable:
+    """
+    Map from url to node index that stores only the 64-bit fingerprint of the url, in an open addressing table
+    (linear probing) backed by two typed arrays: 12 bytes per slot instead of a str and a dict entry per url.
+    Two urls with the same fingerprint are considered the same url (probability about n^2 / 2^65).
+    """
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        size = 1 << max(capacity - 1, 1).bit_length()
+        self.keys = array('Q', bytes(8 * size))
+        self.values = array('I', bytes(4 * size))
+        self.mask = size - 1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def slot(self, key):
+        keys = self.keys
+        mask = self.mask
+
+        i = key & mask
+        while keys[i] and keys[i] != key:
+            i = (i + 1) & mask
+
+        return i
+
+    def __contains__(self, url):
+        return self.keys[self.slot(fingerprint(url))] != 0
+
+    def get(self, url, default=None):
+        i = self.slot(fingerprint(url))
+        if not self.keys[i]:
+            return default
+
+        return self.values[i]
+
+    def __getitem__(self, url):
+        i = self.slot(fingerprint(url))
+        if not self.keys[i]:
+            raise KeyError(url)
+
+        return self.values[i]
+
+    def __setitem__(self, url, value):
+        self.put(fingerprint(url), value)
+
+    def add(self, url):
+        """
+        Set-like insertion, for the tables used only for membership checks.
+        """
+        self.put(fingerprint(url), 0)
+
+    def put(self, key, value):
+        i = self.slot(key)
+        if not self.keys[i]:
+            self.keys[i] = key
+            self.size += 1
+
+        self.values[i] = value
+
+        if self.size > MAX_LOAD_FACTOR * len(self.keys):
+            self.resize(2 * len(self.keys))
+
+    def resize(self, size):
+        keys, values = self.keys, self.values
+        self.keys = array('Q', bytes(8 * size))
+        self.values = array('I', bytes(4 * size))
+        self.mask = size - 1
+
+        for key, value in zip(keys, values):
+            if key:
+                i = self.slot(key)
+                self.keys[i] = key
+                self.values[i] = value
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        n_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.n_hashes = max(1, round(n_bits / capacity * math.log(2)))
+        self.n_bits = n_bits
+        self.bits = bytearray((n_bits + 7) // 8)
+        self.size = 0
+
+    def positions(self, key):
+        # Double hashing on the two halves of the 64-bit fingerprint
+        h1 = key & 0xFFFFFFFF
+        h2 = (key >> 32) | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.size += 1
+
+
+class ScalableBloomFilter:
+    """
+    Set of urls that can only answer "seen" / "not seen", with a bounded false positive rate ("seen" for an url never
+    added), in about 2 bytes per url at 0.1%. When a filter is full, a bigger one with a tighter error rate is added,
+    so the overall error rate stays below the configured one.
+    """
+    def __init__(self, error_rate=BLOOM_ERROR_RATE, initial_capacity=BLOOM_INITIAL_CAPACITY):
+        self.error_rate = error_rate
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - BLOOM_TIGHTENING))]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, url):
+        key = fingerprint(url)
+        return any(key in bloom_filter for bloom_filter in self.filters)
+
+    def add(self, url):
+        key = fingerprint(url)
+        if any(key in bloom_filter for bloom_filter in self.filters):
+            return
+
+        last_filter = self.filters[-1]
+        if last_filter.size >= last_filter.capacity:
+            error_rate = self.error_rate * (1 - BLOOM_TIGHTENING) * BLOOM_TIGHTENING ** len(self.filters)
+            last_filter = BloomFilter(last_filter.capacity * BLOOM_GROWTH, error_rate)
+            self.filters.append(last_filter)
+
+        last_filter.add(key)
+        self.size += 1
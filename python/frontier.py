@@ -0,0 +1,50 @@
+import re
+import itertools
+
+DEPTH_WEIGHT = 1.0
+
+
+class PriorityPolicy:
+    """
+    Priority of the urls of a seed in the frontier (see scheduler.PolitenessScheduler): the lower, the sooner.
+    The score is depth * depth_weight minus the weight of the first url pattern that matches, e.g., product and
+    vendor pages before the pagination. Among equal scores the oldest url comes first (breadth first), or the newest
+    one with newest_first. With the default rules the order is the breadth first order of discovery.
+    """
+    def __init__(self, depth_weight=DEPTH_WEIGHT, patterns=(), newest_first=False):
+        """
+        :param depth_weight: score added for each level of depth
+        :param patterns: list of {"pattern": regex, "weight": number}. A positive weight moves the matching urls ahead
+        :param newest_first: if True, among equal scores the last discovered url comes first
+        """
+        self.depth_weight = depth_weight
+        self.patterns = [(re.compile(pattern["pattern"]), pattern.get("weight", 0)) for pattern in patterns]
+        self.newest_first = newest_first
+
+        self.counter = itertools.count()
+        self.matches = {pattern.pattern: 0 for pattern, _ in self.patterns}
+
+    @classmethod
+    def from_rules(cls, rules):
+        """
+        :param rules: dict of priority rules of a seed, as stored in the configuration file
+        """
+        return cls(depth_weight=rules.get("depth_weight", DEPTH_WEIGHT), patterns=rules.get("patterns", ()),
+                   newest_first=rules.get("newest_first", False))
+
+    def score(self, url, depth):
+        score = depth * self.depth_weight
+
+        for pattern, weight in self.patterns:
+            if pattern.search(url):
+                self.matches[pattern.pattern] += 1
+                return score - weight
+
+        return score
+
+    def priority(self, url, depth):
+        """
+        :return: the priority of the url, a (score, discovery order) tuple.
+        """
+        order = next(self.counter)
+        return self.score(url, depth), -order if self.newest_first else order
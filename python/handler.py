@@ -1,21 +1,374 @@
 import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import threading
 import logging
 import random
-from fake_useragent import UserAgent
+import statistics
+from requests.adapters import HTTPAdapter
 from stem.control import Controller
 from stem import Signal
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlunparse
 
 # Local imports
 from utils.config import Configuration
 import detector
+from useragent import UserAgentProvider
 from exceptions import InvalidCookieException, HTTPStatusCodeError
 
 logger = logging.getLogger("CRATOR")
 MAX_CONNECTION_ATTEMPT = 3
 NEW_REQUEST_DELAY = 2
+POOL_CONNECTIONS = 10   # Number of hosts kept alive by each session
+POOL_MAXSIZE = 1        # A session is used by a single worker at a time
+MAX_PAGE_SIZE = 10 * 1024 * 1024    # 10 MB
+CHUNK_SIZE = 64 * 1024
+LATENCY_SMOOTHING = 0.2     # Weight of the last request in the latency and error averages of a circuit
+ERROR_PENALTY = 4           # A circuit that always fails scores as 1 + ERROR_PENALTY times its latency
+EXPLORATION = 0.05          # Fraction of the requests sent to a random circuit, to update the stats of the others
+FAILURE_LATENCY = 30        # Seconds: latency of a circuit that has only failed, when no circuit has been measured
+
+
+class BodyBuffer:
+    """
+    Chunks of a streamed body, up to max_size bytes. Shared by the engines: the requests and the aiohttp responses
+    are read in chunks of CHUNK_SIZE bytes until the end of the body or until the buffer is full.
+    """
+    def __init__(self, max_size=MAX_PAGE_SIZE):
+        self.max_size = max_size
+        self.chunks = []
+        self.size = 0
+
+    def add(self, chunk):
+        """
+        :return: False if the body is larger than max_size: the rest must not be downloaded.
+        """
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        return self.size <= self.max_size
+
+    def content(self):
+        """
+        :return: the body read, truncated to max_size bytes.
+        """
+        return b"".join(self.chunks)[:self.max_size]
+
+
+def read_body(web_page, max_size=MAX_PAGE_SIZE):
+    """
+    Read the body of a streamed response, at most max_size bytes. The rest of a longer body is not downloaded: the
+    connection is closed and the body truncated.
+    :param web_page: a :class requests.Response of a request sent with stream=True
+    :return: the response, with its content read.
+    """
+    body = BodyBuffer(max_size)
+    for chunk in web_page.iter_content(CHUNK_SIZE):
+        if not body.add(chunk):
+            logger.warning(f"TOR HANDLER - Page larger than {max_size} bytes, truncated: {web_page.url}")
+            web_page.close()
+            break
+
+    web_page._content = body.content()
+    web_page._content_consumed = True
+    return web_page
+
+
+class SessionPool:
+    """
+    Pool of requests.Session objects shared by the downloader workers. Each session keeps its SOCKS and
+    HTTP connections alive, so consecutive requests on the same circuit skip the handshakes.
+    When the tor circuit changes (NEWNYM), the pool is invalidated and the sessions are rebuilt.
+    """
+    def __init__(self, proxy, max_page_size=MAX_PAGE_SIZE):
+        self.proxy = proxy
+        self.max_page_size = max_page_size
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.generation = 0
+
+        self.n_sessions_created = 0
+        self.n_requests_reused = 0
+
+    def new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.proxies.update(self.proxy)
+
+        session.generation = self.generation
+        session.n_requests = 0
+
+        with self.lock:
+            self.n_sessions_created += 1
+
+        return session
+
+    def acquire(self):
+        # LIFO order: the most recently used session is the one with the warmest connections
+        try:
+            session = self.idle.get_nowait()
+        except queue.Empty:
+            return self.new_session()
+
+        if session.generation != self.generation:
+            session.close()
+            return self.new_session()
+
+        return session
+
+    def release(self, session):
+        # Cookies set by the server must not leak into the next request (the cookie is sent by header)
+        session.cookies.clear()
+
+        if session.generation != self.generation:
+            session.close()
+            return
+
+        self.idle.put(session)
+
+    def get(self, url, headers=None):
+        session = self.acquire()
+        try:
+            if session.n_requests > 0:
+                with self.lock:
+                    self.n_requests_reused += 1
+
+            session.n_requests += 1
+
+            # Streamed: a huge page is cut at max_page_size instead of being loaded in memory
+            return read_body(session.get(url, headers=headers, stream=True), self.max_page_size)
+        finally:
+            self.release(session)
+
+    def invalidate(self, proxy=None):
+        """
+        Drop all the idle sessions. Sessions currently in use are closed when they are released.
+        :param proxy: the proxy of the new sessions, unchanged if None
+        """
+        with self.lock:
+            if proxy is not None:
+                self.proxy = proxy
+            self.generation += 1
+
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class Circuit:
+    """
+    A tor circuit, with its own sessions and statistics. The circuits of a pool share the tor daemon but not the
+    circuit: tor isolates the streams by SOCKS credentials (IsolateSOCKSAuth, enabled by default) and by SocksPort,
+    so each circuit connects with its own username. Renewing a circuit only changes its username: the next requests
+    are sent on a new tor circuit, while the requests of the other circuits go on.
+    """
+    def __init__(self, index, proxy_url=None, max_page_size=MAX_PAGE_SIZE):
+        """
+        :param index: the position of the circuit in the pool, part of its username
+        :param proxy_url: the proxy of the circuit (e.g., socks5h://localhost:9050), no proxy if None
+        """
+        self.index = index
+        self.proxy_url = proxy_url
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.sessions = SessionPool(self.proxy, max_page_size)
+
+        # Moving averages of the latency (seconds) and of the error rate (0..1)
+        self.latency = None
+        self.error_rate = 0.0
+        self.n_in_flight = 0
+        self.n_requests = 0
+        self.n_errors = 0
+        self.n_renewals = 0
+
+    @property
+    def proxy(self):
+        """
+        :return: the requests proxies of the circuit. A socks proxy gets the credentials of the current generation.
+        """
+        if not self.proxy_url:
+            return {}
+
+        proxy_url = self.proxy_url
+        parsed = urlparse(proxy_url)
+        if parsed.scheme.startswith("socks"):
+            netloc = parsed.netloc.rsplit("@", 1)[-1]
+            proxy_url = urlunparse(parsed._replace(netloc=f"crator{self.index}-{self.generation}:crator@{netloc}"))
+
+        return {"http": proxy_url, "https": proxy_url}
+
+    def score(self, default_latency=FAILURE_LATENCY):
+        """
+        :param default_latency: the latency, in seconds, of a circuit whose requests have all failed (e.g., the median
+        latency of the pool)
+        :return: the expected cost of a request on the circuit, in seconds: its latency, increased by its errors and
+        by the requests already in flight. The lower the better, 0 for a circuit not yet used (or just renewed).
+        """
+        if self.latency is None and self.error_rate == 0:
+            return 0
+
+        latency = default_latency if self.latency is None else self.latency
+        return latency * (1 + ERROR_PENALTY * self.error_rate) * (1 + self.n_in_flight)
+
+    def get(self, url, headers=None):
+        self.start_request()
+        start_time = time.monotonic()
+        try:
+            web_page = self.sessions.get(url, headers=headers)
+        except Exception:
+            self.record(None)
+            raise
+
+        self.record(time.monotonic() - start_time)
+        web_page.circuit = self.index
+        return web_page
+
+    def start_request(self):
+        with self.lock:
+            self.n_in_flight += 1
+
+    def record(self, latency):
+        """
+        Update the statistics with a completed request.
+        :param latency: the duration of the request in seconds, None if it failed
+        """
+        with self.lock:
+            self.n_in_flight -= 1
+            self.n_requests += 1
+
+            error = 1.0 if latency is None else 0.0
+            self.n_errors += int(error)
+            self.error_rate += LATENCY_SMOOTHING * (error - self.error_rate)
+
+            if latency is not None:
+                self.latency = latency if self.latency is None else \
+                    self.latency + LATENCY_SMOOTHING * (latency - self.latency)
+
+    def renew(self):
+        """
+        Move the circuit to a new tor circuit (new exit node). The statistics of the old one are reset.
+        """
+        with self.lock:
+            self.generation += 1
+            self.n_renewals += 1
+            self.latency = None
+            self.error_rate = 0.0
+
+        # Keep-alive connections are bound to the old circuit
+        self.sessions.invalidate(self.proxy)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "circuit": self.index,
+                "requests": self.n_requests,
+                "errors": self.n_errors,
+                "in_flight": self.n_in_flight,
+                "renewals": self.n_renewals,
+                "latency": None if self.latency is None else round(self.latency, 3),
+                "error_rate": round(self.error_rate, 3),
+            }
+
+
+class CircuitPool:
+    """
+    Pool of tor circuits shared by all the requests of the process. Each request goes to the better of two circuits
+    chosen at random (power of two choices), by latency, error rate and requests in flight: the slow or failing
+    circuits get less requests, without sending all of them to the same circuit. A few requests go to a random
+    circuit, so that a circuit slow once is measured again.
+    """
+    def __init__(self, circuits):
+        if not circuits:
+            raise ValueError("A circuit pool needs at least one circuit.")
+
+        self.circuits = circuits
+
+        # Key (e.g., a cookie) -> index of the circuit it is pinned to
+        self.pins = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def from_proxy(proxy_url, n_circuits=1, socks_ports=None, max_page_size=MAX_PAGE_SIZE):
+        """
+        :param proxy_url: the tor proxy, e.g., socks5h://localhost:9050. None for direct connections.
+        :param n_circuits: number of circuits
+        :param socks_ports: optional list of tor SocksPorts: the circuits are spread over them, round robin
+        """
+        circuits = []
+        for index in range(max(1, n_circuits)):
+            circuit_proxy = proxy_url
+            if proxy_url and socks_ports:
+                parsed = urlparse(proxy_url)
+                circuit_proxy = urlunparse(parsed._replace(
+                    netloc=f"{parsed.hostname}:{socks_ports[index % len(socks_ports)]}"))
+
+            circuits.append(Circuit(index, circuit_proxy, max_page_size))
+
+        return CircuitPool(circuits)
+
+    def __len__(self):
+        return len(self.circuits)
+
+    def __getitem__(self, index):
+        return self.circuits[index]
+
+    def __iter__(self):
+        return iter(self.circuits)
+
+    def choose(self, key=None):
+        """
+        :param key: if not None, the requests with the same key always go to the same circuit (e.g., the requests of a
+        cookie session, so that the session keeps its exit node). The keys are spread over the circuits.
+        :return: the :class Circuit of the next request.
+        """
+        if key is not None:
+            with self.lock:
+                index = self.pins.get(key)
+                if index is None:
+                    n_pins = [0] * len(self.circuits)
+                    for pinned_index in self.pins.values():
+                        n_pins[pinned_index] += 1
+                    index = self.pins[key] = n_pins.index(min(n_pins))
+
+            return self.circuits[index]
+
+        if len(self.circuits) == 1:
+            return self.circuits[0]
+
+        if random.random() < EXPLORATION:
+            return random.choice(self.circuits)
+
+        first, second = random.sample(self.circuits, 2)
+        default_latency = self.median_latency()
+        return first if first.score(default_latency) <= second.score(default_latency) else second
+
+    def median_latency(self):
+        """
+        :return: the median latency of the measured circuits, FAILURE_LATENCY if none has been measured.
+        """
+        latencies = [circuit.latency for circuit in self.circuits if circuit.latency is not None]
+        return statistics.median(latencies) if latencies else FAILURE_LATENCY
+
+    def get(self, url, headers=None, key=None):
+        return self.choose(key).get(url, headers=headers)
+
+    def unpin(self, key):
+        with self.lock:
+            self.pins.pop(key, None)
+
+    def renew(self, index):
+        self.circuits[index].renew()
+
+    def invalidate(self):
+        for circuit in self.circuits:
+            circuit.sessions.invalidate()
+
+    def stats(self):
+        return [circuit.stats() for circuit in self.circuits]
 
 
 class TorHandler:
@@ -25,17 +378,40 @@ class TorHandler:
         self.proxy = {"http": http_proxy, "https": http_proxy}
         self.lock = threading.Lock()
 
+        # Cleared while a new ip is requested: the requests wait for it
+        self.circuit_ready = threading.Event()
+        self.circuit_ready.set()
+
+        self.max_page_size = config.max_page_size()
+        self.user_agents = UserAgentProvider(config.user_agents())
+        self.circuits = CircuitPool.from_proxy(http_proxy, config.tor_circuits(), config.tor_socks_ports(),
+                                               self.max_page_size)
+        # A cookie session always on the same circuit
+        self.pin_cookies = config.cookie_circuit_pinning()
+
         self.n_requests_sent = 0
 
-    def get_random_useragent(self):
-        ua = UserAgent()
-        return ua.random
+    @property
+    def n_requests_reused(self):
+        return sum(circuit.sessions.n_requests_reused for circuit in self.circuits)
+
+    @property
+    def n_sessions_created(self):
+        return sum(circuit.sessions.n_sessions_created for circuit in self.circuits)
 
-    def send_request(self, url, cookie=None):
-        if self.lock.locked():
+    def get_random_useragent(self, cookie=None):
+        """
+        :return: a random user agent, always the same one for a cookie session.
+        """
+        return self.user_agents.get(cookie)
+
+    def send_request(self, url, cookie=None, headers=None):
+        """
+        :param headers: additional request headers (e.g., the validators of a conditional request)
+        """
+        if not self.circuit_ready.is_set():
             logger.debug("TOR HANDLER - Waiting for a new ip.")
-        while self.lock.locked():
-            time.sleep(1)
+            self.circuit_ready.wait()
 
         # attempt = 0
         # web_page = None
@@ -43,11 +419,13 @@ class TorHandler:
 
         logger.debug(f"TOR HANDLER - Downloading URL: {url}")
 
-        header = {'User-Agent': self.get_random_useragent()}
+        header = {'User-Agent': self.get_random_useragent(cookie)}
         if cookie:
             header["Cookie"] = cookie
+        if headers:
+            header.update(headers)
 
-        web_page = requests.get(url, headers=header, proxies=self.proxy)
+        web_page = self.choose_circuit(cookie).get(url, headers=header)
         status_code = web_page.status_code
         logger.debug(f"TOR HANDLER - STATUS CODE: {status_code}")
         self.n_requests_sent += 1
@@ -92,27 +470,60 @@ class TorHandler:
         logger.debug(f"TOR HANDLER - URL CHECK: FALSE")
         return False
 
+    def choose_circuit(self, cookie=None):
+        """
+        :return: the :class Circuit of a request: the circuit of the cookie session if the cookies are pinned.
+        """
+        return self.circuits.choose(cookie if self.pin_cookies and cookie else None)
+
+    def renew_circuit(self, web_page):
+        """
+        Move the circuit that downloaded a page (e.g., a page with a captcha) to a new exit node. Only the requests of
+        that circuit change exit node, the other circuits are not stopped.
+        :param web_page: a response of send_request
+        """
+        index = getattr(web_page, "circuit", None)
+        if index is None:
+            return
+
+        logger.debug(f"TOR HANDLER - Renewing circuit {index}")
+        self.circuits.renew(index)
+
+    def circuit_stats(self):
+        return self.circuits.stats()
+
     def renew_connection(self):
+        """
+        Ask tor for new circuits for all the connections (NEWNYM), blocking all the requests until the ip changes.
+        Use renew_circuit to change the exit node of a single circuit.
+        """
         with self.lock:
-            logger.debug("TOR HANDLER - New ip generation...")
-            header = {'User-Agent': self.get_random_useragent()}
-            ip = requests.get('https://ident.me', proxies=self.proxy, headers=header).text
-            logger.debug(f"TOR HANDLER - Actual IP: {ip}")
-            # print(f"TOR HANDLER - Actual IP: {ip}")
-
-            # Send a request to tor asking for a new ip
-            with Controller.from_port(port=9051) as controller:
-                controller.authenticate(password='N0nn0')
-                controller.signal(Signal.NEWNYM)
-
-            # Check if the ip has been changed
-            new_ip = self.get_ip()
-            while new_ip == ip:
-                time.sleep(1)
+            self.circuit_ready.clear()
+            try:
+                logger.debug("TOR HANDLER - New ip generation...")
+                header = {'User-Agent': self.get_random_useragent()}
+                ip = requests.get('https://ident.me', proxies=self.proxy, headers=header).text
+                logger.debug(f"TOR HANDLER - Actual IP: {ip}")
+                # print(f"TOR HANDLER - Actual IP: {ip}")
+
+                # Send a request to tor asking for a new ip
+                with Controller.from_port(port=9051) as controller:
+                    controller.authenticate(password='N0nn0')
+                    controller.signal(Signal.NEWNYM)
+
+                # Keep-alive connections are bound to the old circuits
+                self.circuits.invalidate()
+
+                # Check if the ip has been changed
                 new_ip = self.get_ip()
+                while new_ip == ip:
+                    time.sleep(1)
+                    new_ip = self.get_ip()
 
-            logger.debug(f"TOR HANDLER - New IP: {new_ip}")
-            # print(f"TOR HANDLER - New IP: {new_ip}")
+                logger.debug(f"TOR HANDLER - New IP: {new_ip}")
+                # print(f"TOR HANDLER - New IP: {new_ip}")
+            finally:
+                self.circuit_ready.set()
 
     def get_ip(self):
         header = {'User-Agent': self.get_random_useragent()}
@@ -127,9 +538,18 @@ class CookieHandler:
         self.tor_handler = torhandler
         self.nocookiepage = None
 
-        self.bucket_cookies = None
         self.cookies = None
 
+        # Version of the configuration snapshot the cookies have been read from
+        self.cookies_version = None
+        self.captcha_detector = detector.CaptchaDetector.from_rules(self.config.captcha(seed))
+
+        # Cookies validated in parallel, at most n_validation_workers at a time. Cookie -> (valid, check time)
+        self.n_validation_workers = self.config.cookie_validation_workers()
+        self.validation_ttl = self.config.cookie_validation_ttl()
+        self.verdicts = {}
+        self.verdicts_lock = threading.Lock()
+
     @property
     def nocookiepage(self):
         return self._nocookiepage
@@ -148,7 +568,7 @@ class CookieHandler:
             if self.nocookiepage and detector.login_redirection(web_page, self.nocookiepage):
                 logger.info(f"{self.seed} COOKIE HANDLER - Validity CHECK: False -> Login redirection")
                 return False
-            if detector.captcha_detector(url, web_page):
+            if self.captcha_detector(url, web_page):
                 logger.info(f"{self.seed} COOKIE HANDLER - Validity CHECK: False -> Captcha")
                 return False
         except Exception as e:
@@ -157,10 +577,51 @@ class CookieHandler:
 
         return True
 
+    def cached_verdict(self, cookie):
+        """
+        :return: the verdict of a cookie checked less than validation_ttl seconds ago, None otherwise.
+        """
+        with self.verdicts_lock:
+            verdict = self.verdicts.get(cookie)
+
+        if verdict is None or time.monotonic() - verdict[1] > self.validation_ttl:
+            return None
+
+        return verdict[0]
+
+    def check_cookie(self, url, cookie):
+        valid = self.is_valid(url, cookie)
+        with self.verdicts_lock:
+            self.verdicts[cookie] = (valid, time.monotonic())
+
+        return valid
+
+    def validate_cookies(self, url, cookies):
+        """
+        Check the cookies in parallel, on at most n_validation_workers requests at a time. The cookies with a recent
+        verdict are not checked again.
+        The checks do not go through the downloader: their responses are not pages of the crawl. Their threads are
+        stopped once the cookies are checked.
+        :return: dict cookie -> True if valid.
+        """
+        verdicts = {cookie: self.cached_verdict(cookie) for cookie in cookies}
+        to_check = [cookie for cookie, valid in verdicts.items() if valid is None]
+
+        if to_check:
+            logger.info(f"{self.seed} COOKIE HANDLER - Checking {len(to_check)} cookies "
+                        f"({len(cookies) - len(to_check)} already checked)")
+            with ThreadPoolExecutor(max_workers=min(self.n_validation_workers, len(to_check))) as executor:
+                futures = [executor.submit(self.check_cookie, url, cookie) for cookie in to_check]
+                for cookie, future in zip(to_check, futures):
+                    verdicts[cookie] = future.result()
+
+        return verdicts
+
     def cookies_validity_check(self, url):
         logger.info(f"{self.seed} COOKIE HANDLER - Cookies validity check ")
-        if not self.cookies or self.config.is_updated():
+        if not self.cookies or self.config.version() != self.cookies_version:
             try:
+                self.cookies_version = self.config.version()
                 self.cookies = self.config.cookies(self.seed)
                 # self.cookies = market_config.get_cookies(self.market)
             except:
@@ -173,78 +634,30 @@ class CookieHandler:
             logger.error(f"{self.seed} COOKIE HANDLER - {error_msg}")
             raise InvalidCookieException(error_msg)
 
-        for cookie in self.cookies:
-            logger.info(f"{self.seed} - Cookie validity check")
+        for cookie, valid in self.validate_cookies(url, self.cookies.copy()).items():
             logger.info(f"{self.seed} - Cookie: {cookie}")
 
-            if not self.is_valid(url, cookie):
+            if not valid:
                 logger.info(f"{self.seed} - INVALID COOKIE")
                 self.remove_cookie(cookie)
             else:
                 logger.info(f"{self.seed} - VALID COOKIE")
 
-    def get_random_cookie(self, url, validity_check=True):
-        # Check if there are cookies in the cookie list. If not, read them from the market config file.
-        if not self.cookies or self.config.is_updated():
-            try:
-                self.cookies = self.config.cookies(self.seed)
-                # self.cookies = market_config.get_cookies(self.market)
-                if not self.cookies:
-                    # raise InvalidCookieException("Empty list in the market config file. "
-                    #                              "Please update it with at least one valid cookie.")
-                    return None
-            except:
-                raise FileNotFoundError("No cookies found in the market config file")
-
-        # Bucket cookies list is empty because all the cookies have already been chosen.
-        # Replenish the bucket with the cookies saved in the market config file
-        if not self.bucket_cookies:
-            self.bucket_cookies = self.cookies.copy()
-
-        logger.debug(f"{self.seed} COOKIE HANDLER - RANDOM COOKIE -> COOKIE LIST")
-        [logger.debug(f"{self.seed} - {ck}") for ck in self.cookies]
-        logger.debug(f"{self.seed} COOKIE HANDLER - RANDOM COOKIE -> BUCKET COOKIE LIST")
-        [logger.debug(f"{self.seed} - {ck}") for ck in self.bucket_cookies]
-
-        if not validity_check:
-            random_index = random.randint(0, len(self.bucket_cookies) - 1)  # generate a random index
-            return self.bucket_cookies.pop(random_index)  # remove the element at the random index
-
-        # Cookie validity check
-        while self.bucket_cookies:
-            random_index = random.randint(0, len(self.bucket_cookies) - 1)  # generate a random index
-            random_cookie = self.bucket_cookies.pop(random_index)  # remove the element at the random index
-
-            logger.debug(f"{self.seed} COOKIE HANDLER - RANDOM COOKIE -> BUCKET COOKIE LIST (UPDATE)")
-            [logger.debug(f"{self.seed} - {ck}") for ck in self.bucket_cookies]
-
-            if self.is_valid(url, random_cookie):
-                return random_cookie
-            else:
-                # Remove the invalid cookie from the list and in the market config file
-                self.remove_cookie(random_cookie)
-
-            if not self.bucket_cookies:
-                self.bucket_cookies = self.cookies.copy()
-
-        return None
-
     def remove_cookie(self, cookie):
         """
-        Remove the cookie from the list and in the market config file
+        Remove the cookie from the list and in the market config file. The cookie may not be in the list (e.g., a
+        cookie retired by the cookie pool before the list has been read).
         """
-        try:
-            logger.debug(f"{self.seed} - REMOVE COOKIE")
-            logger.debug(f"{self.seed} - COOKIE LIST")
-            [logger.debug(f"{self.seed} - BEFORE: {cookie}") for cookie in self.cookies]
+        logger.debug(f"{self.seed} - REMOVE COOKIE")
+        if self.cookies and cookie in self.cookies:
             self.cookies.remove(cookie)
-            [logger.debug(f"{self.seed} - AFTER: {cookie}") for cookie in self.cookies]
 
-            self.config.remove_cookie(self.seed, cookie)
-            # market_config.remove_cookie(self.market, cookie)
-        except ValueError as ve:
-            logger.error(f"{self.seed} - COOKIE TO REMOVE NOT FOUND.")
-            logger.error(f"{self.seed} - Error msg: {str(ve)}.")
+        self.tor_handler.user_agents.forget(cookie)
+        self.tor_handler.circuits.unpin(cookie)
+        with self.verdicts_lock:
+            self.verdicts.pop(cookie, None)
+
+        self.config.remove_cookie(self.seed, cookie)
 
 
 if __name__ == '__main__':
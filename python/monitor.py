@@ -1,5 +1,7 @@
 import csv
 import os
+from itertools import islice
+from array import array
 import logging
 import time
 import threading
@@ -7,166 +9,483 @@ import threading
 logger = logging.getLogger("CRATOR")
 
 SCHEDULE_TIME = 60   # 1 minute
+FSYNC_TIME = 300     # 5 minutes
+
+
+class CsvAppender:
+    """
+    Append-only csv file. Each checkpoint writes only the new rows; the data reaches the disk (fsync) at most
+    every fsync_interval seconds.
+    """
+    def __init__(self, file_path, header, fsync_interval=FSYNC_TIME):
+        self.file_path = file_path
+        self.fsync_interval = fsync_interval
+        self.last_fsync = time.monotonic()
+        self.n_rows = 0
+
+        self.file = open(file_path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+        # The header is written only in a new file
+        if self.file.tell() == 0:
+            self.writer.writerow(header)
+            self.file.flush()
+
+    def write(self, rows):
+        for row in rows:
+            self.writer.writerow(row)
+            self.n_rows += 1
+        self.file.flush()
+
+        if time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.fsync()
+
+    def fsync(self):
+        os.fsync(self.file.fileno())
+        self.last_fsync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.flush()
+            self.fsync()
+            self.file.close()
+
+
+class StringTable:
+    """
+    Table of interned strings: each distinct string (e.g., an url referenced by the node, the scheduled page and the
+    crawled page rows) is stored once and referenced by its index.
+    """
+    def __init__(self):
+        self.strings = []
+        self.indexes = {}
+
+    def intern(self, value):
+        index = self.indexes.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self.indexes[value] = index
+
+        return index
+
+    def __getitem__(self, index):
+        return self.strings[index]
+
+
+class ColumnBuffer:
+    """
+    Rows stored by column in typed arrays, instead of tuples of str. The typecodes are the ones of the array module,
+    plus 's' for a string column, stored as indexes of a StringTable. The rows are formatted only when written.
+    """
+    def __init__(self, typecodes, strings):
+        self.typecodes = typecodes
+        self.strings = strings
+        self.columns = [array('I' if typecode == 's' else typecode) for typecode in typecodes]
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def append(self, *values):
+        # All the values are converted before the first append: an invalid value does not leave a partial row
+        values = [str(value) if typecode == 's' else int(value) for typecode, value in zip(self.typecodes, values)]
+
+        n_appended = 0
+        try:
+            for column, typecode, value in zip(self.columns, self.typecodes, values):
+                column.append(self.strings.intern(value) if typecode == 's' else value)
+                n_appended += 1
+        except OverflowError:
+            # A value out of the range of its column
+            for column in self.columns[:n_appended]:
+                column.pop()
+            raise
+
+    def rows(self):
+        formatters = [self.strings.__getitem__ if typecode == 's' else str for typecode in self.typecodes]
+        for values in zip(*self.columns):
+            yield tuple(formatter(value) for formatter, value in zip(formatters, values))
+
+
+# Column types of the monitor files: q timestamp, s string, H status code, I index or depth
+CRAWLED_COLUMNS = "qssH"
+SCHEDULED_COLUMNS = "qssI"
+UNVISITED_COLUMNS = "qsss"
+NODE_COLUMNS = "sIIs"
+EDGE_COLUMNS = "II"
+CONTENT_COLUMNS = "ssss"
+
+
+class CrawlStats:
+    """
+    Running counters of a crawl, updated when the events are added to the monitor, so that reading them does not
+    depend on the size of the crawl. Thread safe.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.status_classes = {200: 0, 300: 0, 400: 0, 500: 0}
+        self.status_codes = {}
+        self.reasons = {}
+        self.depths = {}
+        self.n_unvisited_pages = 0
+        self.n_nodes = 0
+        self.bytes_downloaded = 0
+        self.n_avoided_fetches = 0
+        self.n_unchanged_pages = 0
+        self.tor_requests = 0
+        self.tor_reused_requests = 0
+        self.frontier = {}
+        self.pipeline = {}
+        self.circuits = []
+        self.cookies = []
+
+    @staticmethod
+    def status_class(status_code):
+        if 200 <= status_code < 300:
+            return 200
+        elif 300 <= status_code < 400:
+            return 300
+        elif 400 <= status_code < 500:
+            return 400
+        return 500
+
+    def add_page(self, status_code, n_bytes=0):
+        status_code = int(status_code)
+        with self.lock:
+            self.status_classes[self.status_class(status_code)] += 1
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+            self.bytes_downloaded += n_bytes
+
+    def add_unvisited_page(self, reason):
+        with self.lock:
+            self.n_unvisited_pages += 1
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def add_node(self, depth):
+        depth = int(depth)
+        with self.lock:
+            self.n_nodes += 1
+            self.depths[depth] = self.depths.get(depth, 0) + 1
+
+    def add_avoided_fetch(self):
+        with self.lock:
+            self.n_avoided_fetches += 1
+
+    def add_unchanged_page(self):
+        with self.lock:
+            self.n_unchanged_pages += 1
+
+    def update_frontier(self, frontier_stats):
+        with self.lock:
+            self.frontier = frontier_stats
+
+    def update_pipeline(self, pipeline_stats):
+        with self.lock:
+            self.pipeline = pipeline_stats
+
+    def update_circuits(self, circuit_stats):
+        with self.lock:
+            self.circuits = circuit_stats
+
+    def update_cookies(self, cookie_stats):
+        with self.lock:
+            self.cookies = cookie_stats
+
+    def update_tor_requests(self, n_requests, n_reused_requests):
+        with self.lock:
+            self.tor_requests = n_requests
+            self.tor_reused_requests = n_reused_requests
+
+    def info(self):
+        """
+        :return: the 7-tuple of CrawlerMonitor.get_info
+        """
+        with self.lock:
+            return self.status_classes[200], self.status_classes[300], self.status_classes[400], \
+                self.status_classes[500], self.n_unvisited_pages, self.n_nodes, self.tor_requests
+
+    def snapshot(self):
+        """
+        :return: a consistent copy of all the counters, as a dict.
+        """
+        with self.lock:
+            return {
+                "status_classes": self.status_classes.copy(),
+                "status_codes": self.status_codes.copy(),
+                "reasons": self.reasons.copy(),
+                "depths": self.depths.copy(),
+                "unvisited_pages": self.n_unvisited_pages,
+                "nodes": self.n_nodes,
+                "bytes_downloaded": self.bytes_downloaded,
+                "avoided_fetches": self.n_avoided_fetches,
+                "unchanged_pages": self.n_unchanged_pages,
+                "tor_requests": self.tor_requests,
+                "tor_reused_requests": self.tor_reused_requests,
+                "frontier": self.frontier.copy(),
+                "pipeline": self.pipeline.copy(),
+                "circuits": list(self.circuits),
+                "cookies": list(self.cookies),
+            }
 
 
 class CrawlerMonitor:
-    def __init__(self, project_path=None):
-        self.info_pages = []
-        self.previous_info_page_length = 0
-        self.scheduled_pages = []
-        self.previous_scheduled_pages_length = 0
-        self.info_unvisited_page = []
-        self.previous_info_unvisited_page_length = 0
-        self.nodes = []
-        self.previous_nodes_length = 0
-        self.edges = []
-        self.previous_edges_length = 0
+    def __init__(self, project_path=None, flush_interval=SCHEDULE_TIME, fsync_interval=FSYNC_TIME):
+        # Rows not yet persisted. They are dropped from memory at each checkpoint.
+        self.info_pages, self.scheduled_pages, self.info_unvisited_page, self.nodes, self.edges, self.contents = \
+            self.create_buffers()
 
-        self.tor_requests = 0
+        self.stats = CrawlStats()
 
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.flush_interval = flush_interval
+        self.stop_event = threading.Event()
+
+        # Without a project path, the rows are only kept in memory
+        self.project_path = project_path
         if project_path:
             if not os.path.exists(project_path) or not os.path.isdir(project_path):
                 raise FileNotFoundError(f"The project path {project_path} does not exist.")
 
-            self.stop_flag = False
-
             # Init file and folders
             monitor_path = os.path.join(project_path, "monitor")
             os.makedirs(monitor_path, exist_ok=True)
 
             self.crawled_file_path = os.path.join(monitor_path, "crawledpages.csv")
-            self.__init_header(self.crawled_file_path, ["timestamp", "url", "ip_client", "status_code"])
+            self.crawled_file = CsvAppender(self.crawled_file_path, ["timestamp", "url", "ip_client", "status_code"],
+                                            fsync_interval)
 
             self.scheduled_file_path = os.path.join(monitor_path, "scheduled.csv")
-            self.__init_header(self.scheduled_file_path, ["timestamp", "url", "depth"])
+            self.scheduled_file = CsvAppender(self.scheduled_file_path, ["timestamp", "url", "ip_client", "depth"],
+                                              fsync_interval)
 
             self.unvisited_pages_file_path = os.path.join(monitor_path, "unvisitedlinks.csv")
-            self.__init_header(self.unvisited_pages_file_path, ["timestamp", "url", "reason"])
+            self.unvisited_pages_file = CsvAppender(self.unvisited_pages_file_path,
+                                                    ["timestamp", "url", "ip_client", "reason"], fsync_interval)
 
             graph_path = os.path.join(project_path, "graph")
             os.makedirs(graph_path, exist_ok=True)
 
             self.nodes_file_path = os.path.join(graph_path, "nodes.csv")
-            self.__init_header(self.nodes_file_path, ["url", "index", "depth_level", "filename"])
+            self.nodes_file = CsvAppender(self.nodes_file_path, ["url", "index", "depth_level", "filename"],
+                                          fsync_interval)
             self.edges_file_path = os.path.join(graph_path, "edges.csv")
-            self.__init_header(self.edges_file_path, ["node", "node"])
-
-    def __init_header(self, file_path, attribute_list):
-        with open(file_path, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(attribute_list)
-
-    def __save_list_to_csv(self, file_path, element_list):
-        try:
-            with open(file_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                for element in element_list:
-                    writer.writerow(element)
-        except Exception as e:
-            logger.error(f"MONITOR - Error while saving {file_path}.")
-            logger.error(f"Error msg: {str(e)}.")
-
-    def add_info_page(self, timestamp, url, ip, status_code):
-        self.info_pages.append((str(timestamp), url, str(ip), str(status_code)))
+            self.edges_file = CsvAppender(self.edges_file_path, ["node", "node"], fsync_interval)
+
+            # Content hash and validators of the saved pages, used by the next re-crawl
+            self.contents_file_path = os.path.join(graph_path, "contents.csv")
+            self.contents_file = CsvAppender(self.contents_file_path,
+                                             ["url", "content_hash", "etag", "last_modified"], fsync_interval)
+
+    @staticmethod
+    def create_buffers():
+        """
+        :return: empty buffers for the crawled pages, scheduled pages, unvisited pages, nodes, edges and contents rows,
+        sharing the same string table.
+        """
+        strings = StringTable()
+        return ColumnBuffer(CRAWLED_COLUMNS, strings), ColumnBuffer(SCHEDULED_COLUMNS, strings), \
+            ColumnBuffer(UNVISITED_COLUMNS, strings), ColumnBuffer(NODE_COLUMNS, strings), \
+            ColumnBuffer(EDGE_COLUMNS, strings), ColumnBuffer(CONTENT_COLUMNS, strings)
+
+    def add_info_page(self, timestamp, url, ip, status_code, n_bytes=0):
+        with self.lock:
+            self.info_pages.append(timestamp, url, ip, status_code)
+        self.stats.add_page(status_code, n_bytes)
 
     def add_scheduled_page(self, timestamp, url, ip, depth):
-        self.scheduled_pages.append((str(timestamp), url, str(ip), str(depth)))
+        with self.lock:
+            self.scheduled_pages.append(timestamp, url, ip, depth)
 
     def add_info_unvisited_page(self, timestamp, url, ip, reason):
-        self.info_unvisited_page.append((str(timestamp), url, str(ip), reason))
+        with self.lock:
+            self.info_unvisited_page.append(timestamp, url, ip, reason)
+        self.stats.add_unvisited_page(reason)
 
     def add_node(self, url, index, depth, filename):
-        self.nodes.append((url, str(index), str(depth), filename))
+        with self.lock:
+            self.nodes.append(url, index, depth, filename)
+        self.stats.add_node(depth)
 
     def add_edge(self, node1, node2):
-        self.edges.append((str(node1), str(node2)))
+        with self.lock:
+            self.edges.append(node1, node2)
+
+    def add_content(self, url, content_hash, etag=None, last_modified=None, unchanged=False):
+        """
+        :param unchanged: True if the page is the same of the previous crawl (not modified, or same content hash)
+        """
+        with self.lock:
+            self.contents.append(url, content_hash, etag or "", last_modified or "")
+        if unchanged:
+            self.stats.add_unchanged_page()
 
     def add_edges(self, parent, children):
         for child in children:
             self.add_edge(parent, child)
 
-    def update_tor_requests(self, n_requests):
-        self.tor_requests = n_requests
+    def add_avoided_fetch(self):
+        """
+        Count a link not requested because its normalized url was already known.
+        """
+        self.stats.add_avoided_fetch()
+
+    def update_frontier(self, frontier_stats):
+        """
+        :param frontier_stats: dict of statistics of the frontier (queued, pushed, popped urls, pattern matches)
+        """
+        self.stats.update_frontier(frontier_stats)
+
+    def update_pipeline(self, pipeline_stats):
+        """
+        :param pipeline_stats: dict of queue depth gauges by stage (downloads in flight, downloaded pages, pages to save)
+        """
+        self.stats.update_pipeline(pipeline_stats)
+
+    def update_circuits(self, circuit_stats):
+        """
+        :param circuit_stats: list of dicts of statistics of the tor circuits (requests, errors, latency, renewals)
+        """
+        self.stats.update_circuits(circuit_stats)
+
+    def update_cookies(self, cookie_stats):
+        """
+        :param cookie_stats: list of dicts of statistics of the cookies (requests, outcomes, failure rate, latency)
+        """
+        self.stats.update_cookies(cookie_stats)
+
+    def update_tor_requests(self, n_requests, n_reused_requests=0):
+        self.stats.update_tor_requests(n_requests, n_reused_requests)
+
+    @property
+    def tor_requests(self):
+        return self.stats.tor_requests
+
+    @property
+    def tor_reused_requests(self):
+        return self.stats.tor_reused_requests
 
     def get_info(self):
-        n_200_pages = 0
-        n_300_pages = 0
-        n_400_pages = 0
-        n_500_pages = 0
-        for page in self.info_pages:
-            if 200 <= int(page[3]) < 300:
-                n_200_pages += 1
-            elif 300 <= int(page[3]) < 400:
-                n_300_pages += 1
-            elif 400 <= int(page[3]) < 500:
-                n_400_pages += 1
-            else:
-                n_500_pages += 1
-
-        return n_200_pages, n_300_pages, n_400_pages, n_500_pages, len(self.info_unvisited_page), len(self.nodes), \
-            self.tor_requests
+        return self.stats.info()
 
-    def save_data_to_csv(self):
-        if len(self.info_pages) > self.previous_info_page_length:
-            self.__save_list_to_csv(self.crawled_file_path, self.info_pages)
-            self.previous_info_page_length = len(self.info_pages)
-            logger.debug("MONITOR - Crawled pages file successfully updated.")
-        else:
-            logger.debug("MONITOR - No changes detected in the crawled pages file. Ignoring.")
-
-        if len(self.scheduled_pages) > self.previous_scheduled_pages_length:
-            self.__save_list_to_csv(self.scheduled_file_path, self.scheduled_pages)
-            self.previous_scheduled_pages_length = len(self.scheduled_pages)
-            logger.debug("MONITOR - Scheduled pages file successfully updated.")
-        else:
-            logger.debug("MONITOR - No changes detected in the scheduled pages file. Ignoring.")
-
-        if len(self.info_unvisited_page) > self.previous_info_unvisited_page_length:
-            self.__save_list_to_csv(self.unvisited_pages_file_path, self.info_unvisited_page)
-            self.previous_info_unvisited_page_length = len(self.info_unvisited_page)
-            logger.debug("MONITOR - Unvisited pages file successfully updated.")
-        else:
-            logger.debug("MONITOR - No changes detected in the unvisited links file. Ignoring.")
-
-        if len(self.nodes) > self.previous_nodes_length:
-            self.__save_list_to_csv(self.nodes_file_path, self.nodes)
-            self.previous_nodes_length = len(self.nodes)
-            logger.debug("MONITOR - Nodes file successfully updated.")
-        else:
-            logger.debug("MONITOR - No changes detected in the nodes file. Ignoring.")
-
-        if len(self.edges) > self.previous_edges_length:
-            self.__save_list_to_csv(self.edges_file_path, self.edges)
-            self.previous_edges_length = len(self.edges)
-            logger.debug("MONITOR - Edges file successfully updated.")
-        else:
-            logger.debug("MONITOR - No changes detected in the edges file. Ignoring.")
+    def get_stats(self):
+        return self.stats.snapshot()
 
-    def schedule_loop(self):
-        if not os.path.exists(self.crawled_file_path):
-            raise FileNotFoundError("crawledpages.csv deos not exist. Please provide a valid directory path.")
-
-        if not os.path.exists(self.scheduled_file_path):
-            raise FileNotFoundError("scheduled.csv deos not exist. Please provide a valid directory path.")
+    def save_rows(self, appender, buffer, name):
+        """
+        :return: None if the rows are written, otherwise (the rows not written, the error).
+        """
+        if not len(buffer):
+            logger.debug(f"MONITOR - No changes detected in the {name} file. Ignoring.")
+            return None
 
-        if not os.path.exists(self.unvisited_pages_file_path):
-            raise FileNotFoundError("unvisitedlinks.csv deos not exist. Please provide a valid directory path.")
+        n_rows = appender.n_rows
+        try:
+            appender.write(buffer.rows())
+            logger.debug(f"MONITOR - {name.capitalize()} file successfully updated.")
+        except Exception as e:
+            logger.error(f"MONITOR - Error while saving {appender.file_path}.")
+            logger.error(f"Error msg: {str(e)}.")
+            return list(islice(buffer.rows(), appender.n_rows - n_rows, None)), e
 
-        if not os.path.exists(self.nodes_file_path):
-            raise FileNotFoundError("nodes.csv deos not exist. Please provide a valid directory path.")
+        return None
 
-        if not os.path.exists(self.edges_file_path):
-            raise FileNotFoundError("edges.csv deos not exist. Please provide a valid directory path.")
+    def save_data_to_csv(self):
+        """
+        Checkpoint: append the rows added since the last checkpoint and drop them from memory. The rows not written
+        because of an error are kept for the next checkpoint, and the error is raised.
+        """
+        if not self.project_path:
+            return
+
+        with self.save_lock:
+            with self.lock:
+                buffers = self.info_pages, self.scheduled_pages, self.info_unvisited_page, self.nodes, self.edges, \
+                    self.contents
+                self.info_pages, self.scheduled_pages, self.info_unvisited_page, self.nodes, self.edges, \
+                    self.contents = self.create_buffers()
+
+            names = ["crawled pages", "scheduled pages", "unvisited links", "nodes", "edges", "contents"]
+            failures = [self.save_rows(appender, buffer, name)
+                        for appender, buffer, name in zip(self.appenders(), buffers, names)]
+
+            if not any(failures):
+                return
+
+            # The rows not written go back before the rows added in the meantime
+            with self.lock:
+                added_buffers = self.info_pages, self.scheduled_pages, self.info_unvisited_page, self.nodes, \
+                    self.edges, self.contents
+                new_buffers = self.create_buffers()
+                for new_buffer, failure, added_buffer in zip(new_buffers, failures, added_buffers):
+                    unsaved_rows = failure[0] if failure else []
+                    for row in unsaved_rows + list(added_buffer.rows()):
+                        new_buffer.append(*row)
+
+                self.info_pages, self.scheduled_pages, self.info_unvisited_page, self.nodes, self.edges, \
+                    self.contents = new_buffers
+
+            raise next(failure[1] for failure in failures if failure)
+
+    def checkpoint(self):
+        """
+        Append the rows added since the last checkpoint and write them to the disk (fsync), e.g., before the crawl
+        state commits the urls of those rows.
+        """
+        self.save_data_to_csv()
+
+        with self.save_lock:
+            for appender in self.appenders():
+                appender.fsync()
+
+    def next_node_index(self):
+        """
+        :return: the index following the highest node index of the node file, 0 if there are no nodes. The rows are
+        read from the file: it may have nodes not yet committed by the crawl state.
+        """
+        next_node_index = 0
+        if not self.project_path:
+            return next_node_index
+
+        with open(self.nodes_file_path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for row in reader:
+                try:
+                    next_node_index = max(next_node_index, int(row[1]) + 1)
+                except (IndexError, ValueError):
+                    # Incomplete row of a crashed run
+                    continue
+
+        return next_node_index
+
+    def appenders(self):
+        if not self.project_path:
+            return []
+
+        return [self.crawled_file, self.scheduled_file, self.unvisited_pages_file, self.nodes_file, self.edges_file,
+                self.contents_file]
 
-        while not self.stop_flag:
-            self.save_data_to_csv()
-            time.sleep(SCHEDULE_TIME)
+    def schedule_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.save_data_to_csv()
+            except Exception:
+                # Logged by save_rows: the rows are written at the next checkpoint
+                continue
 
     def start_scheduling(self):
         threading.Thread(target=self.schedule_loop, daemon=True).start()
 
     def stop_program(self):
-        self.stop_flag = True
+        self.stop_event.set()
 
         # Final save
-        self.save_data_to_csv()
\ No newline at end of file
+        try:
+            self.save_data_to_csv()
+        except Exception:
+            logger.error("MONITOR - The last rows have not been saved.")
+
+        for appender in self.appenders():
+            appender.close()
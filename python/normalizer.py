@@ -0,0 +1,86 @@
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+NORMALIZE_CACHE_SIZE = 1 << 16
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+class UrlNormalizer:
+    """
+    Canonical form of the urls of a seed, so that the variants of the same page (fragments, default ports, host case,
+    repeated or session query parameters) become the same node and the same request.
+    Default rules: lowercase scheme and host, drop the default port, drop the fragment, drop the repeated query
+    parameters, strip the slashes at the ends (as the link extraction does).
+    The urls found on a page are mostly the same links of the previous pages (menus, categories, pagination), so the
+    results are cached.
+    """
+    def __init__(self, drop_params=(), sort_query=False, strip_fragment=True, rewrites=(),
+                 cache_size=NORMALIZE_CACHE_SIZE):
+        """
+        :param drop_params: names of the query parameters to remove (e.g., session tokens)
+        :param sort_query: if True, the query parameters are sorted
+        :param strip_fragment: if True, the fragment is removed
+        :param rewrites: list of {"pattern": regex, "replacement": str}, applied in order to the normalized url
+        :param cache_size: number of normalized urls to cache
+        """
+        self.drop_params = frozenset(drop_params)
+        self.sort_query = sort_query
+        self.strip_fragment = strip_fragment
+        self.rewrites = [(re.compile(rewrite["pattern"]), rewrite.get("replacement", "")) for rewrite in rewrites]
+
+        self.normalize = lru_cache(maxsize=cache_size)(self.normalize_url)
+
+    @classmethod
+    def from_rules(cls, rules):
+        """
+        :param rules: dict of rules of a seed, as stored in the configuration file
+        """
+        return cls(drop_params=rules.get("drop_params", ()), sort_query=rules.get("sort_query", False),
+                   strip_fragment=rules.get("strip_fragment", True), rewrites=rules.get("rewrites", ()))
+
+    def __call__(self, url):
+        return self.normalize(url)
+
+    @staticmethod
+    def normalize_netloc(scheme, netloc):
+        userinfo, at, hostport = netloc.rpartition("@")
+        host, colon, port = hostport.rpartition(":")
+        if not colon or not port.isdigit():
+            host, port = hostport, ""
+
+        netloc = userinfo + at + host.lower()
+        if port and port != DEFAULT_PORTS.get(scheme):
+            netloc += ":" + port
+
+        return netloc
+
+    def normalize_query(self, query):
+        # The parameters are kept encoded as they are: only the names are compared
+        params = {}
+        for param in query.split("&"):
+            if param and param.partition("=")[0] not in self.drop_params:
+                params[param] = None
+
+        params = list(params)
+        if self.sort_query:
+            params.sort()
+
+        return "&".join(params)
+
+    def normalize_url(self, url):
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        scheme = scheme.lower()
+
+        netloc = self.normalize_netloc(scheme, netloc)
+        if query:
+            query = self.normalize_query(query)
+        if self.strip_fragment:
+            fragment = ""
+
+        url = urlunsplit((scheme, netloc, path, query, fragment))
+        for pattern, replacement in self.rewrites:
+            url = pattern.sub(replacement, url)
+
+        return url.strip("/")
@@ -0,0 +1,253 @@
+import os
+import csv
+import zlib
+import hashlib
+import logging
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("CRATOR")
+
+INDEX_FILE = "index.csv"
+SEGMENT_SIZE = 256 * 1024 * 1024     # 256 MB
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+# Segment file extension by compression
+ZSTD_EXTENSION = ".zst"
+ZLIB_EXTENSION = ".zz"
+
+
+def compression_extension():
+    """
+    :return: the extension of the new segments: zstd if the zstandard package is installed, zlib otherwise.
+    """
+    return ZSTD_EXTENSION if zstandard is not None else ZLIB_EXTENSION
+
+
+class Codec:
+    """
+    Compression of the page records. The zstd contexts are not thread safe, so each thread has its own.
+    """
+    def __init__(self):
+        self.local = threading.local()
+
+    def compress(self, extension, content):
+        if extension == ZLIB_EXTENSION:
+            return zlib.compress(content, ZLIB_LEVEL)
+
+        if not hasattr(self.local, "compressor"):
+            self.local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return self.local.compressor.compress(content)
+
+    def decompress(self, extension, record):
+        if extension == ZLIB_EXTENSION:
+            return zlib.decompress(record)
+
+        if zstandard is None:
+            raise ImportError("The zstd page segments require the zstandard package.")
+
+        if not hasattr(self.local, "decompressor"):
+            self.local.decompressor = zstandard.ZstdDecompressor()
+        return self.local.decompressor.decompress(record)
+
+
+class SegmentStore:
+    """
+    Content-addressed page store: the pages are compressed one by one and appended to rolling segment files
+    (segment-00000.zst, segment-00001.zst, ...), a page with the same content of a page already stored is stored once.
+    The index (index.csv) maps each node index to its content hash and to the (segment, offset, length) of its record.
+    The index rows are written after their records are flushed, so a crash never leaves an index row without its
+    record.
+    Thread safe: the compression runs in the caller thread, only the append is serialized.
+    """
+    def __init__(self, pages_path, segment_size=SEGMENT_SIZE):
+        self.pages_path = pages_path
+        self.segment_size = segment_size
+        self.extension = compression_extension()
+        self.codec = Codec()
+        self.lock = threading.Lock()
+
+        # Content hash -> (segment, offset, length)
+        self.records = {}
+        n_segments = 0
+
+        index_path = os.path.join(pages_path, INDEX_FILE)
+        new_index = not os.path.exists(index_path)
+        if not new_index:
+            # Resumed crawl: keep the stored contents and start a new segment
+            for index_node, content_hash, segment, offset, length in read_index(index_path):
+                self.records[content_hash] = (segment, offset, length)
+
+            n_segments = sum(1 for name in os.listdir(pages_path) if name.startswith("segment-"))
+
+        self.index_file = open(index_path, 'a', newline='')
+        self.index_writer = csv.writer(self.index_file)
+        if new_index:
+            self.index_writer.writerow(["node", "content_hash", "segment", "offset", "length"])
+        elif not ends_with_newline(index_path):
+            # Incomplete row of a crashed run: the new rows start on a new line
+            self.index_file.write("\r\n")
+
+        self.segment_number = n_segments
+        self.segment = None
+        self.segment_file = None
+        self.new_segment()
+
+        self.n_pages = 0
+        self.n_duplicates = 0
+        self.bytes_stored = 0
+
+    def new_segment(self):
+        if self.segment_file:
+            self.segment_file.close()
+
+        self.segment = f"segment-{self.segment_number:05d}{self.extension}"
+        self.segment_file = open(os.path.join(self.pages_path, self.segment), 'ab')
+        self.segment_number += 1
+
+    def put(self, index_node, content, content_hash=None):
+        """
+        Store the content of a node.
+        :param content: the page body, as bytes
+        :param content_hash: the sha256 hex digest of the content, computed if None
+        :return: (segment, offset, length) of the record.
+        """
+        if content_hash is None:
+            content_hash = hashlib.sha256(content).hexdigest()
+
+        with self.lock:
+            record = self.records.get(content_hash)
+
+        record_data = None
+        if record is None:
+            record_data = self.codec.compress(self.extension, content)
+
+        with self.lock:
+            self.n_pages += 1
+
+            # Checked again: the same content may have been stored by another thread in the meantime
+            record = self.records.get(content_hash)
+            if record is None:
+                if self.segment_file.tell() >= self.segment_size:
+                    self.new_segment()
+
+                record = (self.segment, self.segment_file.tell(), len(record_data))
+                self.segment_file.write(record_data)
+                self.segment_file.flush()
+                self.records[content_hash] = record
+                self.bytes_stored += len(record_data)
+            else:
+                self.n_duplicates += 1
+
+            self.index_writer.writerow([index_node, content_hash, *record])
+
+        return record
+
+    def flush(self):
+        with self.lock:
+            if self.segment_file.closed:
+                # Flushed by close
+                return
+
+            self.segment_file.flush()
+            self.index_file.flush()
+
+    def close(self):
+        with self.lock:
+            self.segment_file.close()
+            self.index_file.close()
+
+
+class SegmentReader:
+    """
+    Reader of the pages saved by a SegmentStore.
+    """
+    def __init__(self, pages_path):
+        self.pages_path = pages_path
+        self.codec = Codec()
+
+        # Node index -> (segment, offset, length)
+        self.index = {}
+        for index_node, content_hash, segment, offset, length in read_index(os.path.join(pages_path, INDEX_FILE)):
+            self.index[int(index_node)] = (segment, offset, length)
+
+    def __contains__(self, index_node):
+        return index_node in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def path(self, index_node):
+        # The pages are not stored as files
+        return None
+
+    def read(self, index_node):
+        """
+        :return: the content of a node, as bytes.
+        """
+        segment, offset, length = self.index[index_node]
+
+        with open(os.path.join(self.pages_path, segment), 'rb') as file:
+            file.seek(offset)
+            record = file.read(length)
+
+        return self.codec.decompress(os.path.splitext(segment)[1], record)
+
+
+class FileReader:
+    """
+    Reader of the pages saved one per file (legacy layout): pages/<node index>.html
+    """
+    def __init__(self, pages_path):
+        self.pages_path = pages_path
+
+    def __contains__(self, index_node):
+        return os.path.isfile(self.path(index_node))
+
+    def path(self, index_node):
+        return os.path.join(self.pages_path, f"{index_node}.html")
+
+    def read(self, index_node):
+        with open(self.path(index_node), 'rb') as file:
+            return file.read()
+
+
+def ends_with_newline(file_path):
+    with open(file_path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() == 0:
+            return True
+
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+def read_index(index_path):
+    """
+    :return: the rows (node, content_hash, segment, offset, length) of a segment store index.
+    """
+    with open(index_path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            # The last row may be incomplete after a crash
+            if len(row) != 5 or not row[4].isdigit():
+                continue
+
+            index_node, content_hash, segment, offset, length = row
+            yield index_node, content_hash, segment, int(offset), int(length)
+
+
+def open_reader(pages_path):
+    """
+    :return: the reader of a pages folder, in the layout it has been written with.
+    """
+    if os.path.exists(os.path.join(pages_path, INDEX_FILE)):
+        return SegmentReader(pages_path)
+
+    return FileReader(pages_path)
@@ -0,0 +1,84 @@
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Local imports
+import extractor
+from document import PageDocument
+
+logger = logging.getLogger("CRATOR")
+
+shared_pool = None
+shared_pool_lock = threading.Lock()
+
+
+def parse_document(content, request_url, backend):
+    """
+    Parse a page in a worker process.
+    :return: (hrefs, img_srcs, internal_links, captcha_images), see document.PageDocument.set_parsed.
+    """
+    hrefs, img_srcs = extractor.parse_page(content, backend)
+    return hrefs, img_srcs, extractor.internal_links(request_url, hrefs), extractor.captcha_images(img_srcs)
+
+
+class ParsePool:
+    """
+    Process pool for the CPU-bound part of the crawl: the html parsing, the link resolution and the captcha image check.
+    The seeds are crawled by threads of the same process, so parsing in those threads is serialized by the GIL.
+    The page bodies are sent to the workers as bytes (one pickled copy), the workers send back the links and the
+    verdicts, which are attached to the PageDocument of each response.
+    """
+    def __init__(self, n_workers):
+        # Spawned workers: forking a process that runs many threads may copy locks held by the other threads
+        self.n_workers = n_workers
+        self.executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    @staticmethod
+    def shared(n_workers):
+        """
+        :return: the pool shared by all the crawlers of the process, created the first time. A later call with another
+        number of workers gets the same pool, with its size.
+        """
+        global shared_pool
+
+        with shared_pool_lock:
+            if shared_pool is None:
+                shared_pool = ParsePool(n_workers)
+            elif shared_pool.n_workers != n_workers:
+                logger.warning(f"PARSE POOL - The shared pool has {shared_pool.n_workers} workers, "
+                               f"{n_workers} requested. The pool is not resized.")
+
+            return shared_pool
+
+    @staticmethod
+    def shutdown_shared():
+        """
+        Stop the worker processes of the shared pool, if any, once all the crawlers of the process have ended.
+        """
+        global shared_pool
+
+        with shared_pool_lock:
+            if shared_pool is not None:
+                shared_pool.shutdown()
+                shared_pool = None
+
+    def parse(self, responses, backend=extractor.DEFAULT_BACKEND):
+        """
+        Parse the responses in the worker processes, in parallel, and attach the results to their documents.
+        The responses whose parse fails are left to the lazy parse of their document.
+        :param responses: list of :class requests.Response
+        :param backend: see extractor.BACKENDS
+        """
+        futures = [self.executor.submit(parse_document, response.content, response.request.url, backend)
+                   for response in responses]
+
+        for response, future in zip(responses, futures):
+            try:
+                PageDocument.of(response, backend).set_parsed(*future.result())
+            except Exception as e:
+                logger.error(f"PARSE POOL - Error while parsing {response.url}. Parsed in the crawler thread.")
+                logger.error(f"PARSE POOL - Error msg: {str(e)}")
+
+    def shutdown(self):
+        self.executor.shutdown()
@@ -0,0 +1,139 @@
+import time
+import queue
+import threading
+from collections import deque
+
+
+class BoundedQueue:
+    """
+    FIFO queue between two stages of the crawl (fetch -> parse -> persist), based on a condition variable.
+    When the queue reaches the high watermark, the producers block until the consumers drain it down to the low
+    watermark, so that a fast producer cannot fill the memory and a blocked producer is not woken at every item.
+    It keeps the gauges of the stage: current and peak depth, items put and got, time spent blocked by the producers.
+    """
+    def __init__(self, name, high_watermark, low_watermark=None):
+        """
+        :param name: the name of the stage, used in the statistics
+        :param high_watermark: number of items that blocks the producers
+        :param low_watermark: number of items that unblocks them, half of the high watermark if None
+        """
+        if high_watermark < 1:
+            raise ValueError(f"The high watermark of the {name} queue must be at least 1.")
+
+        self.name = name
+        self.high_watermark = high_watermark
+        self.low_watermark = high_watermark // 2 if low_watermark is None else min(low_watermark, high_watermark - 1)
+
+        self.items = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+        # True from the high watermark until the low watermark
+        self.throttled = False
+        self.closed = False
+
+        # Gauges
+        self.max_size = 0
+        self.n_put = 0
+        self.n_get = 0
+        self.n_blocked = 0
+        self.blocked_time = 0.0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.items)
+
+    def wait_for_room(self, timeout=None):
+        """
+        Block while the queue is throttled. Used by the producers that reserve their place before creating the item
+        (e.g., the downloader, before starting a download).
+        :return: True if there is room, False on timeout or if the queue has been closed.
+        """
+        with self.not_full:
+            return self.wait_not_throttled(timeout)
+
+    def wait_not_throttled(self, timeout):
+        # It must be called holding self.lock
+        if not self.throttled or self.closed:
+            return not self.closed
+
+        self.n_blocked += 1
+        start_time = time.monotonic()
+        try:
+            return self.not_full.wait_for(lambda: not self.throttled or self.closed, timeout) and not self.closed
+        finally:
+            self.blocked_time += time.monotonic() - start_time
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Append an item. With block=True it waits while the queue is throttled, with block=False the item is always
+        accepted (e.g., by the callbacks that cannot wait), but it still counts for the watermarks.
+        :raise queue.Full: on timeout, or if the queue has been closed.
+        """
+        with self.lock:
+            if block and not self.wait_not_throttled(timeout):
+                raise queue.Full
+
+            if self.closed:
+                raise queue.Full
+
+            self.items.append(item)
+            self.n_put += 1
+            self.max_size = max(self.max_size, len(self.items))
+            if len(self.items) >= self.high_watermark:
+                self.throttled = True
+
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        """
+        Pop the first item, waiting at most timeout seconds (forever if None).
+        :raise queue.Empty: on timeout, or if the queue has been closed and is empty.
+        """
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: self.items or self.closed, timeout) or not self.items:
+                raise queue.Empty
+
+            return self.pop()
+
+    def get_nowait(self):
+        with self.lock:
+            if not self.items:
+                raise queue.Empty
+
+            return self.pop()
+
+    def pop(self):
+        # It must be called holding self.lock
+        item = self.items.popleft()
+        self.n_get += 1
+
+        if self.throttled and len(self.items) <= self.low_watermark:
+            self.throttled = False
+            self.not_full.notify_all()
+
+        return item
+
+    def close(self):
+        """
+        Wake up all the waiting producers and consumers. The items already queued can still be got.
+        """
+        with self.lock:
+            self.closed = True
+            self.not_full.notify_all()
+            self.not_empty.notify_all()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.items),
+                "max_size": self.max_size,
+                "high_watermark": self.high_watermark,
+                "low_watermark": self.low_watermark,
+                "throttled": self.throttled,
+                "put": self.n_put,
+                "got": self.n_get,
+                "blocked": self.n_blocked,
+                "blocked_time": round(self.blocked_time, 3),
+            }
@@ -0,0 +1,90 @@
+import os
+import csv
+import logging
+from collections import namedtuple
+
+from fingerprint import fingerprint
+from pagestore import open_reader
+
+logger = logging.getLogger("CRATOR")
+
+NOT_MODIFIED = 304
+
+PageVersion = namedtuple("PageVersion", ["node_index", "content_hash", "etag", "last_modified"])
+
+
+class PreviousCrawl:
+    """
+    Pages saved by a previous crawl of the same project, read from its node table (graph/nodes.csv) and content table
+    (graph/contents.csv). Used by the re-crawl mode to send conditional requests and to skip the unchanged pages.
+    """
+    def __init__(self, project_path):
+        self.project_path = project_path
+        self.pages = {}
+        self.reader = open_reader(os.path.join(project_path, "pages"))
+
+        graph_path = os.path.join(project_path, "graph")
+        nodes_file_path = os.path.join(graph_path, "nodes.csv")
+        contents_file_path = os.path.join(graph_path, "contents.csv")
+
+        if not os.path.exists(contents_file_path):
+            logger.info(f"RECRAWL - No content table in {project_path}. All the pages will be downloaded.")
+            return
+
+        # Node index by url fingerprint: the urls are not kept in memory
+        node_indexes = {}
+        with open(nodes_file_path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for url, index, depth, file_name in reader:
+                node_indexes[fingerprint(url)] = int(index)
+
+        with open(contents_file_path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for url, content_hash, etag, last_modified in reader:
+                key = fingerprint(url)
+                node_index = node_indexes.get(key)
+                if node_index is not None and node_index in self.reader:
+                    self.pages[key] = PageVersion(node_index, content_hash, etag or None, last_modified or None)
+
+        logger.info(f"RECRAWL - {len(self.pages)} pages of the previous crawl in {project_path}")
+
+    def __len__(self):
+        return len(self.pages)
+
+    def get(self, url):
+        """
+        :return: the :class PageVersion of the url saved by the previous crawl, None if it has not been saved.
+        """
+        return self.pages.get(fingerprint(url))
+
+    def conditional_headers(self, url):
+        """
+        :return: the If-None-Match / If-Modified-Since headers of the url, None if the server gave no validators.
+        """
+        page = self.get(url)
+        if not page:
+            return None
+
+        headers = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+
+        return headers or None
+
+    def restore(self, url, web_page):
+        """
+        Fill the body of a 304 (Not Modified) response with the page saved by the previous crawl, so that its links
+        can be extracted.
+        :return: the :class PageVersion of the url, None if the response is not a 304 of a saved page.
+        """
+        page = self.get(url)
+        if web_page.status_code != NOT_MODIFIED or not page:
+            return None
+
+        web_page._content = self.reader.read(page.node_index)
+
+        return page
@@ -1,44 +1,136 @@
 import threading
-import time
+import queue
 import os
-import hashlib
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor
+import logging
 
 # Local imports
 import utils.fileutils as file_utils
+from pagestore import SegmentStore, SEGMENT_SIZE
+from pipeline import BoundedQueue
+
+logger = logging.getLogger("CRATOR")
+
+# Page layouts
+SEGMENTS = "segments"   # Compressed, content-addressed segment files (see pagestore.SegmentStore)
+FILES = "files"         # Legacy layout, one <node index>.html file per page
+
+QUEUE_SIZE = 1000
 
 
 class FileSaver:
-    def __init__(self, save_path, n_threads=1):
+    """
+    Persist stage of the crawl: the pages are saved by n_threads worker threads. The saver receives only the page
+    bytes and the node index, not the responses, and its queue is bounded: when the disk falls behind, enqueue blocks
+    the crawler (until the queue is down to its low watermark). The pages waiting to be saved use at most queue_size
+    times the max page size (crawler.max_page_size) of memory: the crawler sizes the queue from a memory budget (see
+    Configuration.saver_queue_size).
+    """
+    def __init__(self, save_path, n_threads=1, store=SEGMENTS, segment_size=SEGMENT_SIZE, queue_size=QUEUE_SIZE,
+                 low_watermark=None):
+        """
+        :param save_path: the pages folder
+        :param n_threads: number of threads that compress and write the pages
+        :param store: "segments" or "files"
+        :param segment_size: size of a segment file, before a new one is started
+        :param queue_size: max number of pages waiting to be saved
+        :param low_watermark: number of pages waiting to be saved that unblocks enqueue, half of queue_size if None
+        """
+        if store not in (SEGMENTS, FILES):
+            raise ValueError(f"Unknown page store '{store}'. Valid values: {SEGMENTS}, {FILES}.")
+
         self.n_threads = n_threads
         self.save_path = save_path
 
-        self.queue = deque()
-        self.lock = threading.Lock()
-        self.running = True
+        self.store = SegmentStore(save_path, segment_size) if store == SEGMENTS else None
+
+        self.queue = BoundedQueue("save", queue_size, low_watermark)
+        self.threads = []
 
-    def enqueue(self, web_page, index_node):
-        self.queue.append((web_page, index_node))
+    def file_name(self, index_node):
+        """
+        :return: the file of a page, for the node table: empty with the segments layout, where the pages are found
+        through the index of the store (pages/index.csv).
+        """
+        return "" if self.store else f"{index_node}.html"
+
+    def enqueue(self, content, index_node, content_hash=None, on_saved=None):
+        """
+        Queue a page to save. It blocks while the queue is full.
+        :param content: the page body, as bytes
+        :param content_hash: the sha256 hex digest of the content, if already computed
+        :param on_saved: function called by the saver thread once the page is written, not called if the write fails
+        """
+        self.queue.put((content, index_node, content_hash, None, on_saved))
+
+    def link(self, reader, source_index, index_node, on_saved=None):
+        """
+        Save a page unchanged since a previous crawl: a hard link to its previous file when both the crawls use the
+        files layout, a copy of its content otherwise.
+        :param reader: the page reader of the previous crawl (see pagestore.open_reader)
+        :param source_index: the node index of the page in the previous crawl
+        :param on_saved: see enqueue
+        """
+        self.queue.put((None, index_node, None, (reader, source_index), on_saved))
+
+    def flush(self):
+        """
+        Flush the pages written so far to the files of the store.
+        """
+        if self.store:
+            self.store.flush()
 
     def stop(self):
-        self.running = False
+        """
+        Save the pages still in the queue and close the store.
+        """
+        # The workers save the pages still queued, then stop
+        self.queue.close()
+
+        for thread in self.threads:
+            thread.join()
+
+        if self.store:
+            self.store.close()
 
     def start(self):
-        threading.Thread(target=self.save, daemon=True).start()
+        for _ in range(self.n_threads):
+            thread = threading.Thread(target=self.save, daemon=True)
+            thread.start()
+            self.threads.append(thread)
 
     def save(self):
-        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
-            while self.running:
-                if not self.queue:
-                    time.sleep(0.1)
-                    continue
-
-                with self.lock:
-                    while self.queue:
-                        web_page, index_node = self.queue.popleft()
-                        file_name = str(index_node) + ".html"
-                        dir = os.path.join(self.save_path, file_name)
-
-                        executor.submit(file_utils.save_file, web_page.text, dir)
-                        time.sleep(0.1)
+        while True:
+            try:
+                item = self.queue.get()
+            except queue.Empty:
+                # Stopped and drained
+                break
+
+            self.save_page(*item)
+
+    def save_page(self, content, index_node, content_hash, source, on_saved):
+        try:
+            self.write_page(content, index_node, content_hash, source)
+        except Exception as e:
+            logger.error(f"SAVER - Error while saving the page {index_node}.")
+            logger.error(f"Error msg: {str(e)}.")
+            return
+
+        if on_saved:
+            on_saved()
+
+    def write_page(self, content, index_node, content_hash, source):
+        if source:
+            reader, source_index = source
+            source_path = reader.path(source_index)
+
+            if not self.store and source_path:
+                file_utils.link_file(source_path, os.path.join(self.save_path, f"{index_node}.html"))
+                return
+
+            content = reader.read(source_index)
+
+        if self.store:
+            self.store.put(index_node, content, content_hash)
+        else:
+            file_utils.save_bytes(content, os.path.join(self.save_path, f"{index_node}.html"))
@@ -0,0 +1,110 @@
+import heapq
+import random
+from urllib.parse import urlparse
+
+# Bounds of the random factor applied to the waiting time when random_wait is enabled
+RANDOM_WAIT_MIN = 0.5
+RANDOM_WAIT_MAX = 1.5
+
+
+class PolitenessScheduler:
+    """
+    Frontier of the urls to download, that spaces the requests sent to the same host.
+    Each host has its own priority queue (a heap, FIFO among equal priorities) and a next allowed request time. A heap
+    keyed by that time gives the next host that can be contacted, so the hosts that are ready never wait for the ones
+    that are not. Push and pop are O(log n).
+    """
+    def __init__(self, waiting_time, random_wait=False):
+        """
+        :param waiting_time: seconds between two requests to the same host
+        :param random_wait: if True, each waiting time is multiplied by a random factor between 0.5 and 1.5
+        """
+        self.waiting_time = waiting_time
+        self.random_wait = random_wait
+
+        self.host_queues = {}
+        self.ready_hosts = []
+        self.next_request_time = {}
+        self.size = 0
+
+        # Insertion order, to keep the heaps stable and to never compare the items
+        self.sequence = 0
+
+        # Statistics
+        self.max_size = 0
+        self.n_pushed = 0
+        self.n_popped = 0
+
+    def __len__(self):
+        return self.size
+
+    def wait_time(self):
+        if not self.random_wait:
+            return self.waiting_time
+
+        return self.waiting_time * random.uniform(RANDOM_WAIT_MIN, RANDOM_WAIT_MAX)
+
+    def append(self, item, priority=0):
+        """
+        :param item: tuple whose first element is the url
+        :param priority: the lower, the sooner the item is popped among the items of the same host (e.g., the value
+        returned by frontier.PriorityPolicy.priority)
+        """
+        host = urlparse(item[0]).netloc
+
+        host_queue = self.host_queues.get(host)
+        if host_queue is None:
+            host_queue = []
+            self.host_queues[host] = host_queue
+            heapq.heappush(self.ready_hosts, (self.next_request_time.get(host, 0), host))
+
+        heapq.heappush(host_queue, (priority, self.sequence, item))
+        self.sequence += 1
+        self.size += 1
+
+        self.n_pushed += 1
+        self.max_size = max(self.max_size, self.size)
+
+    def next_ready_in(self, now):
+        """
+        :return: seconds until the next host can be contacted, None if the queue is empty.
+        """
+        if not self.ready_hosts:
+            return None
+
+        return max(0, self.ready_hosts[0][0] - now)
+
+    def pop_ready(self, now):
+        """
+        Pop the next item of a host that can be contacted at time now, and book the next request slot of that host.
+        :return: the item, None if no host is ready.
+        """
+        if not self.ready_hosts or self.ready_hosts[0][0] > now:
+            return None
+
+        _, host = heapq.heappop(self.ready_hosts)
+        host_queue = self.host_queues[host]
+        _, _, item = heapq.heappop(host_queue)
+        self.size -= 1
+        self.n_popped += 1
+
+        self.next_request_time[host] = now + self.wait_time()
+        if host_queue:
+            heapq.heappush(self.ready_hosts, (self.next_request_time[host], host))
+        else:
+            del self.host_queues[host]
+
+        return item
+
+    def stats(self):
+        """
+        :return: dict with the number of queued urls and hosts, the peak number of queued urls, the number of pushed
+        and popped urls.
+        """
+        return {
+            "size": self.size,
+            "hosts": len(self.host_queues),
+            "max_size": self.max_size,
+            "pushed": self.n_pushed,
+            "popped": self.n_popped,
+        }
@@ -0,0 +1,137 @@
+import unittest
+import threading
+import time
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from handler import TorHandler, CircuitPool
+from asyncdownloader import AsyncDownloader
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the tor proxy: an http proxy that answers every absolute url with a small html page.
+    """
+    protocol_version = "HTTP/1.1"
+    active = {}
+    max_active = {}
+    request_time = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        host = urlparse(self.path).netloc
+
+        with self.lock:
+            self.request_time[self.path] = time.time()
+            self.active[host] = self.active.get(host, 0) + 1
+            self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+
+        time.sleep(1 if self.path.endswith("/slow") else 0.05)
+
+        with self.lock:
+            self.active[host] -= 1
+
+        if self.path.endswith("/redirect"):
+            self.send_response(302)
+            self.send_header("Location", self.path.replace("/redirect", "/home"))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = f"<html><body><a href='{self.path}'>link</a></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class AsyncDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ProxyHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        proxy = f"http://127.0.0.1:{self.server.server_port}"
+        self.tor_handler = TorHandler()
+        self.tor_handler.circuits = CircuitPool.from_proxy(proxy)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def download_all(self, downloader, urls):
+        for url in urls:
+            downloader.enqueue(url, None)
+
+        results = {}
+        deadline = time.time() + 30
+        while not downloader.is_empty() and time.time() < deadline:
+            for url, future in downloader.get_results():
+                results[url] = future.result()
+
+        return results
+
+    def test_download(self):
+        urls = [f"http://market{i % 3}.onion/page{i}" for i in range(60)]
+
+        downloader = AsyncDownloader(self.tor_handler, waiting_time=0, max_per_host=4)
+        downloader.start()
+        results = self.download_all(downloader, urls)
+        downloader.stop()
+
+        self.assertEqual(set(results), set(urls))
+        for url, web_page in results.items():
+            self.assertEqual(web_page.status_code, 200)
+            self.assertEqual(web_page.url, url)
+            self.assertEqual(web_page.request.url, url)
+            self.assertIn(urlparse(url).path, web_page.text)
+
+        self.assertEqual(self.tor_handler.n_requests_sent, len(urls))
+        self.assertTrue(all(n <= 4 for n in ProxyHandler.max_active.values()))
+
+    def test_redirect_history(self):
+        downloader = AsyncDownloader(self.tor_handler, waiting_time=0)
+        downloader.start()
+        results = self.download_all(downloader, ["http://market.onion/redirect"])
+        downloader.stop()
+
+        web_page = results["http://market.onion/redirect"]
+        self.assertEqual(web_page.url, "http://market.onion/home")
+        self.assertEqual([redirect.status_code for redirect in web_page.history], [302])
+
+    def test_waiting_time_per_host(self):
+        urls = ["http://slow.onion/1", "http://slow.onion/2", "http://fast.onion/1", "http://other.onion/1"]
+
+        downloader = AsyncDownloader(self.tor_handler, waiting_time=0.5)
+        downloader.start()
+        start_time = time.time()
+        self.download_all(downloader, urls)
+        downloader.stop()
+
+        request_time = {url: ProxyHandler.request_time[url] - start_time for url in urls}
+        self.assertLess(request_time["http://fast.onion/1"], 0.5)
+        self.assertLess(request_time["http://other.onion/1"], 0.5)
+        self.assertGreaterEqual(request_time["http://slow.onion/2"] - request_time["http://slow.onion/1"], 0.45)
+
+    def test_renew_circuit_during_download(self):
+        downloader = AsyncDownloader(self.tor_handler, waiting_time=0)
+        downloader.start()
+        downloader.enqueue("http://market.onion/slow", None)
+        time.sleep(0.3)
+
+        # A captcha renews the circuit while the slow page is downloading: the next request gets a new session
+        self.tor_handler.circuits.renew(0)
+        results = self.download_all(downloader, ["http://other.onion/page"])
+        downloader.stop()
+
+        self.assertEqual(set(results), {"http://market.onion/slow", "http://other.onion/page"})
+        self.assertEqual(results["http://market.onion/slow"].status_code, 200)
+        self.assertFalse(downloader.retired_sessions)
+
+
+if __name__ == '__main__':
+    unittest.main()
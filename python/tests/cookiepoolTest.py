@@ -0,0 +1,78 @@
+import os
+import time
+import yaml
+import unittest
+import tempfile
+import threading
+
+from handler import TorHandler, CookieHandler
+from cookiepool import CookiePool, SUCCESS, CAPTCHA, LOGIN_REDIRECT
+from exceptions import CookieTimeoutException
+from utils.config import Configuration
+
+
+class CookiePoolTest(unittest.TestCase):
+    seed = "http://market.onion/"
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.yml_path = os.path.join(self.folder.name, "crator.yml")
+        self.write_cookies(['healthy', 'failing', 'expired'])
+
+        self.config = Configuration(self.yml_path)
+        self.pool = CookiePool(self.seed, CookieHandler(self.seed, TorHandler()))
+
+    def tearDown(self):
+        self.config.stop_watcher()
+        self.config.cookie_store.close()
+        Configuration._instance = None
+        self.folder.cleanup()
+
+    def write_cookies(self, cookies):
+        with open(self.yml_path, 'w') as file:
+            yaml.dump({'http_proxy': None, 'crawler.cookies': [{'seed': self.seed, 'cookies': cookies}]}, file)
+
+    def test_healthy_cookies_first(self):
+        self.pool.acquire()
+        self.pool.report('healthy', SUCCESS, 0.5)
+        self.pool.report('failing', CAPTCHA, 0.5)
+        self.pool.report('expired', SUCCESS, 2.0)
+
+        chosen = [self.pool.acquire() for _ in range(300)]
+
+        # The failing cookie loses against any other cookie
+        self.assertEqual(chosen.count('failing'), 0)
+        self.assertGreater(chosen.count('healthy'), chosen.count('expired'))
+
+    def test_retire(self):
+        self.pool.acquire()
+        self.pool.report('expired', LOGIN_REDIRECT)
+        self.assertEqual(self.config.cookies(self.seed), ['healthy', 'failing'])
+
+        for _ in range(5):
+            self.pool.report('failing', CAPTCHA)
+        self.assertEqual(self.config.cookies(self.seed), ['healthy'])
+
+        self.assertEqual(self.pool.acquire(), 'healthy')
+        self.assertEqual(self.pool.n_retired, 2)
+        self.assertEqual([stats["requests"] for stats in self.pool.stats()], [0])
+
+    def test_wait_for_new_cookies(self):
+        for cookie in ['healthy', 'failing', 'expired']:
+            self.config.remove_cookie(self.seed, cookie)
+
+        with self.assertRaises(CookieTimeoutException):
+            self.pool.acquire(timeout=0.1)
+
+        # A cookie added by cookie_cli.py wakes up the waiting crawler
+        self.config.start_watcher(interval=0.05)
+        self.config.cookie_store.flush()
+        threading.Timer(0.2, lambda: self.config.cookie_store.add(self.seed, 'new')).start()
+
+        start_time = time.monotonic()
+        self.assertEqual(self.pool.acquire(timeout=5), 'new')
+        self.assertLess(time.monotonic() - start_time, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
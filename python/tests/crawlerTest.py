@@ -0,0 +1,160 @@
+import os
+import csv
+import time
+import yaml
+import unittest
+import tempfile
+import concurrent.futures
+from unittest import mock
+import requests
+from handler import TorHandler
+from crawler import Crawler
+from crawlstate import CrawlState
+from saver import FileSaver
+from pagestore import open_reader
+from utils.config import Configuration
+
+SEED = "http://market.onion/"
+
+
+class SiteTorHandler(TorHandler):
+    """
+    TorHandler stand-in for a site of 20 pages: the page i links to the pages 2i + 1 and 2i + 2.
+    """
+    def get_ip(self):
+        return "127.0.0.1"
+
+    def send_request(self, url, cookie=None, headers=None):
+        self.n_requests_sent += 1
+        path = url[len(SEED):]
+        page = int(path.split("/")[-1]) if path else 0
+        links = "".join(f"<a href='/p/{child}'>{child}</a>" for child in (2 * page + 1, 2 * page + 2) if child < 20)
+
+        web_page = requests.Response()
+        web_page.status_code = 200
+        web_page.url = url
+        web_page._content = f"<html><body>page {page} {links}</body></html>".encode()
+        web_page.request = requests.Request("GET", url).prepare()
+        web_page.headers["Content-Type"] = "text/html"
+        return web_page
+
+
+class SharedLinkTorHandler(SiteTorHandler):
+    """
+    TorHandler stand-in for a site where the page "deep" (depth 2) and the slow page "b" (depth 1) link to the same
+    page "shared": the link is first found at max depth.
+    """
+    links = {"": ["a", "b"], "a": ["deep"], "b": ["shared"], "deep": ["shared"], "shared": []}
+
+    def send_request(self, url, cookie=None, headers=None):
+        self.n_requests_sent += 1
+        path = url[len(SEED):]
+        if path == "b":
+            time.sleep(0.5)
+
+        web_page = requests.Response()
+        web_page.status_code = 200
+        web_page.url = url
+        web_page._content = "<html><body>{}</body></html>".format(
+            "".join(f"<a href='/{link}'>{link}</a>" for link in self.links[path])).encode()
+        web_page.request = requests.Request("GET", url).prepare()
+        web_page.headers["Content-Type"] = "text/html"
+        return web_page
+
+
+class CrawlerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.folder.name, "data")
+        os.makedirs(self.data_dir)
+
+        self.yml_path = os.path.join(self.folder.name, "crator.yml")
+        with open(self.yml_path, 'w') as file:
+            yaml.dump({'http_proxy': None, 'data_directory': self.data_dir, 'project_name': 'test',
+                       'crawler.depth': 10, 'crawler.max_links': 1000, 'crawler.max_time': 60,
+                       'crawler.wait_request': 0, 'crawler.checkpoint_interval': 0}, file)
+
+        self.config = Configuration(self.yml_path)
+
+    def tearDown(self):
+        self.config.stop_watcher()
+        self.config.cookie_store.close()
+        Configuration._instance = None
+        self.folder.cleanup()
+
+    def crawl(self, max_links=1000, **kwargs):
+        """
+        Build the crawler in this thread and run it in another one, as crator.py does.
+        :return: the crawler.
+        """
+        crawler = Crawler(SEED, SiteTorHandler(), **kwargs)
+        crawler.max_link = max_links
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(crawler.start).result()
+
+        return crawler
+
+    def test_start_in_another_thread(self):
+        crawler = self.crawl()
+
+        n_200_pages, _, _, _, _, n_nodes, n_requests = crawler.get_info()
+        self.assertEqual((n_200_pages, n_nodes, n_requests), (20, 20, 20))
+
+        # The last changes are committed: nothing left to resume
+        url_depth, pending, next_node_index = CrawlState(os.path.dirname(crawler.state.path), SEED).load({}, set())
+        self.assertEqual((pending, next_node_index), ([], 20))
+
+        # The pages are in the segments of the store, not in <index>.html files
+        with open(crawler.monitor.nodes_file_path, newline='') as file:
+            self.assertEqual({node["filename"] for node in csv.DictReader(file)}, {""})
+
+    def test_link_found_at_max_depth_and_below(self):
+        crawler = Crawler(SEED, SharedLinkTorHandler())
+        crawler.max_depth = 2
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(crawler.start).result()
+
+        # "shared" is skipped from "deep", then crawled from "b"
+        n_200_pages, _, _, _, n_skip_pages, n_nodes, _ = crawler.get_info()
+        self.assertEqual((n_200_pages, n_skip_pages, n_nodes), (5, 1, 5))
+
+    def test_resume_after_crash(self):
+        save_page = FileSaver.write_page
+
+        def write_page(saver, content, index_node, content_hash, source):
+            if b"page 1 " in content:
+                raise OSError("No space left on device")
+            save_page(saver, content, index_node, content_hash, source)
+
+        def crash(state, commit=True):
+            # The changes after the last checkpoint are lost
+            state.connection.close()
+
+        # The page 1 is never written, and the crawl stops without its last checkpoint
+        with mock.patch.object(FileSaver, "write_page", write_page), mock.patch.object(CrawlState, "close", crash):
+            self.crawl(max_links=5)
+
+        self.crawl(resume=True)
+
+        project_path = os.path.join(self.data_dir, os.listdir(self.data_dir)[0])
+        with open(os.path.join(project_path, "graph", "nodes.csv"), newline='') as file:
+            nodes = list(csv.DictReader(file))
+
+        # The indexes of the nodes written after the last checkpoint are not given again
+        node_urls = {int(node["index"]): node["url"] for node in nodes}
+        self.assertEqual(len(node_urls), len(nodes))
+
+        # All the pages are saved, each one under the index of its url
+        reader = open_reader(os.path.join(project_path, "pages"))
+        saved_pages = set()
+        for index, url in node_urls.items():
+            if index in reader:
+                page = int(url[len(SEED):].split("/")[-1] or 0)
+                self.assertIn(f"page {page} ".encode(), reader.read(index))
+                saved_pages.add(page)
+
+        self.assertEqual(saved_pages, set(range(20)))
+
+
+if __name__ == '__main__':
+    unittest.main()
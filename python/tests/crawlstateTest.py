@@ -0,0 +1,79 @@
+import unittest
+import tempfile
+import threading
+
+from crawlstate import CrawlState
+
+
+class CrawlStateTest(unittest.TestCase):
+    def test_resume(self):
+        seed = "http://a.onion"
+
+        with tempfile.TemporaryDirectory() as project_path:
+            state = CrawlState(project_path, seed)
+            state.add_pending(seed, None, 0)
+            state.add_visited(seed, 0)
+            state.add_pending("http://a.onion/1", 1, 1)
+            state.add_pending("http://a.onion/2", 2, 1)
+            state.add_pending("http://a.onion/3", 3, 1)
+            state.add_visited("http://a.onion/2", 2)
+            state.add_unvisited("http://a.onion/deep")
+            state.checkpoint(force=True)
+
+            # Not committed: lost with the crash
+            state.add_visited("http://a.onion/1", 1)
+            state.connection.close()
+
+            visited, unvisited_links = {}, set()
+            url_depth, pending, next_node_index = CrawlState(project_path, seed).load(visited, unvisited_links)
+
+            self.assertEqual(visited, {seed: 0, "http://a.onion/1": 1, "http://a.onion/2": 2, "http://a.onion/3": 3})
+            self.assertEqual(pending, ["http://a.onion/1", "http://a.onion/3"])
+            self.assertEqual(url_depth, {"http://a.onion/1": 1, "http://a.onion/3": 1})
+            self.assertEqual(unvisited_links, {"http://a.onion/deep"})
+            self.assertEqual(next_node_index, 4)
+
+    def test_seeds_in_the_same_project(self):
+        with tempfile.TemporaryDirectory() as project_path:
+            state = CrawlState(project_path, "http://a.onion")
+            state.add_pending("http://a.onion", None, 0)
+            state.close()
+
+            other_state = CrawlState(project_path, "http://b.onion")
+            visited, unvisited_links = {}, set()
+            self.assertEqual(other_state.load(visited, unvisited_links), ({}, [], 0))
+            self.assertEqual((visited, unvisited_links), ({}, set()))
+            other_state.close()
+
+            self.assertEqual(CrawlState(project_path, "http://a.onion").load({}, set())[1], ["http://a.onion"])
+
+    def test_used_by_another_thread(self):
+        seed = "http://a.onion"
+
+        with tempfile.TemporaryDirectory() as project_path:
+            # Built by the main thread, used by the thread of the crawl, as in crator.py
+            state = CrawlState(project_path, seed)
+            errors = []
+
+            def crawl():
+                try:
+                    state.add_pending(seed, None, 0)
+                    state.add_visited(seed, 0)
+                    state.add_pending("http://a.onion/1", 1, 1)
+                    state.checkpoint(force=True)
+                    state.close()
+                except Exception as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=crawl)
+            thread.start()
+            thread.join()
+
+            self.assertEqual(errors, [])
+            url_depth, pending, next_node_index = CrawlState(project_path, seed).load({}, set())
+            self.assertEqual(pending, ["http://a.onion/1"])
+            self.assertEqual(next_node_index, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
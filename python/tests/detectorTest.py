@@ -0,0 +1,56 @@
+import unittest
+from unittest import mock
+
+import extractor
+from detector import CaptchaDetector
+from tests.documentTest import make_response
+
+
+def redirected(url, content):
+    response = make_response(url, content)
+    redirect = make_response("http://market.onion/page", b"")
+    redirect.status_code = 302
+    response.history = [redirect]
+    return response
+
+
+class CaptchaDetectorTest(unittest.TestCase):
+    def test_stages(self):
+        detector = CaptchaDetector()
+        pages = [
+            # Not redirected: discarded by the history
+            make_response("http://market.onion/page", b"<img src='/captcha.png'>"),
+            # Redirected without captcha words: discarded by the scan
+            redirected("http://market.onion/home", b"<img src='/logo.png'><a href='/page'>page</a>"),
+            # Captcha word in the text only: parsed, no captcha image
+            redirected("http://market.onion/help", b"<p>Solve the CAPTCHA to continue</p>"),
+            redirected("http://market.onion/login", b"<form><img src='/CaptchaImage?id=1'></form>"),
+        ]
+
+        with mock.patch("extractor.parse_page", wraps=extractor.parse_page) as parse_page:
+            verdicts = [detector("http://market.onion/page", page) for page in pages]
+
+        self.assertEqual(verdicts, [False, False, False, True])
+        self.assertEqual(parse_page.call_count, 2)
+        self.assertEqual(detector.stats, {"no_redirect": 1, "no_marker": 1, "parsed": 2, "captchas": 1})
+
+    def test_image_without_src(self):
+        page = redirected("http://market.onion/login", b"<img alt='captcha'><img src=''>")
+        self.assertFalse(CaptchaDetector()("http://market.onion/page", page))
+
+    def test_rules(self):
+        detector = CaptchaDetector.from_rules({'markers': ["Verify you are human", "ddos-guard"], 'confirm': False,
+                                               'require_redirect': False})
+
+        self.assertTrue(detector("http://market.onion/", make_response("http://market.onion/",
+                                                                       b"<h1>verify you are HUMAN</h1>")))
+        self.assertFalse(detector("http://market.onion/", make_response("http://market.onion/",
+                                                                        b"<img src='/captcha.png'>")))
+
+        confirmed = CaptchaDetector.from_rules({'markers': ["queue"]})
+        page = redirected("http://market.onion/wait", b"<img src='/img/queue.gif'>")
+        self.assertTrue(confirmed("http://market.onion/page", page))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from unittest import mock
+
+import requests
+
+import extractor
+import detector
+from document import PageDocument
+
+
+def make_response(url, content, history=()):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = content
+    response.request = requests.Request("GET", url).prepare()
+    response.history = list(history)
+    return response
+
+
+class PageDocumentTest(unittest.TestCase):
+    def test_parsed_once(self):
+        response = make_response("http://market.onion/login", b"<img src='/Captcha.png'><img alt='no src'>"
+                                                              b"<a href='/home'>home</a>")
+        redirect = make_response("http://market.onion/home", b"")
+        redirect.status_code = 302
+        response.history = [redirect]
+
+        with mock.patch("extractor.parse_page", wraps=extractor.parse_page) as parse_page:
+            self.assertTrue(detector.captcha_detector("http://market.onion/home", response))
+            links = PageDocument.of(response).internal_links()
+
+        self.assertEqual(parse_page.call_count, 1)
+        self.assertEqual(links, ["http://market.onion/home"])
+        self.assertEqual(PageDocument.of(response).img_srcs, ["/Captcha.png"])
+
+    def test_backend_of_first_creation(self):
+        response = make_response("http://market.onion/", b"<a href='/a'>a</a>")
+        document = PageDocument.of(response, "bs4")
+
+        self.assertIs(PageDocument.of(response), document)
+        self.assertEqual(document.backend, "bs4")
+
+    def test_login_redirection_keeps_history(self):
+        login_page = make_response("http://market.onion/login", b"")
+        redirects = [make_response(f"http://market.onion/{i}", b"") for i in range(3)]
+        for redirect in redirects:
+            redirect.status_code = 302
+        redirects[1].url = login_page.url
+        response = make_response("http://market.onion/login", b"", redirects)
+
+        self.assertTrue(detector.login_redirection(response, login_page))
+        self.assertEqual(response.history, redirects)
+
+
+if __name__ == '__main__':
+    unittest.main()
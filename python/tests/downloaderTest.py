@@ -0,0 +1,107 @@
+import unittest
+import time
+
+from handler import TorHandler
+from downloader import Downloader
+
+
+class SleepingTorHandler(TorHandler):
+    """
+    TorHandler stand-in: the url is the number of seconds the request takes.
+    """
+    def send_request(self, url, cookie=None, headers=None):
+        time.sleep(float(url))
+        self.n_requests_sent += 1
+        return url
+
+
+class RecordingTorHandler(TorHandler):
+    """
+    TorHandler stand-in that records when each url is requested.
+    """
+    def __init__(self):
+        super().__init__()
+        self.request_time = {}
+
+    def send_request(self, url, cookie=None, headers=None):
+        self.request_time[url] = time.monotonic()
+        return url
+
+
+class DownloaderTest(unittest.TestCase):
+    def test_results_without_waiting_slow_pages(self):
+        downloader = Downloader(4, torhandler=SleepingTorHandler(), waiting_time=0)
+        downloader.start()
+
+        downloader.enqueue("2", None)
+        downloader.enqueue("0.1", None)
+
+        start_time = time.time()
+        results = []
+        while not results:
+            results = downloader.get_results(timeout=1)
+
+        self.assertLess(time.time() - start_time, 1)
+        self.assertEqual([url for url, future in results], ["0.1"])
+        self.assertFalse(downloader.is_empty())
+
+        results = downloader.get_results(timeout=5)
+        self.assertEqual([future.result() for url, future in results], ["2"])
+        self.assertTrue(downloader.is_empty())
+
+        downloader.stop()
+
+    def test_get_results_timeout(self):
+        downloader = Downloader(1, torhandler=SleepingTorHandler(), waiting_time=0)
+        downloader.start()
+
+        self.assertEqual(downloader.get_results(), [])
+        self.assertEqual(downloader.get_results(timeout=0.1), [])
+        self.assertTrue(downloader.is_empty())
+
+        downloader.stop()
+
+    def test_waiting_time_per_host(self):
+        tor_handler = RecordingTorHandler()
+        downloader = Downloader(4, torhandler=tor_handler, waiting_time=0.5)
+        downloader.start()
+
+        start_time = time.monotonic()
+        urls = ["http://a.onion/1", "http://a.onion/2", "http://b.onion/1", "http://c.onion/1"]
+        for url in urls:
+            downloader.enqueue(url, None)
+
+        while not downloader.is_empty():
+            downloader.get_results(timeout=1)
+        downloader.stop()
+
+        request_time = {url: tor_handler.request_time[url] - start_time for url in urls}
+        self.assertLess(request_time["http://b.onion/1"], 0.25)
+        self.assertLess(request_time["http://c.onion/1"], 0.25)
+        self.assertGreaterEqual(request_time["http://a.onion/2"] - request_time["http://a.onion/1"], 0.5)
+
+
+    def test_backpressure(self):
+        downloader = Downloader(2, torhandler=SleepingTorHandler(), waiting_time=0, results_queue_size=4,
+                                results_low_watermark=1)
+        downloader.start()
+
+        for _ in range(20):
+            downloader.enqueue("0", None)
+
+        # The downloads stop at the high watermark, plus the ones already started
+        time.sleep(0.3)
+        self.assertLessEqual(downloader.torhandler.n_requests_sent, 4 + 2)
+        self.assertTrue(downloader.completed.throttled)
+
+        n_results = 0
+        while n_results < 20:
+            n_results += len(downloader.get_results(timeout=1))
+
+        self.assertTrue(downloader.is_empty())
+        self.assertLessEqual(downloader.pipeline_stats()["downloaded"]["max_size"], 4 + 2)
+        downloader.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
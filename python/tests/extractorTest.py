@@ -0,0 +1,66 @@
+import unittest
+import os
+
+import extractor
+
+
+pages_path = os.path.join(os.path.dirname(__file__), "data", "pages")
+
+MARKET = "http://market2xyzabcdefghijklmnopqrstuvwxyz234567abcdefghijklmno.onion"
+
+# Saved page -> url of the request that downloaded it
+CORPUS = {
+    "listing.html": f"{MARKET}/listings/category/",
+    "forum.html": f"{MARKET}/forum",
+    "latin1.html": f"{MARKET}/store/nojs/",
+    "utf8.html": f"{MARKET}/",
+}
+
+# libxml2 tokenizes some malformed markup differently from html.parser: the first duplicated attribute wins and the
+# content of <textarea> is text
+LXML_DIFFERENCES = {
+    "listing.html": {f"{MARKET}/listings?page=4", f"{MARKET}/listings?page=5"},
+    "forum.html": {f"{MARKET}/in-textarea"},
+}
+
+
+def read_page(file_name):
+    with open(os.path.join(pages_path, file_name), "rb") as file:
+        return file.read()
+
+
+class ExtractorTest(unittest.TestCase):
+    def assert_parity(self, backend, differences=None):
+        differences = differences or {}
+
+        for file_name, request_url in CORPUS.items():
+            with self.subTest(page=file_name, backend=backend):
+                content = read_page(file_name)
+                expected = extractor.reference_internal_links(content, request_url)
+                links = extractor.internal_links(request_url, extractor.extract_hrefs(content, backend))
+
+                self.assertEqual(set(links) ^ set(expected), differences.get(file_name, set()))
+                self.assertEqual(len(links), len(set(links)))
+
+    def test_parity_bs4(self):
+        self.assert_parity("bs4")
+
+    def test_parity_htmlparser(self):
+        self.assert_parity("htmlparser")
+
+    @unittest.skipIf(extractor.etree is None, "lxml is not installed")
+    def test_parity_lxml(self):
+        self.assert_parity("lxml", LXML_DIFFERENCES)
+
+    def test_internal_links(self):
+        links = extractor.internal_links(f"{MARKET}/listings/", ["product/1", "/vendor", "http://forum.onion/x",
+                                                                  "//forum.onion/y", None, "product/1"])
+        self.assertEqual(links, [f"{MARKET}/listings/product/1", f"{MARKET}/vendor", f"{MARKET}/listings"])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            extractor.extract_hrefs(b"<a href='/'>", "regex")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from fingerprint import FingerprintTable, ScalableBloomFilter
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_fingerprint_table(self):
+        urls = [f"http://a.onion/page/{i}" for i in range(5000)]
+
+        table = FingerprintTable(capacity=16)
+        for i, url in enumerate(urls):
+            table[url] = i
+        table[urls[0]] = 42
+
+        self.assertEqual(len(table), len(urls))
+        self.assertEqual(table[urls[0]], 42)
+        self.assertEqual(table[urls[-1]], len(urls) - 1)
+        self.assertIn(urls[100], table)
+        self.assertNotIn("http://a.onion/page/5000", table)
+        self.assertIsNone(table.get("http://a.onion/page/5000"))
+        self.assertRaises(KeyError, table.__getitem__, "http://a.onion/page/5000")
+
+    def test_scalable_bloom_filter(self):
+        bloom_filter = ScalableBloomFilter(error_rate=0.01, initial_capacity=100)
+        for i in range(2000):
+            bloom_filter.add(f"http://a.onion/page/{i}")
+
+        self.assertGreater(len(bloom_filter.filters), 1)
+        self.assertTrue(all(f"http://a.onion/page/{i}" in bloom_filter for i in range(2000)))
+
+        false_positives = sum(f"http://b.onion/page/{i}" in bloom_filter for i in range(10000))
+        # Error rate 1%, with some margin
+        self.assertLess(false_positives, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 import os
 import csv
-from monitor import CrawlerMonitor
+import tempfile
+from unittest import mock
+from monitor import CrawlerMonitor, ColumnBuffer, StringTable
 
 
 test_data_path = "test_data"
@@ -53,9 +55,12 @@ class MonitorTest(unittest.TestCase):
                 nodes.append(tuple(row))
 
         monitor = CrawlerMonitor()
-        monitor.info_pages = info_pages
-        monitor.info_unvisited_page = unvisited_pages
-        monitor.nodes = nodes
+        for info_page in info_pages:
+            monitor.add_info_page(*info_page)
+        for unvisited_page in unvisited_pages:
+            monitor.add_info_unvisited_page(*unvisited_page)
+        for node in nodes:
+            monitor.add_node(*node)
 
         n_200_pages, n_300_pages, n_400_pages, n_500_pages, n_skip_page, links_found, n_requests = monitor.get_info()
 
@@ -70,6 +75,97 @@ class MonitorTest(unittest.TestCase):
 
         self.assertEqual(results, expected_results)
 
+    def test_incremental_save(self):
+        with tempfile.TemporaryDirectory() as project_path:
+            monitor = CrawlerMonitor(project_path)
+
+            monitor.add_info_page(1, "http://a.onion", "1.2.3.4", 200, 1000)
+            monitor.add_node("http://a.onion", 0, 0, "0.html")
+            monitor.save_data_to_csv()
+
+            monitor.add_info_page(2, "http://a.onion/b", "1.2.3.4", 404, 24)
+            monitor.add_node("http://a.onion/b", 1, 1, "1.html")
+            monitor.add_edge(0, 1)
+            monitor.add_info_unvisited_page(3, "http://a.onion/c", "1.2.3.4", "MAX DEPTH")
+
+            self.assertEqual(monitor.get_info(), (1, 0, 1, 0, 1, 2, 0))
+            monitor.save_data_to_csv()
+
+            self.assertEqual(len(monitor.info_pages), 0)
+            self.assertEqual(len(monitor.nodes), 0)
+            self.assertEqual(monitor.get_info(), (1, 0, 1, 0, 1, 2, 0))
+
+            stats = monitor.get_stats()
+            self.assertEqual(stats["status_codes"], {200: 1, 404: 1})
+            self.assertEqual(stats["reasons"], {"MAX DEPTH": 1})
+            self.assertEqual(stats["depths"], {0: 1, 1: 1})
+            self.assertEqual(stats["bytes_downloaded"], 1024)
+
+            monitor.stop_program()
+
+            with open(monitor.crawled_file_path, 'r') as file:
+                rows = list(csv.reader(file))
+            self.assertEqual(rows, [["timestamp", "url", "ip_client", "status_code"],
+                                    ["1", "http://a.onion", "1.2.3.4", "200"],
+                                    ["2", "http://a.onion/b", "1.2.3.4", "404"]])
+
+            with open(monitor.edges_file_path, 'r') as file:
+                self.assertEqual(list(csv.reader(file)), [["node", "node"], ["0", "1"]])
+
+    def test_save_error(self):
+        with tempfile.TemporaryDirectory() as project_path:
+            monitor = CrawlerMonitor(project_path)
+            monitor.add_node("http://a.onion", 0, 0, "0.html")
+            monitor.add_edge(0, 1)
+
+            # The rows are kept for the next checkpoint, and the error is raised to the caller
+            with mock.patch.object(monitor.nodes_file, "write", side_effect=OSError("No space left on device")):
+                with self.assertRaises(OSError):
+                    monitor.checkpoint()
+
+            monitor.add_node("http://a.onion/b", 1, 1, "1.html")
+            monitor.checkpoint()
+            monitor.stop_program()
+
+            with open(monitor.nodes_file_path, 'r') as file:
+                self.assertEqual([row[0] for row in csv.reader(file)], ["url", "http://a.onion", "http://a.onion/b"])
+            with open(monitor.edges_file_path, 'r') as file:
+                self.assertEqual(list(csv.reader(file)), [["node", "node"], ["0", "1"]])
+
+    def test_without_project_path(self):
+        monitor = CrawlerMonitor()
+        monitor.add_node("http://a.onion", 0, 0, "0.html")
+        monitor.checkpoint()
+        monitor.stop_program()
+
+        self.assertEqual(monitor.get_info()[5], 1)
+        self.assertEqual(monitor.next_node_index(), 0)
+
+    def test_column_buffer(self):
+        strings = StringTable()
+        pages = ColumnBuffer("qssH", strings)
+        nodes = ColumnBuffer("sIIs", strings)
+
+        pages.append(1700000000, "http://a.onion", "1.2.3.4", 200)
+        pages.append("1700000001", "http://a.onion/b", "1.2.3.4", "404")
+        nodes.append("http://a.onion", 0, 0, "0.html")
+
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(list(pages.rows()), [("1700000000", "http://a.onion", "1.2.3.4", "200"),
+                                              ("1700000001", "http://a.onion/b", "1.2.3.4", "404")])
+        self.assertEqual(list(nodes.rows()), [("http://a.onion", "0", "0", "0.html")])
+
+        # Urls and ips shared by the buffers are stored once
+        self.assertEqual(strings.strings, ["http://a.onion", "1.2.3.4", "http://a.onion/b", "0.html"])
+
+        # A row with an invalid value is not added
+        with self.assertRaises(ValueError):
+            pages.append(1700000002, "http://a.onion/c", "1.2.3.4", "error")
+        with self.assertRaises(OverflowError):
+            pages.append(1700000002, "http://a.onion/c", "1.2.3.4", 70000)
+        self.assertEqual(len(pages), 2)
+        self.assertTrue(all(len(column) == 2 for column in pages.columns))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,33 @@
+import unittest
+
+from normalizer import UrlNormalizer
+
+
+class NormalizerTest(unittest.TestCase):
+    def test_default_rules(self):
+        normalizer = UrlNormalizer()
+
+        self.assertEqual(normalizer("HTTP://Market.ONION:80/Item/1/#reviews"), "http://market.onion/Item/1")
+        self.assertEqual(normalizer("https://market.onion:443/"), "https://market.onion")
+        self.assertEqual(normalizer("http://market.onion:8080/a"), "http://market.onion:8080/a")
+        self.assertEqual(normalizer("http://user@Market.onion/a"), "http://user@market.onion/a")
+        self.assertEqual(normalizer("http://market.onion/a?b=1&a=2&b=1&&c"), "http://market.onion/a?b=1&a=2&c")
+        self.assertEqual(normalizer("http://market.onion/a?q=%20x"), "http://market.onion/a?q=%20x")
+
+    def test_seed_rules(self):
+        normalizer = UrlNormalizer.from_rules({
+            "seed": "http://market.onion",
+            "drop_params": ["sid", "PHPSESSID"],
+            "sort_query": True,
+            "strip_fragment": False,
+            "rewrites": [{"pattern": r"/index\.php$", "replacement": ""}],
+        })
+
+        self.assertEqual(normalizer("http://market.onion/list?page=2&sid=abc&cat=3#top"),
+                         "http://market.onion/list?cat=3&page=2#top")
+        self.assertEqual(normalizer("http://market.onion/list?PHPSESSID=1"), "http://market.onion/list")
+        self.assertEqual(normalizer("http://market.onion/index.php"), "http://market.onion")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import unittest
+import tempfile
+
+from pagestore import SegmentStore, SegmentReader, FileReader, open_reader, INDEX_FILE
+from saver import FileSaver
+
+
+class PageStoreTest(unittest.TestCase):
+    def test_segment_store(self):
+        with tempfile.TemporaryDirectory() as pages_path:
+            store = SegmentStore(pages_path, segment_size=100)
+            bodies = [os.urandom(100) for _ in range(3)]
+            pages = {index: bodies[index % 3] for index in range(6)}
+            for index, content in pages.items():
+                store.put(index, content)
+            store.close()
+
+            # Identical pages stored once, a new segment when the current one is full
+            self.assertEqual(store.n_duplicates, 3)
+            self.assertEqual(len([name for name in os.listdir(pages_path) if name.startswith("segment-")]), 3)
+
+            reader = open_reader(pages_path)
+            self.assertIsInstance(reader, SegmentReader)
+            self.assertEqual(len(reader), 6)
+            for index, content in pages.items():
+                self.assertEqual(reader.read(index), content)
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as pages_path:
+            store = SegmentStore(pages_path)
+            store.put(0, b"<html>a</html>")
+            store.close()
+
+            # Incomplete row of a crashed run
+            with open(os.path.join(pages_path, INDEX_FILE), 'a') as file:
+                file.write("1,abc,segment-00000")
+
+            store = SegmentStore(pages_path)
+            store.put(2, b"<html>a</html>")
+            store.put(3, b"<html>b</html>")
+            store.close()
+
+            self.assertEqual(store.n_duplicates, 1)
+            reader = SegmentReader(pages_path)
+            self.assertNotIn(1, reader)
+            self.assertEqual(reader.read(2), b"<html>a</html>")
+            self.assertEqual(reader.read(3), b"<html>b</html>")
+
+    def test_file_saver(self):
+        with tempfile.TemporaryDirectory() as pages_path, tempfile.TemporaryDirectory() as previous_path:
+            with open(os.path.join(previous_path, "7.html"), 'w') as file:
+                file.write("<html>previous</html>")
+
+            saver = FileSaver(pages_path, n_threads=2, store="files")
+            saver.start()
+            saver.enqueue(b"<html>new</html>", 0)
+            saver.link(FileReader(previous_path), 7, 1)
+            saver.stop()
+
+            reader = open_reader(pages_path)
+            self.assertIsInstance(reader, FileReader)
+            self.assertEqual(reader.read(0), b"<html>new</html>")
+            self.assertEqual(reader.read(1), b"<html>previous</html>")
+            self.assertEqual(os.stat(reader.path(1)).st_nlink, 2)
+
+            saver = FileSaver(pages_path, store="segments")
+            saver.start()
+            saver.link(FileReader(previous_path), 7, 2)
+            saver.stop()
+            self.assertEqual(open_reader(pages_path).read(2), b"<html>previous</html>")
+
+
+if __name__ == '__main__':
+    unittest.main()
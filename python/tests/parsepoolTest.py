@@ -0,0 +1,54 @@
+import os
+import unittest
+from unittest import mock
+
+import extractor
+import detector
+from document import PageDocument
+from parsepool import ParsePool
+from tests.documentTest import make_response
+
+PAGES_PATH = os.path.join(os.path.dirname(__file__), "data", "pages")
+
+
+class ParsePoolTest(unittest.TestCase):
+    def test_same_result_as_the_crawler_thread(self):
+        responses = []
+        for name in sorted(os.listdir(PAGES_PATH)):
+            with open(os.path.join(PAGES_PATH, name), 'rb') as file:
+                content = file.read()
+            responses.append((make_response(f"http://market.onion/{name}", content),
+                              make_response(f"http://market.onion/{name}", content)))
+
+        pool = ParsePool(2)
+        try:
+            pool.parse([pooled for pooled, local in responses])
+        finally:
+            pool.shutdown()
+
+        with mock.patch("extractor.parse_page", wraps=extractor.parse_page) as parse_page:
+            for pooled, local in responses:
+                self.assertEqual(PageDocument.of(pooled).hrefs, PageDocument.of(local).hrefs)
+                self.assertEqual(PageDocument.of(pooled).internal_links(), PageDocument.of(local).internal_links())
+                self.assertEqual(detector.captcha_detector(pooled.url, pooled),
+                                 detector.captcha_detector(local.url, local))
+
+        # Only the local documents have been parsed in this process
+        self.assertEqual(parse_page.call_count, len(responses))
+
+    def test_shared_pool(self):
+        pool = ParsePool.shared(1)
+        try:
+            with self.assertLogs("CRATOR", level="WARNING"):
+                self.assertIs(ParsePool.shared(2), pool)
+        finally:
+            ParsePool.shutdown_shared()
+
+        # A new pool after the shutdown
+        pool = ParsePool.shared(2)
+        self.assertEqual(pool.n_workers, 2)
+        ParsePool.shutdown_shared()
+
+
+if __name__ == '__main__':
+    unittest.main()
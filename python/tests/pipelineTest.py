@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+import unittest
+
+from pipeline import BoundedQueue
+
+
+class BoundedQueueTest(unittest.TestCase):
+    def test_watermarks(self):
+        bounded_queue = BoundedQueue("test", high_watermark=4, low_watermark=1)
+        for i in range(4):
+            bounded_queue.put(i, timeout=0.1)
+
+        # Blocked from the high watermark...
+        self.assertTrue(bounded_queue.throttled)
+        self.assertRaises(queue.Full, bounded_queue.put, 4, timeout=0.05)
+
+        # ...until the low watermark
+        self.assertEqual([bounded_queue.get(), bounded_queue.get()], [0, 1])
+        self.assertRaises(queue.Full, bounded_queue.put, 4, timeout=0.05)
+        bounded_queue.get()
+        bounded_queue.put(4, timeout=0.05)
+
+        # Non blocking put always accepted
+        bounded_queue.put(5, block=False)
+        bounded_queue.put(6, block=False)
+
+        stats = bounded_queue.stats()
+        self.assertEqual((stats["size"], stats["max_size"], stats["put"], stats["got"], stats["blocked"]),
+                         (4, 4, 7, 3, 2))
+
+    def test_blocked_producer(self):
+        bounded_queue = BoundedQueue("test", high_watermark=2)
+        produced = []
+
+        def produce():
+            for i in range(10):
+                bounded_queue.put(i)
+                produced.append(i)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+
+        time.sleep(0.1)
+        self.assertEqual(len(produced), 2)
+
+        consumed = [bounded_queue.get(timeout=1) for _ in range(10)]
+        producer.join(1)
+        self.assertEqual(consumed, list(range(10)))
+
+    def test_close(self):
+        bounded_queue = BoundedQueue("test", high_watermark=1)
+        bounded_queue.put("item")
+        self.assertFalse(bounded_queue.wait_for_room(timeout=0.01))
+
+        bounded_queue.close()
+        self.assertFalse(bounded_queue.wait_for_room())
+        self.assertRaises(queue.Full, bounded_queue.put, "other")
+
+        self.assertEqual(bounded_queue.get(), "item")
+        self.assertRaises(queue.Empty, bounded_queue.get)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import unittest
+import tempfile
+
+import requests
+
+from recrawl import PreviousCrawl
+
+
+class PreviousCrawlTest(unittest.TestCase):
+    def setUp(self):
+        self.project = tempfile.TemporaryDirectory()
+        project_path = self.project.name
+
+        os.makedirs(os.path.join(project_path, "graph"))
+        os.makedirs(os.path.join(project_path, "pages"))
+
+        with open(os.path.join(project_path, "graph", "nodes.csv"), 'w') as file:
+            file.write("url,index,depth_level,filename\n"
+                       "http://a.onion,0,0,0.html\n"
+                       "http://a.onion/1,1,1,1.html\n"
+                       "http://a.onion/2,2,1,2.html\n")
+
+        with open(os.path.join(project_path, "graph", "contents.csv"), 'w') as file:
+            file.write('url,content_hash,etag,last_modified\n'
+                       'http://a.onion,h0,"""v1""",\n'
+                       'http://a.onion/1,h1,,"Mon, 01 Jan 2024 00:00:00 GMT"\n'
+                       'http://a.onion/2,h2,,\n')
+
+        for index in range(2):
+            with open(os.path.join(project_path, "pages", f"{index}.html"), 'w') as file:
+                file.write(f"<a href='/{index + 1}'>next</a>")
+
+        self.previous_crawl = PreviousCrawl(project_path)
+
+    def tearDown(self):
+        self.project.cleanup()
+
+    def test_load(self):
+        # The page 2 has no file
+        self.assertEqual(len(self.previous_crawl), 2)
+        self.assertIsNone(self.previous_crawl.get("http://a.onion/2"))
+        self.assertEqual(self.previous_crawl.get("http://a.onion").content_hash, "h0")
+
+    def test_conditional_headers(self):
+        self.assertEqual(self.previous_crawl.conditional_headers("http://a.onion"), {"If-None-Match": '"v1"'})
+        self.assertEqual(self.previous_crawl.conditional_headers("http://a.onion/1"),
+                         {"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        self.assertIsNone(self.previous_crawl.conditional_headers("http://a.onion/2"))
+
+    def test_restore(self):
+        web_page = requests.Response()
+        web_page.status_code = 304
+        web_page._content = b""
+
+        page = self.previous_crawl.restore("http://a.onion/1", web_page)
+        self.assertEqual(page.content_hash, "h1")
+        self.assertEqual(web_page.content, b"<a href='/2'>next</a>")
+
+        web_page.status_code = 200
+        self.assertIsNone(self.previous_crawl.restore("http://a.onion", web_page))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from scheduler import PolitenessScheduler
+from frontier import PriorityPolicy
+
+
+class PolitenessSchedulerTest(unittest.TestCase):
+    def test_same_host_spacing(self):
+        scheduler = PolitenessScheduler(1.5)
+        scheduler.append(("http://a.onion/1", None))
+        scheduler.append(("http://a.onion/2", None))
+
+        self.assertEqual(scheduler.pop_ready(0), ("http://a.onion/1", None))
+        self.assertIsNone(scheduler.pop_ready(1))
+        self.assertEqual(scheduler.next_ready_in(1), 0.5)
+        self.assertEqual(scheduler.pop_ready(1.5), ("http://a.onion/2", None))
+        self.assertEqual(len(scheduler), 0)
+        self.assertIsNone(scheduler.next_ready_in(2))
+
+    def test_hosts_do_not_wait_each_other(self):
+        scheduler = PolitenessScheduler(10)
+        for url in ["http://a.onion/1", "http://a.onion/2", "http://b.onion/1", "http://c.onion/1"]:
+            scheduler.append((url, None))
+
+        popped = [scheduler.pop_ready(0) for _ in range(3)]
+        self.assertEqual({url for url, cookie in popped}, {"http://a.onion/1", "http://b.onion/1", "http://c.onion/1"})
+        self.assertIsNone(scheduler.pop_ready(0))
+        self.assertEqual(scheduler.pop_ready(10), ("http://a.onion/2", None))
+
+    def test_host_slot_kept_after_empty_queue(self):
+        scheduler = PolitenessScheduler(2)
+        scheduler.append(("http://a.onion/1", None))
+        scheduler.pop_ready(0)
+
+        scheduler.append(("http://a.onion/2", None))
+        self.assertIsNone(scheduler.pop_ready(1))
+        self.assertEqual(scheduler.pop_ready(2), ("http://a.onion/2", None))
+
+    def test_random_wait(self):
+        scheduler = PolitenessScheduler(2, random_wait=True)
+        for _ in range(100):
+            self.assertTrue(1 <= scheduler.wait_time() <= 3)
+
+    def test_priority(self):
+        scheduler = PolitenessScheduler(0)
+        scheduler.append(("http://a.onion/list?page=2", None), (2, 0))
+        scheduler.append(("http://a.onion/product/1", None), (0, 1))
+        scheduler.append(("http://a.onion/list?page=3", None), (2, 2))
+        scheduler.append(("http://a.onion/vendor/1", None), (0, 3))
+
+        popped = [scheduler.pop_ready(i)[0] for i in range(4)]
+        self.assertEqual(popped, ["http://a.onion/product/1", "http://a.onion/vendor/1", "http://a.onion/list?page=2",
+                                  "http://a.onion/list?page=3"])
+        self.assertEqual(scheduler.stats(), {"size": 0, "hosts": 0, "max_size": 4, "pushed": 4, "popped": 4})
+
+
+class PriorityPolicyTest(unittest.TestCase):
+    def test_scores(self):
+        policy = PriorityPolicy.from_rules({
+            "seed": "http://a.onion",
+            "patterns": [{"pattern": "/(product|vendor)/", "weight": 2}, {"pattern": r"page=\d+", "weight": -1}],
+        })
+
+        self.assertEqual(policy.priority("http://a.onion/product/1", 1), (-1, 0))
+        self.assertEqual(policy.priority("http://a.onion/list?page=2", 1), (2, 1))
+        self.assertEqual(policy.priority("http://a.onion/about", 1), (1, 2))
+        self.assertEqual(policy.matches, {"/(product|vendor)/": 1, r"page=\d+": 1})
+
+    def test_newest_first(self):
+        policy = PriorityPolicy(newest_first=True)
+        first = policy.priority("http://a.onion/1", 1)
+        second = policy.priority("http://a.onion/2", 1)
+        self.assertLess(second, first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from unittest import mock
+
+import useragent
+from useragent import UserAgentProvider, DEFAULT_USER_AGENT
+
+
+class UserAgentProviderTest(unittest.TestCase):
+    def test_static_list(self):
+        provider = UserAgentProvider(["agent-a", {"agent": "agent-b", "weight": 3}, {"agent": "agent-c", "weight": 0}])
+
+        agents = [provider.random() for _ in range(4000)]
+        self.assertEqual(len(provider), 2)
+        self.assertNotIn("agent-c", agents)
+
+        # agent-b is three times more likely than agent-a
+        self.assertAlmostEqual(agents.count("agent-b") / agents.count("agent-a"), 3, delta=0.6)
+
+    def test_sticky_cookie(self):
+        provider = UserAgentProvider([f"agent-{i}" for i in range(100)])
+
+        agent = provider.get("session=1")
+        self.assertTrue(all(provider.get("session=1") == agent for _ in range(50)))
+        self.assertGreater(len({provider.get() for _ in range(50)}), 1)
+
+        provider.forget("session=1")
+        self.assertNotIn("session=1", provider.sticky)
+
+    def test_fake_useragent_data(self):
+        provider = UserAgentProvider()
+        self.assertGreater(len(provider), 1)
+
+        with mock.patch.object(useragent, "UserAgent", None):
+            self.assertEqual(UserAgentProvider().random(), DEFAULT_USER_AGENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
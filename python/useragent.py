@@ -0,0 +1,107 @@
+import random
+import logging
+import threading
+from bisect import bisect
+from itertools import accumulate
+
+try:
+    from fake_useragent import UserAgent
+except ImportError:
+    UserAgent = None
+
+logger = logging.getLogger("CRATOR")
+
+# Used when no user agent is configured and the fake_useragent data cannot be loaded
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; rv:102.0) Gecko/20100101 Firefox/102.0"
+
+
+class UserAgentProvider:
+    """
+    Weighted pool of user agents, loaded once and shared by all the requests of the process.
+    The agents come from the crawler.user_agents list of crator.yml, either strings or {agent, weight} dicts, or,
+    when the list is empty, from the fake_useragent data (each browser with the same weight).
+    A cookie session always gets the same agent: a session that changes browser at every request is suspicious.
+    """
+    def __init__(self, user_agents=None):
+        """
+        :param user_agents: list of user agents (strings, or dicts with the keys agent and weight), None or an empty
+        list to load the fake_useragent data
+        """
+        agents, weights = self.parse(user_agents) if user_agents else self.load()
+        if not agents:
+            logger.warning(f"USER AGENT - No user agent available, using {DEFAULT_USER_AGENT}")
+            agents, weights = [DEFAULT_USER_AGENT], [1]
+
+        self.agents = agents
+        self.cum_weights = list(accumulate(weights))
+
+        # Cookie -> agent
+        self.sticky = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def parse(user_agents):
+        agents, weights = [], []
+        for user_agent in user_agents:
+            if isinstance(user_agent, dict):
+                agent, weight = user_agent.get('agent'), user_agent.get('weight', 1)
+            else:
+                agent, weight = user_agent, 1
+
+            if agent and weight > 0:
+                agents.append(agent)
+                weights.append(weight)
+
+        return agents, weights
+
+    @staticmethod
+    def load():
+        """
+        :return: (agents, weights) of the fake_useragent data.
+        """
+        if UserAgent is None:
+            return [], []
+
+        try:
+            data_browsers = UserAgent().data_browsers
+        except Exception as e:
+            logger.error(f"USER AGENT - Error while loading the fake_useragent data: {str(e)}")
+            return [], []
+
+        agents, weights = [], []
+        for browser_agents in data_browsers.values():
+            for agent in browser_agents:
+                agents.append(agent)
+                weights.append(1 / len(browser_agents))
+
+        return agents, weights
+
+    def __len__(self):
+        return len(self.agents)
+
+    def random(self):
+        """
+        :return: a user agent, chosen by weight.
+        """
+        return self.agents[bisect(self.cum_weights, random.random() * self.cum_weights[-1])]
+
+    def get(self, cookie=None):
+        """
+        :return: the user agent of a cookie session, chosen the first time. A random one if cookie is None.
+        """
+        if not cookie:
+            return self.random()
+
+        with self.lock:
+            agent = self.sticky.get(cookie)
+            if agent is None:
+                agent = self.sticky[cookie] = self.random()
+
+            return agent
+
+    def forget(self, cookie):
+        """
+        Drop the agent of a cookie no longer used (e.g., expired).
+        """
+        with self.lock:
+            self.sticky.pop(cookie, None)
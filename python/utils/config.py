@@ -1,8 +1,64 @@
 import yaml
 import os
+import time
+import logging
+import threading
 from pathlib import Path
+from types import MappingProxyType
+
+from utils.cookiestore import CookieStore, JOURNAL_FILE, apply
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
 
 resource_path = Path(__file__).parent.parent.parent.joinpath("resources")
+logger = logging.getLogger("CRATOR")
+
+WATCH_INTERVAL = 1  # Seconds between two checks of crator.yml, without inotify
+
+
+def file_signature(file_path):
+    """
+    :return: (modification time, size, inode) of a file: it changes when the file is written or replaced.
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class ConfigSnapshot:
+    """
+    Immutable view of crator.yml, with the cookies indexed by seed. A new snapshot is built at each change of the file
+    and replaces the previous one with a single assignment, so the readers never lock and never touch the file.
+    The cookie changes of the cookie store journal are applied to the cookies of the file.
+    """
+    def __init__(self, file_values, signature=None, version=0, cookie_operations=()):
+        """
+        :param file_values: the values read from crator.yml
+        :param signature: the signatures of crator.yml and of the cookie journal
+        :param cookie_operations: the operations of the cookie store (see utils.cookiestore.apply)
+        """
+        self.file_values = file_values
+        self.signature = signature
+        self.version = version
+
+        values = dict(file_values)
+        if cookie_operations:
+            values['crawler.cookies'] = apply(file_values.get('crawler.cookies'), cookie_operations)
+        self.values = MappingProxyType(values)
+
+        # Seed -> cookies, for the seeds with a cookie list (even empty). Seeds that require cookies.
+        cookies = {}
+        cookie_seeds = set()
+        for cookie_by_seed in values.get('crawler.cookies') or []:
+            seed = cookie_by_seed.get('seed')
+            cookie_seeds.add(seed)
+            if 'cookies' in cookie_by_seed:
+                cookies[seed] = tuple(cookie_by_seed.get('cookies') or ())
+
+        self.cookies = MappingProxyType(cookies)
+        self.cookie_seeds = frozenset(cookie_seeds)
 
 
 class Configuration:
@@ -14,35 +70,168 @@ class Configuration:
         return cls._instance
 
     def __init__(self, yml_path=None):
-        self.crator_path = yml_path
-        if not self.crator_path:
-            self.crator_path = os.path.join(resource_path, 'crator.yml')
+        # The singleton is initialized again only for another file: without a path, it keeps its file
+        if getattr(self, 'crator_path', None) and (not yml_path or yml_path == self.crator_path):
+            return
+
+        if not yml_path:
+            yml_path = os.path.join(resource_path, 'crator.yml')
 
-        if not os.path.isfile(self.crator_path):
-            raise FileNotFoundError(f"Invalid path: '{self.crator_path}' does not exist.")
+        if not os.path.isfile(yml_path):
+            raise FileNotFoundError(f"Invalid path: '{yml_path}' does not exist.")
 
-        self.last_checked_time = None
+        if getattr(self, 'watcher', None):
+            self.stop_watcher()
+
+        self.crator_path = yml_path
+        self.cookie_store = CookieStore(yml_path)
+        self.snapshot = None
+        self.reload_lock = threading.Lock()
+        # Notified at each new snapshot
+        self.updated = threading.Condition()
         self.load_yaml()
 
+        self.watcher = None
+        self.stop_event = threading.Event()
+
+        # Reload statistics: number of reloads, delay between the write of the file and the new snapshot (seconds)
+        self.n_reloads = 0
+        self.last_reload_latency = None
+        self.max_reload_latency = 0.0
+
+    @property
+    def config(self):
+        """
+        :return: the values of the current snapshot (read only).
+        """
+        return self.snapshot.values
+
+    def signature(self):
+        return file_signature(self.crator_path), self.cookie_store.signature()
+
     def is_updated(self):
-        # Get the modification timestamp of the file
-        file_modified_time = os.path.getmtime(self.crator_path)
-
-        if not self.last_checked_time:
-            self.last_checked_time = file_modified_time
-            return True
-
-        # Compare the file's modification time with the last checked time
-        if file_modified_time > self.last_checked_time:
-            self.last_checked_time = file_modified_time
-            return True
-        else:
-            return False
+        """
+        :return: True if crator.yml or the cookie journal have changed since the current snapshot.
+        """
+        return self.signature() != self.snapshot.signature
+
+    def read_yaml(self):
+        """
+        :return: the values of crator.yml, read from the file. Used by the methods that change the file.
+        """
+        with open(self.crator_path, 'r') as file:
+            return yaml.safe_load(file) or {}
 
     def load_yaml(self):
-        if self.is_updated():
-            with open(self.crator_path, 'r') as file:
-                self.config = yaml.safe_load(file)
+        """
+        Build a new snapshot if crator.yml or the cookie journal have changed.
+        :return: True if a new snapshot has been loaded.
+        """
+        with self.reload_lock:
+            signature = self.signature()
+            if self.snapshot and signature == self.snapshot.signature:
+                return False
+
+            version = self.snapshot.version + 1 if self.snapshot else 0
+            self.snapshot = ConfigSnapshot(self.read_yaml(), signature, version, self.cookie_store.operations())
+
+        self.notify_update()
+        return True
+
+    def refresh_cookies(self):
+        """
+        New snapshot with the cookie changes not yet written by the cookie store. The file is not read again.
+        """
+        with self.reload_lock:
+            snapshot = self.snapshot
+            self.snapshot = ConfigSnapshot(snapshot.file_values, snapshot.signature, snapshot.version + 1,
+                                           self.cookie_store.operations())
+
+        self.notify_update()
+
+    def notify_update(self):
+        with self.updated:
+            self.updated.notify_all()
+
+    def wait_for_update(self, version, timeout=None):
+        """
+        Wait for a snapshot newer than version, loaded by the watcher or by a writer of this process.
+        :return: True if there is a newer snapshot, False on timeout.
+        """
+        with self.updated:
+            return self.updated.wait_for(lambda: self.snapshot.version != version, timeout)
+
+    def start_watcher(self, interval=WATCH_INTERVAL):
+        """
+        Start the thread that reloads crator.yml when it changes, once per process. It is woken by inotify if the
+        inotify_simple package is installed, otherwise it checks the modification time every interval seconds.
+        """
+        with self.reload_lock:
+            if self.watcher:
+                return
+
+            self.watcher = threading.Thread(target=self.watch, args=(interval,), daemon=True)
+            self.watcher.start()
+
+    def stop_watcher(self):
+        self.stop_event.set()
+        if self.watcher:
+            self.watcher.join()
+            self.watcher = None
+        self.stop_event.clear()
+
+    def watch(self, interval):
+        inotify = None
+        if INotify is not None:
+            try:
+                # The directory is watched: the editors often replace the file instead of writing it
+                inotify = INotify()
+                inotify.add_watch(os.path.dirname(self.crator_path),
+                                  flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+            except OSError as e:
+                logger.warning(f"CONFIGURATION - inotify not available ({str(e)}). Polling {self.crator_path}")
+                inotify = None
+
+        file_names = {os.path.basename(self.crator_path), JOURNAL_FILE}
+        while not self.stop_event.is_set():
+            if inotify:
+                events = inotify.read(timeout=int(interval * 1000))
+                if not any(event.name in file_names for event in events):
+                    continue
+            else:
+                self.stop_event.wait(interval)
+
+            try:
+                if self.load_yaml():
+                    self.record_reload()
+            except Exception as e:
+                # E.g., a file being written: the next change reloads it
+                logger.error(f"CONFIGURATION - Error while reloading {self.crator_path}: {str(e)}")
+
+        if inotify:
+            inotify.close()
+
+    def record_reload(self):
+        # From the last write of crator.yml or of the journal
+        modified_time = max(signature[0] for signature in self.snapshot.signature if signature) / 1e9
+        latency = max(0.0, time.time() - modified_time)
+        self.n_reloads += 1
+        self.last_reload_latency = latency
+        self.max_reload_latency = max(self.max_reload_latency, latency)
+        logger.info(f"CONFIGURATION - {self.crator_path} reloaded after {latency:.3f}s")
+
+    def reload_stats(self):
+        return {
+            "reloads": self.n_reloads,
+            "last_latency": self.last_reload_latency,
+            "max_latency": self.max_reload_latency,
+        }
+
+    def version(self):
+        """
+        :return: the version of the current snapshot, incremented at each reload.
+        """
+        return self.snapshot.version
 
     def project_name(self):
         if 'project_name' in self.config:
@@ -53,6 +242,24 @@ class Configuration:
     def http_proxy(self):
         return self.config['http_proxy']
 
+    def tor_circuits(self):
+        return self.config.get('tor.circuits', 1)
+
+    def tor_socks_ports(self):
+        return self.config.get('tor.socks_ports', None)
+
+    def user_agents(self):
+        return self.config.get('crawler.user_agents', [])
+
+    def cookie_circuit_pinning(self):
+        return self.config.get('crawler.cookie_circuit_pinning', False)
+
+    def cookie_validation_workers(self):
+        return self.config.get('crawler.cookie_validation_workers', 8)
+
+    def cookie_validation_ttl(self):
+        return self.config.get('crawler.cookie_validation_ttl', 600)
+
     def max_links(self):
         return self.config['crawler.max_links']
 
@@ -62,118 +269,140 @@ class Configuration:
     def wait_request(self):
         return self.config['crawler.wait_request']
 
-    def max_depth(self):
-        return self.config['crawler.depth']
+    def random_wait(self):
+        return self.config.get('crawler.random_wait', False)
 
-    def data_dir(self):
-        return self.config['data_directory']
+    def engine(self):
+        return self.config.get('crawler.engine', 'threads')
 
-    def requires_cookies(self, seed):
-        self.load_yaml()
+    def max_in_flight(self):
+        return self.config.get('crawler.max_in_flight', 1000)
 
-        if 'crawler.cookies' not in self.config:
-            return False
+    def max_per_host(self):
+        return self.config.get('crawler.max_per_host', 16)
 
-        if not seed:
-            return False
+    def link_extractor(self):
+        return self.config.get('crawler.link_extractor', 'htmlparser')
 
-        for cookie_by_seed in self.config.get('crawler.cookies', []):
-            if cookie_by_seed.get('seed') == seed:
-                return True
+    def parse_workers(self):
+        return self.config.get('crawler.parse_workers', 0)
 
-        return False
+    def bloom_filter(self):
+        return self.config.get('crawler.bloom_filter', False)
 
-    def has_cookies(self, seed):
-        self.load_yaml()
+    def bloom_error_rate(self):
+        return self.config.get('crawler.bloom_error_rate', 0.001)
 
-        if 'crawler.cookies' not in self.config:
-            return False
+    def max_depth(self):
+        return self.config['crawler.depth']
 
-        if not seed:
-            return False
-        #     return 'crawler.cookies' in self.config
+    def max_page_size(self):
+        return self.config.get('crawler.max_page_size', 10 * 1024 * 1024)
 
-        for cookie_by_seed in self.config.get('crawler.cookies', []):
-            if cookie_by_seed.get('seed') == seed and 'cookies' in cookie_by_seed:
-                return True
+    def saver_memory(self):
+        return self.config.get('saver.memory', 1024 * 1024 * 1024)
 
-        return False
+    def saver_queue_size(self):
+        """
+        :return: the max number of pages waiting to be saved. By default, the number of pages of max_page_size that
+        fit in saver.memory bytes.
+        """
+        return self.config.get('saver.queue_size', max(1, self.saver_memory() // self.max_page_size()))
 
-    def cookies(self, seed):
-        self.load_yaml()
-        if not seed or not self.has_cookies():
-            return None
+    def saver_low_watermark(self):
+        return self.config.get('saver.low_watermark', None)
 
-        for cookie_by_seed in self.config.get('crawler.cookies', []):
-            if cookie_by_seed.get('seed') == seed and 'cookies' in cookie_by_seed:
-                return cookie_by_seed.get('cookies')
+    def results_queue_size(self):
+        return self.config.get('crawler.results_queue_size', 1000)
 
-        return None
+    def results_low_watermark(self):
+        return self.config.get('crawler.results_low_watermark', None)
 
-    def remove_cookie(self, seed, cookie):
-        self.load_yaml()
+    def page_store(self):
+        return self.config.get('saver.store', 'segments')
 
-        cookies = self.config.get('crawler.cookies', [])
+    def segment_size(self):
+        return self.config.get('saver.segment_size', 256 * 1024 * 1024)
 
-        # Find the selected seed in the cookies list
-        for i, seed_data in enumerate(cookies):
-            if seed_data.get('seed') == seed and 'cookies' in seed_data and isinstance(seed_data['cookies'], list):
-                seed_cookies = seed_data['cookies']
+    def saver_threads(self):
+        return self.config.get('saver.threads', 4)
 
-                # Remove the specified cookie from the seed's cookies
-                if cookie in seed_cookies:
-                    seed_cookies.remove(cookie)
+    def data_dir(self):
+        return self.config['data_directory']
 
-        # Update the modified cookies list in the configuration
-        self.config['crawler.cookies'] = cookies
+    def watch_interval(self):
+        return self.config.get('config.watch_interval', WATCH_INTERVAL)
 
-        # Dump modified data back to YAML
-        with open(self.crator_path, 'w') as file:
-            yaml.dump(self.config, file)
+    def checkpoint_interval(self):
+        return self.config.get('crawler.checkpoint_interval', 30)
 
-    def add_cookie(self, seed, cookie):
-        self.load_yaml()
+    def monitor_flush_interval(self):
+        return self.config.get('monitor.flush_interval', 60)
 
-        if 'crawler.cookies' not in self.config:
-            self.config['crawler.cookies'] = []
+    def monitor_fsync_interval(self):
+        return self.config.get('monitor.fsync_interval', 300)
 
-        cookies = self.config.get('crawler.cookies', [])
+    def normalization(self, seed):
+        """
+        :return: the url normalization rules of a seed (see normalizer.UrlNormalizer), an empty dict if there are none.
+        """
+        for rules in self.config.get('crawler.normalization', []):
+            if rules.get('seed') == seed:
+                return rules
 
-        # Find the selected seed in the cookies list
-        i = 0
-        fetched = False
-        while i < len(cookies) and not fetched:
-            if cookies[i].get('seed') == seed and 'cookies' in cookies[i] and isinstance(cookies[i]['cookies'], list):
-                cookies[i]['cookies'].append(cookie)
-                fetched = True
-            i += 1
+        return {}
 
-        if not fetched:
-            cookies.append({'seed': seed, 'cookies': [cookie]})
+    def priorities(self, seed):
+        """
+        :return: the frontier priority rules of a seed (see frontier.PriorityPolicy), an empty dict if there are none.
+        """
+        for rules in self.config.get('crawler.priorities', []):
+            if rules.get('seed') == seed:
+                return rules
 
-        # for i, seed_data in enumerate(cookies):
-        #     if seed_data.get('seed') == seed and 'cookies' in seed_data and isinstance(seed_data['cookies'], list):
-        #         seed_data['cookies'].append(cookie)
-        #         break
+        return {}
 
-        # Update the modified cookies list in the configuration
-        self.config['crawler.cookies'] = cookies
+    def captcha(self, seed):
+        """
+        :return: the captcha detection rules of a seed (see detector.CaptchaDetector), an empty dict if there are none.
+        """
+        for rules in self.config.get('crawler.captcha', []):
+            if rules.get('seed') == seed:
+                return rules
 
-        # Dump modified data back to YAML
-        with open(self.crator_path, 'w') as file:
-            yaml.dump(self.config, file)
+        return {}
 
-    def remove_seed(self, seed):
-        self.load_yaml()
+    def requires_cookies(self, seed):
+        if not seed:
+            return False
+
+        return seed in self.snapshot.cookie_seeds
+
+    def has_cookies(self, seed):
+        if not seed:
+            return False
 
-        cookies = self.config.get('crawler.cookies', [])
+        return seed in self.snapshot.cookies
 
-        # Remove the seed and update the modified cookies list in the configuration
-        self.config['crawler.cookies'] = [cookie for cookie in cookies if cookie.get('seed') != seed]
+    def cookies(self, seed):
+        """
+        :return: a copy of the cookie list of a seed, None if the seed has no cookie list.
+        """
+        cookies = self.snapshot.cookies.get(seed) if seed else None
+        return list(cookies) if cookies is not None else None
 
-        if not self.config['crawler.cookies']:
-            del self.config['crawler.cookies']
+    def remove_cookie(self, seed, cookie):
+        """
+        Remove a cookie. The removal is written by the cookie store with the other removals of the next seconds, but
+        it is in the snapshot at once.
+        """
+        self.cookie_store.remove(seed, cookie)
+        self.refresh_cookies()
 
-        # Dump modified data back to YAML
-        with open(self.crator_path, 'w') as file:
-            yaml.dump(self.config, file)
+    def add_cookie(self, seed, cookie):
+        self.cookie_store.add(seed, cookie)
+        self.load_yaml()
+
+    def remove_seed(self, seed):
+        self.cookie_store.remove_seed(seed)
+        self.load_yaml()
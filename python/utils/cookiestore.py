@@ -0,0 +1,248 @@
+import os
+import json
+import yaml
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("CRATOR")
+
+JOURNAL_FILE = "cookies.journal"
+LOCK_FILE = ".cookies.lock"
+FLUSH_DELAY = 1             # Seconds a removal waits for the next ones, to be written with them
+COMPACT_THRESHOLD = 256     # Journal records that trigger the compaction into crator.yml
+
+ADD = "add"
+REMOVE = "remove"
+REMOVE_SEED = "remove_seed"
+
+
+def apply(cookies, operations):
+    """
+    Apply the journal operations to the crawler.cookies list of crator.yml. The operations are idempotent: a journal
+    applied twice (e.g., after a crash during its compaction) gives the same cookies.
+    :param cookies: the crawler.cookies list ({seed, cookies} dicts), not changed
+    :param operations: list of (operation, seed, cookie)
+    :return: the new crawler.cookies list.
+    """
+    cookies = [dict(cookie_by_seed, cookies=list(cookie_by_seed['cookies']))
+               if isinstance(cookie_by_seed.get('cookies'), list) else dict(cookie_by_seed)
+               for cookie_by_seed in cookies or []]
+
+    for operation, seed, cookie in operations:
+        if operation == REMOVE_SEED:
+            cookies = [cookie_by_seed for cookie_by_seed in cookies if cookie_by_seed.get('seed') != seed]
+            continue
+
+        cookie_by_seed = next((cookie_by_seed for cookie_by_seed in cookies if cookie_by_seed.get('seed') == seed),
+                              None)
+        if operation == ADD:
+            if cookie_by_seed is None:
+                cookie_by_seed = {'seed': seed}
+                cookies.append(cookie_by_seed)
+            if not isinstance(cookie_by_seed.get('cookies'), list):
+                cookie_by_seed['cookies'] = []
+            if cookie not in cookie_by_seed['cookies']:
+                cookie_by_seed['cookies'].append(cookie)
+
+        elif operation == REMOVE and cookie_by_seed and isinstance(cookie_by_seed.get('cookies'), list):
+            if cookie in cookie_by_seed['cookies']:
+                cookie_by_seed['cookies'].remove(cookie)
+
+    return cookies
+
+
+class CookieStore:
+    """
+    Changes of the cookies of crator.yml, shared by the crawlers and cookie_cli.py. The changes are appended to a
+    journal (cookies.journal, one json record per line) instead of rewriting crator.yml each time, and the journal
+    is compacted into crator.yml, with an atomic replace, when it grows. The removals are coalesced: the ones in the
+    same FLUSH_DELAY are written together.
+    The journal and crator.yml are locked with flock, so the crawlers and cookie_cli.py can change them at the same
+    time. The configuration applies the journal to the cookies of crator.yml (see apply).
+    """
+    def __init__(self, yml_path, flush_delay=FLUSH_DELAY, compact_threshold=COMPACT_THRESHOLD):
+        self.yml_path = yml_path
+        folder = os.path.dirname(os.path.abspath(yml_path))
+        self.journal_path = os.path.join(folder, JOURNAL_FILE)
+        self.lock_path = os.path.join(folder, LOCK_FILE)
+        self.flush_delay = flush_delay
+        self.compact_threshold = compact_threshold
+
+        self.lock = threading.RLock()
+        # Removals not yet written: (seed, cookie) -> None, in order
+        self.pending = {}
+        self.flush_timer = None
+
+        # Cache of the journal records, valid while the journal has the same signature
+        self.journal_signature = None
+        self.journal = []
+
+        self.n_writes = 0
+        self.n_compactions = 0
+
+    @contextmanager
+    def locked(self):
+        """
+        Exclusive access to the journal and to crator.yml, among the threads and among the processes.
+        """
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def signature(self):
+        """
+        :return: (modification time, size, inode) of the journal, None if there is no journal.
+        """
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def read_journal(self):
+        """
+        :return: the operations of the journal, as (operation, seed, cookie).
+        """
+        with self.lock:
+            signature = self.signature()
+            if signature == self.journal_signature:
+                return self.journal
+
+            journal = []
+            if signature is not None:
+                with open(self.journal_path, 'r') as file:
+                    for line in file:
+                        try:
+                            record = json.loads(line)
+                            journal.append((record['op'], record['seed'], record.get('cookie')))
+                        except (ValueError, KeyError):
+                            # Incomplete record of a crashed write
+                            continue
+
+            self.journal_signature, self.journal = signature, journal
+            return journal
+
+    def operations(self):
+        """
+        :return: the operations to apply to crator.yml: the journal, then the removals not yet written.
+        """
+        with self.lock:
+            return self.read_journal() + [(REMOVE, seed, cookie) for seed, cookie in self.pending]
+
+    def append(self, operations):
+        # It must be called holding self.locked()
+        if not operations:
+            return
+
+        data = "".join(json.dumps({'op': operation, 'seed': seed, 'cookie': cookie}) + "\n"
+                       for operation, seed, cookie in operations)
+
+        # A single write in append mode: the records of the other processes are not interleaved
+        with open(self.journal_path, 'a') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.n_writes += 1
+
+    def add(self, seed, cookie):
+        with self.locked():
+            self.append(self.take_pending() + [(ADD, seed, cookie)])
+
+        self.compact_if_needed()
+
+    def remove(self, seed, cookie):
+        """
+        Remove a cookie. The removal is written with the others of the next FLUSH_DELAY seconds, but it is returned
+        by operations at once.
+        """
+        with self.lock:
+            self.pending[(seed, cookie)] = None
+
+            if self.flush_delay <= 0:
+                self.flush()
+            elif not self.flush_timer:
+                self.flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self.flush_timer.start()
+
+    def remove_seed(self, seed):
+        with self.locked():
+            self.append(self.take_pending() + [(REMOVE_SEED, seed, None)])
+
+        self.compact_if_needed()
+
+    def take_pending(self):
+        # It must be called holding self.lock
+        operations = [(REMOVE, seed, cookie) for seed, cookie in self.pending]
+        self.pending = {}
+
+        if self.flush_timer:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+
+        return operations
+
+    def flush(self):
+        """
+        Write the pending removals.
+        """
+        with self.locked():
+            self.append(self.take_pending())
+
+        self.compact_if_needed()
+
+    def compact_if_needed(self):
+        if len(self.read_journal()) >= self.compact_threshold:
+            self.compact()
+
+    def compact(self):
+        """
+        Apply the journal to crator.yml and empty it. crator.yml is written to a temporary file and then replaced, so
+        its readers never see a partial file.
+        """
+        with self.locked():
+            self.append(self.take_pending())
+
+            operations = self.read_journal()
+            if not operations:
+                return
+
+            with open(self.yml_path, 'r') as file:
+                config = yaml.safe_load(file) or {}
+
+            cookies = apply(config.get('crawler.cookies', []), operations)
+            if cookies:
+                config['crawler.cookies'] = cookies
+            else:
+                config.pop('crawler.cookies', None)
+
+            tmp_path = self.yml_path + ".tmp"
+            with open(tmp_path, 'w') as file:
+                yaml.dump(config, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.yml_path)
+
+            # A crash here replays the journal on the compacted file: the operations are idempotent
+            os.remove(self.journal_path)
+            self.n_compactions += 1
+
+        logger.info(f"COOKIE STORE - {len(operations)} cookie changes compacted into {self.yml_path}")
+
+    def close(self):
+        self.flush()
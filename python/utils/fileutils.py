@@ -1,5 +1,6 @@
 import os
 import csv
+import shutil
 
 res_path = "resources"
 
@@ -9,6 +10,24 @@ def save_file(content, dir):
         file.write(content)
 
 
+def save_bytes(content, dir):
+    with open(dir, 'wb') as file:
+        file.write(content)
+
+
+def link_file(source, dir):
+    """
+    Hard-link an existing file, or copy it if the file system does not support hard links.
+    """
+    if os.path.exists(dir):
+        os.remove(dir)
+
+    try:
+        os.link(source, dir)
+    except OSError:
+        shutil.copyfile(source, dir)
+
+
 def save_list(list_data, path):
     # write list to a text file
     with open(path, 'w') as file:
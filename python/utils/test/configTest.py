@@ -1,5 +1,11 @@
+import os
+import time
+import yaml
 import unittest
-from utils.config import Configuration
+import tempfile
+from unittest import mock
+from utils.config import Configuration, resource_path
+from utils.cookiestore import CookieStore
 
 
 # Function to test
@@ -7,9 +13,31 @@ def add_numbers(x, y):
     return x + y
 
 
+ROYAL_SEED = "http://royalrnpvfbodtt5altnnzano6hquvn2d5qy55oofc2zyqciogcevrad.onion/"
+ROYAL_COOKIE = "royal_market_session=test; XSRF-TOKEN=test"
+
+
 # Test class
 class TestConfiguration(unittest.TestCase):
 
+    def setUp(self):
+        # A copy of crator.yml, with a cookie for the royal seed: the cookie changes of the tests are not written to
+        # the journal of the real one
+        self.folder = tempfile.TemporaryDirectory()
+        self.yml_path = os.path.join(self.folder.name, "crator.yml")
+        with open(os.path.join(resource_path, "crator.yml"), 'r') as file:
+            values = yaml.safe_load(file) or {}
+        values['crawler.cookies'] = [{'seed': ROYAL_SEED, 'cookies': [ROYAL_COOKIE]}]
+        with open(self.yml_path, 'w') as file:
+            yaml.dump(values, file)
+
+        self.config = Configuration(self.yml_path)
+
+    def tearDown(self):
+        self.config.cookie_store.close()
+        Configuration._instance = None
+        self.folder.cleanup()
+
     def test_has_cookies_with_no_seeds(self):
         config = Configuration()
         self.assertTrue(config.has_cookies())
@@ -77,5 +105,88 @@ class TestConfiguration(unittest.TestCase):
         config = Configuration()
         config.remove_cookie(seed, cookie_to_remove)
 
+
+class ConfigSnapshotTest(unittest.TestCase):
+    seed = "http://market.onion/"
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.yml_path = os.path.join(self.folder.name, "crator.yml")
+        self.write({'crawler.cookies': [{'seed': self.seed, 'cookies': ['session=1']}, {'seed': "http://other.onion/"}]})
+        self.config = Configuration(self.yml_path)
+
+    def tearDown(self):
+        self.config.stop_watcher()
+        self.config.cookie_store.close()
+        Configuration._instance = None
+        self.folder.cleanup()
+
+    def write(self, values):
+        with open(self.yml_path + ".tmp", 'w') as file:
+            yaml.dump(values, file)
+        os.replace(self.yml_path + ".tmp", self.yml_path)
+
+    def test_cookie_index(self):
+        self.assertTrue(self.config.has_cookies(self.seed))
+        self.assertTrue(self.config.requires_cookies("http://other.onion/"))
+        self.assertFalse(self.config.has_cookies("http://other.onion/"))
+        self.assertEqual(self.config.cookies(self.seed), ['session=1'])
+
+        # A copy: the callers may change it
+        self.config.cookies(self.seed).append('session=2')
+        self.assertEqual(self.config.cookies(self.seed), ['session=1'])
+
+    def test_saver_queue_size(self):
+        # The pages waiting to be saved fit in the memory budget
+        self.assertEqual(self.config.saver_queue_size(), 102)
+
+        self.write({'crawler.max_page_size': 1024 * 1024, 'saver.memory': 64 * 1024 * 1024})
+        self.config.load_yaml()
+        self.assertEqual(self.config.saver_queue_size(), 64)
+
+        self.write({'saver.queue_size': 10})
+        self.config.load_yaml()
+        self.assertEqual(self.config.saver_queue_size(), 10)
+
+    def test_reads_without_file_access(self):
+        with mock.patch("os.stat", side_effect=AssertionError("crator.yml accessed")), \
+                mock.patch("builtins.open", side_effect=AssertionError("crator.yml accessed")):
+            self.assertTrue(self.config.has_cookies(self.seed))
+            self.assertTrue(self.config.requires_cookies(self.seed))
+            self.assertEqual(self.config.cookies(self.seed), ['session=1'])
+
+    def test_watcher(self):
+        self.config.start_watcher(interval=0.05)
+        version = self.config.version()
+
+        self.write({'crawler.cookies': [{'seed': self.seed, 'cookies': ['session=1', 'session=2']}]})
+
+        deadline = time.time() + 5
+        while self.config.version() == version and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.config.cookies(self.seed), ['session=1', 'session=2'])
+        self.assertEqual(self.config.reload_stats()["reloads"], 1)
+        self.assertLess(self.config.reload_stats()["last_latency"], 5)
+
+    def test_writers_update_the_snapshot(self):
+        self.config.add_cookie(self.seed, 'session=2')
+        self.assertEqual(self.config.cookies(self.seed), ['session=1', 'session=2'])
+
+        self.config.remove_cookie(self.seed, 'session=1')
+        self.assertEqual(self.config.cookies(self.seed), ['session=2'])
+
+    def test_cookie_journal(self):
+        # A cookie added by another process (cookie_cli.py) through the journal
+        self.config.start_watcher(interval=0.05)
+        CookieStore(self.yml_path).add(self.seed, 'session=2')
+
+        deadline = time.time() + 5
+        while self.config.cookies(self.seed) != ['session=1', 'session=2'] and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.config.cookies(self.seed), ['session=1', 'session=2'])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,83 @@
+import os
+import yaml
+import unittest
+import tempfile
+import threading
+
+from utils.cookiestore import CookieStore, apply, ADD, REMOVE, REMOVE_SEED
+
+
+class CookieStoreTest(unittest.TestCase):
+    seed = "http://market.onion/"
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.yml_path = os.path.join(self.folder.name, "crator.yml")
+        with open(self.yml_path, 'w') as file:
+            yaml.dump({'project_name': 'test', 'crawler.cookies': [{'seed': self.seed, 'cookies': ['a', 'b', 'c']}]},
+                      file)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def read_cookies(self):
+        with open(self.yml_path) as file:
+            return yaml.safe_load(file).get('crawler.cookies')
+
+    def test_apply(self):
+        cookies = [{'seed': self.seed, 'cookies': ['a', 'b']}, {'seed': "http://other.onion/"}]
+        operations = [(REMOVE, self.seed, 'a'), (ADD, self.seed, 'c'), (ADD, "http://other.onion/", 'd'),
+                      (REMOVE_SEED, "http://old.onion/", None), (ADD, "http://new.onion/", 'e')]
+
+        expected = [{'seed': self.seed, 'cookies': ['b', 'c']}, {'seed': "http://other.onion/", 'cookies': ['d']},
+                    {'seed': "http://new.onion/", 'cookies': ['e']}]
+        self.assertEqual(apply(cookies, operations), expected)
+        self.assertEqual(cookies[0]['cookies'], ['a', 'b'])
+
+        # Replayed on its own result (crash during a compaction)
+        self.assertEqual(apply(expected, operations), expected)
+
+    def test_coalesced_removals(self):
+        store = CookieStore(self.yml_path, flush_delay=60)
+
+        for cookie in ['a', 'b', 'a']:
+            store.remove(self.seed, cookie)
+
+        # Pending, but already in the operations
+        self.assertEqual(store.n_writes, 0)
+        self.assertEqual(store.operations(), [(REMOVE, self.seed, 'a'), (REMOVE, self.seed, 'b')])
+
+        store.flush()
+        self.assertEqual(store.n_writes, 1)
+        self.assertEqual(store.read_journal(), [(REMOVE, self.seed, 'a'), (REMOVE, self.seed, 'b')])
+
+        # crator.yml is not written until the compaction
+        self.assertEqual(self.read_cookies(), [{'seed': self.seed, 'cookies': ['a', 'b', 'c']}])
+        store.compact()
+        self.assertEqual(self.read_cookies(), [{'seed': self.seed, 'cookies': ['c']}])
+        self.assertEqual(store.read_journal(), [])
+        self.assertFalse(os.path.exists(self.yml_path + ".tmp"))
+
+    def test_concurrent_stores(self):
+        # Two stores on the same files, as the crawler and cookie_cli.py
+        stores = [CookieStore(self.yml_path, compact_threshold=25), CookieStore(self.yml_path, compact_threshold=25)]
+
+        def add_cookies(store, prefix):
+            for i in range(50):
+                store.add(self.seed, f"{prefix}{i}")
+
+        threads = [threading.Thread(target=add_cookies, args=(store, prefix)) for store, prefix in zip(stores, "xy")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stores[0].compact()
+        cookies = self.read_cookies()[0]['cookies']
+        self.assertEqual(len(cookies), 103)
+        self.assertEqual(set(cookies), {'a', 'b', 'c'} | {f"{prefix}{i}" for prefix in "xy" for i in range(50)})
+        self.assertGreater(stores[0].n_compactions + stores[1].n_compactions, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()